@@ -3,34 +3,324 @@ Flask API for Student Performance Prediction
 Provides REST endpoints for single and bulk predictions
 """
 
-from flask import Flask, request, jsonify
+# First import: the startup profile's clock should cover everything below
+from startup import lazy_import, profile as startup_profile
+
+from flask import Flask, Response, g, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS
-import pandas as pd
+import functools
 import numpy as np
-import pickle
-import json
-from datetime import datetime
+import tempfile
+import threading
+import time
 import traceback
 
+import config
+import metrics
+from batching import MicroBatcher
+from cache import PredictionCache
+from columnar import (
+    ARROW_STREAM_MIMETYPE, ColumnarUnavailable, detect_format, input_columns,
+    ipc_stream, read_table, results_batch, table_frames
+)
+from encoding import dumps, encoded_response, json_response, ndjson, timestamp
+from explanations import ExplanationEngine, ShapExplanationEngine
+from jobs import JobManager
+from model_compiler import (
+    CompiledPipeline, DeferredModel, FusedLinearModel, MappedModel, compile_for_serving,
+    max_abs_difference, native_xgboost
+)
+from model_store import ModelBundle, ModelRegistry, ModelStore
+from profiling import RequestProfiler
+from sharding import ShardedScorer
+from scoring import (
+    BULK_CHUNK_SIZE, INFINITE_INPUT_ERROR, FeatureAssembler, Predictor,
+    probe_matrix, range_matrix, score_columns, score_frame, score_summary, model_version
+)
+
+# Deferred under LEAN_STARTUP: single predictions never touch pandas
+pd = lazy_import('pandas')
+startup_profile.mark('imports')
+
 app = Flask(__name__)
 CORS(app)  # Enable CORS for frontend
 
-# Load trained model and metadata
-try:
-    with open('models/best_model.pkl', 'rb') as f:
-        model = pickle.load(f)
-    with open('models/model_card.json', 'r') as f:
-        model_card = json.load(f)
-    print("✅ Model loaded successfully")
-    print(f"   Model: {model_card['best_model']}")
-    print(f"   Training date: {model_card['training_date']}")
-except Exception as e:
-    print(f"❌ Error loading model: {e}")
-    print("   Please run train_model.py first")
-    model = None
-    model_card = None
-
-def preprocess_input(data):
+def build_predictor(model, model_card):
+    """Wrap the model for single-pass scoring, verified on a synthetic probe batch"""
+    probe = probe_matrix(model_card['feature_names'])
+    if isinstance(model, MappedModel):
+        model = mapped_model(model, model_card)
+        # Verified on the mapped arrays alone; the pickle loads on the first larger batch
+        probe = probe[:model.max_rows]
+    elif config.COMPILED_TREES or config.FUSED_LINEAR or config.XGBOOST_NATIVE:
+        model = compile_model(model, model_card)
+    predictor = Predictor(model)
+    if predictor.verify(probe):
+        print(f"   Single-pass scoring: on (saves ~{predictor.stats()['saved_ms_per_request']} ms/request)")
+    else:
+        print(f"   Single-pass scoring: off (label agreement {predictor.label_agreement:.3f})")
+    return predictor
+
+def native_model(model, probe):
+    """Booster.inplace_predict stand-in for XGBoost pipelines, or None"""
+    try:
+        native = native_xgboost(model, config.XGBOOST_NTHREAD)
+    except (ValueError, AttributeError):
+        return None
+    if max_abs_difference(model, native, probe) > 1e-6:
+        print("   Native XGBoost: off (predictions differ from the pipeline)")
+        return None
+    print(f"   Native XGBoost: inplace_predict with {config.XGBOOST_NTHREAD} thread(s)")
+    return native
+
+def compile_model(model, model_card):
+    """Compiled trees or fused preprocessing, used only when it matches the pipeline"""
+    probe = probe_matrix(model_card['feature_names'], n_students=1000)
+    native = native_model(model, probe) if config.XGBOOST_NATIVE else None
+    if not (config.COMPILED_TREES or config.FUSED_LINEAR):
+        return native or model
+
+    compiled, detail = compile_for_serving(
+        model, probe, max_rows=config.COMPILED_TREES_MAX_ROWS,
+        trees=config.COMPILED_TREES, linear=config.FUSED_LINEAR, fallback=native
+    )
+    if compiled is None:
+        print(f"   Compiled model: off ({detail})")
+        return native or model
+    summary = compiled.summary()
+    limit = f"batches <= {summary['max_rows']} rows" if summary['max_rows'] else "all batches"
+    print(f"   Compiled model: {summary['evaluator']} for {limit} ({detail})")
+    return compiled
+
+def mapped_model(model, model_card):
+    """
+    Memory-mapped arrays routed like compile_model's output: trees serve batches of
+    up to COMPILED_TREES_MAX_ROWS, larger ones go to the pickle (or native XGBoost)
+    """
+    mapped = model.mapped
+    if isinstance(mapped, FusedLinearModel):
+        compiled = CompiledPipeline(model, mapped)
+    else:
+        fallback = model
+        if config.XGBOOST_NATIVE and mapped.aggregate == 'sigmoid':
+            # XGBoost trees; verified against the pipeline once it is unpickled
+            probe = probe_matrix(model_card['feature_names'], n_students=1000)
+            fallback = DeferredModel(lambda: native_model(model.load(), probe) or model.load(),
+                                     'NativeXGBoostModel')
+        compiled = CompiledPipeline(fallback, mapped, config.COMPILED_TREES_MAX_ROWS)
+    summary = compiled.summary()
+    limit = f"batches <= {summary['max_rows']} rows" if summary['max_rows'] else "all batches"
+    print(f"   Compiled model: {summary['evaluator']} from memory-mapped arrays for {limit}")
+    return compiled
+
+def build_explainer(model, model_card):
+    """Importance-based explanations, or TreeSHAP when EXPLANATION_MODE=tree_shap"""
+    importance_engine = ExplanationEngine.from_model_card(model_card)
+    if config.EXPLANATION_MODE != 'tree_shap':
+        return importance_engine
+    try:
+        engine = ShapExplanationEngine(
+            model, model_card['feature_names'], importance_engine, model_version(model_card),
+            cache_size=config.SHAP_CACHE_SIZE, latency_budget_ms=config.SHAP_LATENCY_BUDGET_MS
+        )
+        print(f"   Explanations: TreeSHAP (budget {config.SHAP_LATENCY_BUDGET_MS} ms)")
+        return engine
+    except Exception as e:
+        print(f"⚠️  TreeSHAP unavailable for {model_card['best_model']} ({e}), using importance factors")
+        return importance_engine
+
+def build_bundle(model, model_card):
+    """Build and warm every per-model helper before the bundle starts serving"""
+    print(f"📦 Loading model: {model_card['best_model']} (trained {model_card['training_date']})")
+    bundle = ModelBundle(
+        model, model_card,
+        predictor=build_predictor(model, model_card),
+        assembler=FeatureAssembler(model_card['feature_names']),
+        explainer=build_explainer(model, model_card)
+    )
+    warm_up(bundle)
+    return bundle
+
+def warmup_matrix(model_card, n_rows):
+    """(rows, source) for the warm-up batch; cards without ranges use generated students"""
+    if config.WARMUP_SOURCE == 'card':
+        X = range_matrix(model_card, n_rows)
+        if X is not None:
+            return X, 'card'
+    X = probe_matrix(model_card['feature_names'], n_students=n_rows)
+    return X[:n_rows], 'generate'
+
+def warm_up(bundle, single_rows=16):
+    """
+    Run the warm-up batch through every serving path before the bundle goes live
+    First calls pay for lazy initialization; do it here, not on a request
+    """
+    if config.WARMUP_ROWS <= 0:
+        return
+    start = time.perf_counter()
+    X, source = warmup_matrix(bundle.model_card, config.WARMUP_ROWS)
+    for i in range(min(single_rows, len(X))):
+        bundle.predictor.predict(X[i:i + 1])
+    served = bundle.predictor.model
+    if isinstance(served, CompiledPipeline) and isinstance(served.model, DeferredModel):
+        # Memory-mapped: leave the pickle unloaded until a batch needs it
+        X = X[:served.max_rows]
+    bundle.predictor.predict(X)
+    bundle.explainer.top_factors(X[:8])
+    bundle.predictor.calls = 0
+    bundle.warmup = {'rows': len(X), 'source': source,
+                     'seconds': round(time.perf_counter() - start, 3)}
+    print(f"   Warm-up: {len(X)} rows from {source} in {bundle.warmup['seconds']}s")
+
+# Load trained model and metadata; new artifacts are swapped in without a restart.
+# Nothing is loaded until create_app() runs
+store = ModelStore(build_bundle, artifact_format=config.MODEL_ARTIFACT_FORMAT)
+
+def model_loaded(loaded):
+    if loaded:
+        startup_profile.mark('model_ready')
+        print("✅ Model loaded successfully")
+    else:
+        print("   Please run train_model.py first")
+
+# Other saved models (logistic_regression, xgboost, ...) load on first request
+registry = ModelRegistry(build_bundle, memory_budget_mb=config.MODEL_REGISTRY_BUDGET_MB,
+                         artifact_format=config.MODEL_ARTIFACT_FORMAT,
+                         refresh_seconds=config.MODEL_WATCH_INTERVAL_SECONDS)
+
+def resolve_bundle(name=None):
+    """
+    Serving bundle for a requested model name (None means the best model)
+    Returns (bundle, None), or (None, error response) for unknown names (404),
+    models that fail to load (503) and no model yet
+    """
+    bundle = store.current
+    if not name or (bundle and name == bundle.model_card['best_model']):
+        return (bundle, None) if bundle else (None, model_unavailable())
+    try:
+        return registry.get(name), None
+    except KeyError:
+        return None, model_not_found(name)
+    except Exception as e:
+        # A corrupt or half-written artifact; the next request tries again
+        print(f"❌ Error loading model {name}: {e}")
+        return None, (jsonify({'error': f"Model '{name}' could not be loaded, retry shortly"}), 503)
+
+def model_unavailable():
+    """503 while the model is still loading, 500 when there is none to load"""
+    if store.current is None and store.stats()['reloading']:
+        return jsonify({'error': 'Model is still loading, retry shortly'}), 503
+    return jsonify({'error': 'Model not loaded. Please train model first.'}), 500
+
+def requested_model():
+    """Model name from ?model=... or a top-level "model" field in a JSON object body"""
+    name = request.args.get('model')
+    if name is None and request.is_json:
+        body = request.get_json(silent=True)
+        if isinstance(body, dict):
+            name = body.get('model')
+    return name
+
+def model_not_found(name):
+    return jsonify({'error': f"Unknown model '{name}'", 'available': registry.available()}), 404
+
+# Long roster runs go to a local process pool instead of holding a request thread
+job_manager = JobManager(config.JOBS_DIR, config.JOB_WORKERS, chunk_size=BULK_CHUNK_SIZE,
+                         retention_hours=config.JOB_RETENTION_HOURS)
+
+# Large bulk uploads are scored across worker processes
+sharded_scorer = None
+if config.BULK_SHARD_WORKERS > 1:
+    # Workers build their predictors with build_predictor, like the bundles here
+    sharded_scorer = ShardedScorer(config.BULK_SHARD_WORKERS, config.BULK_SHARD_ROWS, config.BULK_SHARD_MIN_ROWS,
+                                   build_predictor=build_predictor, artifact_format=config.MODEL_ARTIFACT_FORMAT)
+
+# Repeat lookups of the same student skip the pipeline entirely
+prediction_cache = None
+if config.PREDICTION_CACHE_SIZE > 0:
+    prediction_cache = PredictionCache(config.PREDICTION_CACHE_SIZE, config.PREDICTION_CACHE_TTL_SECONDS)
+
+# Optional dynamic batching of concurrent /api/predict requests (started by create_app)
+batcher = None
+
+_started = False
+_start_lock = threading.Lock()
+
+def start_background_threads():
+    """
+    Micro-batcher and model watcher for this process
+    Threads don't survive fork, so serve.py's workers call this after forking
+    """
+    global batcher
+    if config.PREDICT_BATCHING:
+        batcher = MicroBatcher(config.PREDICT_BATCH_WINDOW_MS, config.PREDICT_BATCH_MAX_ROWS)
+        print(f"   Micro-batching: {config.PREDICT_BATCH_WINDOW_MS} ms / {config.PREDICT_BATCH_MAX_ROWS} rows")
+    if config.MODEL_WATCH_INTERVAL_SECONDS > 0:
+        store.watch(config.MODEL_WATCH_INTERVAL_SECONDS)
+
+def create_app(start_threads=True):
+    """
+    Load the default model and start the background threads, once per process
+    Importing this module does neither, so job and shard pool workers (which
+    re-import the main script) and tools that import it never load a model.
+    WSGI servers should load 'app:create_app()'; returns the Flask app
+    """
+    global _started
+    with _start_lock:
+        if not _started:
+            _started = True
+            interrupted = job_manager.fail_interrupted()
+            if interrupted:
+                print(f"⚠️  Marked {interrupted} job(s) interrupted by the last shutdown as failed")
+            if config.LEAN_STARTUP:
+                # Answer liveness probes now; /api/health/ready turns 200 once this finishes
+                store.reload_async(on_done=model_loaded)
+            else:
+                model_loaded(store.load())
+            if start_threads:
+                start_background_threads()
+    return app
+
+def require_admin():
+    """Error response unless the request carries the configured X-Admin-Token"""
+    if not config.ADMIN_TOKEN:
+        return jsonify({'error': 'Admin endpoints are disabled (set ADMIN_TOKEN)'}), 403
+    if request.headers.get('X-Admin-Token') != config.ADMIN_TOKEN:
+        return jsonify({'error': 'Invalid admin token'}), 403
+    return None
+
+# cProfile for single requests, on admin request or 1 in PROFILE_SAMPLE_EVERY
+request_profiler = RequestProfiler(config.PROFILE_DIR, config.PROFILE_RING_SIZE,
+                                   config.PROFILE_SAMPLE_EVERY)
+
+def profiled(view):
+    """
+    Run the view under cProfile when an admin sends X-Profile: 1 (the response
+    then carries X-Profile-Id) or when the sampler picks the request
+    Streamed bodies are produced after the view returns, so only their setup is profiled
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.headers.get('X-Profile', '').lower() in ('1', 'true', 'yes'):
+            denied = require_admin()
+            if denied:
+                return denied
+            trigger = 'admin'
+        elif request_profiler.should_sample():
+            trigger = 'sample'
+        else:
+            return view(*args, **kwargs)
+
+        result, profile_id = request_profiler.run(lambda: view(*args, **kwargs),
+                                                  metrics_endpoint(), trigger)
+        if trigger != 'admin':
+            return result
+        response = app.make_response(result)
+        response.headers['X-Profile-Id'] = profile_id or 'busy'
+        return response
+    return wrapper
+
+def preprocess_input(data, feature_names=None):
     """Preprocess input data to match training format"""
     # Create DataFrame
     df = pd.DataFrame([data])
@@ -51,36 +341,20 @@ def preprocess_input(data):
         )
     
     # Select features in correct order
-    feature_names = model_card['feature_names']
+    feature_names = feature_names or store.current.model_card['feature_names']
     X = df[feature_names]
     
     return X
 
-def calculate_shap_values(X):
+def calculate_shap_values(X, explainer=None):
     """
-    Simplified feature importance (in production, use actual SHAP)
-    Returns top 3 contributing factors
+    Top 3 contributing factors and the method behind them ('importance' by
+    default, 'shap' with EXPLANATION_MODE=tree_shap unless over budget)
+    X is a (1, n_features) array in model_card feature order
     """
-    feature_names = model_card['feature_names']
-    best_model_name = model_card['best_model']
-    
-    # Get feature importances from model card
-    importance_dict = model_card['feature_importance'].get(best_model_name, {})
-    
-    # Get actual values and multiply by importance
-    contributions = []
-    for feature in feature_names:
-        if feature in importance_dict and feature in X.columns:
-            value = X[feature].iloc[0]
-            importance = importance_dict[feature]
-            contributions.append({
-                'feature': feature.replace('_', ' ').title(),
-                'impact': float(value * importance * 10)  # Scaled for display
-            })
-    
-    # Sort by absolute impact and return top 3
-    contributions.sort(key=lambda x: abs(x['impact']), reverse=True)
-    return contributions[:3]
+    explainer = explainer or store.current.explainer
+    factors, methods = explainer.factors(X)
+    return factors[0], methods[0]
 
 def determine_risk_level(probability):
     """Determine risk level based on probability"""
@@ -91,19 +365,137 @@ def determine_risk_level(probability):
     else:
         return "high"
 
+def metrics_endpoint():
+    """Route pattern for metric labels; unmatched paths share one label"""
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+@app.before_request
+def ensure_started():
+    # Servers pointed at 'app:app' rather than the factory start up on the first request
+    if not _started:
+        create_app()
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    # Only until the first request served by a loaded model has been timed
+    g.first_request = (startup_profile.first_request_ms is None and store.current is not None
+                       and not request.path.startswith('/api/health'))
+
+@app.after_request
+def record_request(response):
+    started = g.pop('request_started', None)
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    endpoint = metrics_endpoint()
+    metrics.request_seconds.observe((endpoint,), elapsed)
+    metrics.requests_total.inc((endpoint, request.method, str(response.status_code)))
+    if g.pop('first_request', False):
+        startup_profile.record_request(elapsed)
+    return response
+
+def loaded_models():
+    """model_info samples: the default bundle plus every registry-loaded one"""
+    samples = []
+    bundles = [(store.current, 'true')] + [(bundle, 'false') for bundle in registry.bundles()]
+    for bundle, default in bundles:
+        if bundle is None:
+            continue
+        compiled = bundle.predictor.stats()['compiled']
+        evaluator = compiled['evaluator'] if compiled else type(bundle.model[-1]).__name__
+        samples.append(((bundle.model_card['best_model'], bundle.version, evaluator, default), 1))
+    return samples
+
+metrics.model_info.fn = loaded_models
+
+@app.route('/api/health/live', methods=['GET'])
+def liveness():
+    """Liveness: the process is up and serving HTTP, model or not"""
+    return jsonify({'status': 'alive'})
+
+@app.route('/api/health/ready', methods=['GET'])
+def readiness():
+    """Readiness: 200 once a model is loaded and warmed up, 503 before that"""
+    bundle = store.current
+    body = {
+        'ready': bundle is not None,
+        'version': bundle.version if bundle else None,
+        'warmup': bundle.warmup if bundle else None
+    }
+    return jsonify(body), 200 if bundle is not None else 503
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
+    bundle = store.current
+    model_card = bundle.model_card if bundle else None
     return jsonify({
         'status': 'healthy',
-        'model_loaded': model is not None,
+        'ready': bundle is not None,
+        'model_loaded': bundle is not None,
         'model_info': {
             'name': model_card['best_model'] if model_card else None,
             'training_date': model_card['training_date'] if model_card else None
-        } if model_card else None
+        } if model_card else None,
+        'model_store': store.stats(),
+        'predictor': bundle.predictor.stats() if bundle else None,
+        'batching': batcher.stats() if batcher else None,
+        'explanations': bundle.explainer.stats() if bundle else None,
+        'prediction_cache': prediction_cache.stats() if prediction_cache else None,
+        'registry': registry.stats(),
+        'warmup': bundle.warmup if bundle else None,
+        'startup': startup_profile.stats(),
+        'profiler': request_profiler.stats()
     })
 
+@app.route('/api/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus text-format metrics: latency histograms per endpoint and stage, counters, models"""
+    return Response(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/api/admin/reload', methods=['POST'])
+def reload_model():
+    """
+    Load the current artifacts in the background and swap them in
+    Requires the X-Admin-Token header; poll /api/health for model_store.version
+    """
+    denied = require_admin()
+    if denied:
+        return denied
+    started = store.reload_async()
+    return jsonify({'reloading': True, 'started': started, 'current_version': store.stats()['version']}), 202
+
+@app.route('/api/admin/profiles', methods=['GET'])
+def list_profiles():
+    """Saved request profiles, newest first (requires X-Admin-Token)"""
+    denied = require_admin()
+    if denied:
+        return denied
+    return jsonify({'profiler': request_profiler.stats(), 'profiles': request_profiler.list()})
+
+@app.route('/api/admin/profiles/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    """
+    One saved profile as a cProfile .prof file (snakeviz, flameprof, gprof2dot),
+    or as a pstats report with ?format=text[&sort=tottime]
+    """
+    denied = require_admin()
+    if denied:
+        return denied
+    path = request_profiler.path(profile_id)
+    if path is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    if request.args.get('format') == 'text':
+        sort = request.args.get('sort', 'cumulative')
+        if sort not in ('cumulative', 'tottime', 'ncalls', 'calls', 'time'):
+            return jsonify({'error': f'Unknown sort key: {sort}'}), 400
+        return Response(request_profiler.text(profile_id, sort), mimetype='text/plain')
+    return send_file(path, mimetype='application/octet-stream', as_attachment=True,
+                     download_name=f'{profile_id}.prof')
+
 @app.route('/api/predict', methods=['POST'])
+@profiled
 def predict_single():
     """
     Predict outcome for a single student
@@ -119,106 +511,322 @@ def predict_single():
         "sports_activity_score": 5,
         "curricular_activity_score": 9
     }
+    
+    An optional "model" field (or ?model=<name>) picks another saved model
     """
-    if not model:
-        return jsonify({'error': 'Model not loaded. Please train model first.'}), 500
+    # Everything below uses this bundle, even if a reload swaps in a new one meanwhile
+    name = requested_model()
+    bundle, error = resolve_bundle(name)
+    if error:
+        return error
     
     try:
+        stages = metrics.StageTimer('/api/predict')
         data = request.json
         
-        # Preprocess
-        X = preprocess_input(data)
-        
-        # Predict
-        prediction = model.predict(X)[0]
-        probability = model.predict_proba(X)[0][1]  # Probability of Pass
+        # Preprocess (pandas path only for payloads the assembler can't take)
+        X = bundle.assembler.assemble(data)
+        if X is None:
+            X = preprocess_input(data, bundle.model_card['feature_names']).to_numpy(dtype=np.float64)
+        # Same rule as bulk rows: NaN is imputed, infinity is rejected (compiled
+        # evaluators skip the pipeline's own check)
+        if np.isinf(X).any():
+            raise ValueError(INFINITE_INPUT_ERROR)
+        stages.lap('preprocess')
         
-        # Get explanation (simplified SHAP)
-        top_factors = calculate_shap_values(X)
-        
-        # Determine risk level
-        risk_level = determine_risk_level(probability)
+        version = bundle.version
+        scored = None
+        if prediction_cache:
+            scored = prediction_cache.get(X, version)
+            stages.lap('cache')
+        if scored is None:
+            # Predict (label, probability and risk from one predict_proba call)
+            result = batcher.predict(X, bundle.predictor) if batcher else bundle.predictor.predict(X)
+            prediction = result['label'][0]
+            probability = result['probability'][0]  # Probability of Pass
+            stages.lap('predict')
+            
+            # Get explanation (simplified SHAP)
+            top_factors, method = calculate_shap_values(X, bundle.explainer)
+            stages.lap('explain')
+            
+            scored = {
+                'prediction': 'Pass' if prediction == 1 else 'Fail',
+                'probability': float(probability),
+                'confidence': float(result['confidence'][0]),
+                'risk_level': str(result['risk_level'][0]),
+                'top_factors': top_factors,
+                'explanation_method': method
+            }
+            # Factors from the over-budget fallback aren't cached: a repeat gets SHAP
+            if prediction_cache and method == bundle.explainer.method:
+                prediction_cache.put(X, version, scored)
         
         # Create response
         response = {
             'student_id': data.get('student_id', 'unknown'),
-            'prediction': 'Pass' if prediction == 1 else 'Fail',
-            'probability': float(probability),
-            'confidence': float(probability if prediction == 1 else 1 - probability),
-            'risk_level': risk_level,
-            'top_factors': top_factors,
-            'timestamp': datetime.now().isoformat(),
-            'model_version': model_card['best_model']
+            **scored,
+            'timestamp': timestamp(),
+            'model_version': bundle.model_card['best_model']
         }
         
-        return jsonify(response)
+        encoded = json_response(response)
+        stages.lap('encode')
+        metrics.scored_rows_total.inc(('/api/predict', version))
+        return encoded
     
     except Exception as e:
+        metrics.errors_total.inc(('/api/predict', type(e).__name__))
         print(f"Error in prediction: {e}")
         traceback.print_exc()
         return jsonify({'error': str(e)}), 400
 
+def score_students(bundle, df, columns=False):
+    """
+    Score a frame of students in vectorized chunks
+    Returns (results, summary) where summary holds pass/fail/high_risk counts,
+    or the score_columns dict when columns is set
+    """
+    # Shards are pinned to this bundle's version, even if a reload lands meanwhile
+    sharded = sharded_scorer.bound(bundle) if sharded_scorer else None
+    score = score_columns if columns else score_frame
+    return score(bundle.predictor, bundle.explainer, bundle.model_card['feature_names'],
+                 df, sharded)
+
+def wants_stream():
+    """NDJSON streaming is selected by the Accept header or ?stream=1"""
+    if request.args.get('stream', '').lower() in ('1', 'true', 'yes'):
+        return True
+    return request.accept_mimetypes.best == 'application/x-ndjson'
+
+def wants_arrow():
+    """Arrow IPC results are selected by the Accept header or ?format=arrow"""
+    if request.args.get('format', '').lower() == 'arrow':
+        return True
+    return request.accept_mimetypes.best == ARROW_STREAM_MIMETYPE
+
+def columnar_upload(feature_names):
+    """
+    A pyarrow Table for a Parquet or Arrow IPC upload (multipart file or raw body),
+    recognised by content type or magic bytes; None for CSV and JSON requests
+    Only the columns scoring reads are loaded
+    """
+    if 'file' in request.files:
+        upload = request.files['file']
+        head = upload.stream.read(8)
+        upload.stream.seek(0)
+        fmt = detect_format(head, upload.mimetype)
+        source = upload.stream
+    elif request.is_json:
+        return None
+    else:
+        source = request.get_data()
+        fmt = detect_format(source[:8], request.content_type)
+    if fmt is None:
+        return None
+    return read_table(source, fmt, input_columns(feature_names))
+
+def stream_bulk_predictions(bundle, chunks):
+    """Yield one NDJSON line per student as each chunk is scored, then a summary line"""
+    total = 0
+    summary = {'pass': 0, 'fail': 0, 'high_risk': 0}
+    try:
+        for df in chunks:
+            results, chunk_summary = score_students(bundle, df)
+            total += len(results)
+            metrics.scored_rows_total.inc(('/api/predict/bulk', bundle.version), len(results))
+            for key in summary:
+                summary[key] += chunk_summary[key]
+            yield ndjson(results)
+    except Exception as e:
+        metrics.errors_total.inc(('/api/predict/bulk', type(e).__name__))
+        print(f"Error in streaming bulk prediction: {e}")
+        traceback.print_exc()
+        yield dumps({'error': str(e), 'total': total}) + b'\n'
+        return
+    yield dumps({'total': total, 'summary': summary}) + b'\n'
+
+def csv_chunks(upload, chunk_size):
+    """
+    Read an uploaded CSV chunk by chunk
+    The upload is copied to a private temp file first because Flask closes
+    request files once the view returns, before the response has streamed
+    """
+    spool = tempfile.TemporaryFile()
+    upload.save(spool)
+    spool.seek(0)
+    
+    def chunks():
+        try:
+            yield from pd.read_csv(spool, chunksize=chunk_size)
+        finally:
+            spool.close()
+    
+    return chunks()
+
+def json_chunks(records, chunk_size):
+    """Split an already-parsed JSON array into DataFrames of chunk_size rows"""
+    for start in range(0, len(records), chunk_size):
+        yield pd.DataFrame(records[start:start + chunk_size])
+
 @app.route('/api/predict/bulk', methods=['POST'])
+@profiled
 def predict_bulk():
     """
     Predict outcomes for multiple students
     
-    Expected: CSV file upload or JSON array
+    Expected: CSV, Parquet or Arrow IPC file upload (or a raw Parquet/Arrow
+    body), or a JSON array
+    Send Accept: application/x-ndjson (or ?stream=1) to stream one JSON line
+    per student followed by a summary line, or Accept: application/vnd.apache.arrow.stream
+    (or ?format=arrow) for an Arrow IPC results table; ?model=<name> picks another saved model
     """
-    if not model:
-        return jsonify({'error': 'Model not loaded. Please train model first.'}), 500
+    name = request.args.get('model')
+    bundle, error = resolve_bundle(name)
+    if error:
+        return error
     
     try:
-        # Check if file upload or JSON
-        if 'file' in request.files:
+        stages = metrics.StageTimer('/api/predict/bulk')
+        table = columnar_upload(bundle.model_card['feature_names'])
+        records = None
+        if table is None and 'file' not in request.files:
+            # Checked up front: a streamed response has already sent its 200
+            records = request.json
+            if not isinstance(records, list):
+                return jsonify({'error': 'Expected a JSON array of students'}), 400
+
+        if wants_stream() and not wants_arrow():
+            # CSV is read chunk by chunk so memory stays bounded by BULK_CHUNK_SIZE
+            if table is not None:
+                chunks = table_frames(table, BULK_CHUNK_SIZE)
+            elif 'file' in request.files:
+                chunks = csv_chunks(request.files['file'], BULK_CHUNK_SIZE)
+            else:
+                chunks = json_chunks(records, BULK_CHUNK_SIZE)
+            return Response(stream_with_context(stream_bulk_predictions(bundle, chunks)),
+                            mimetype='application/x-ndjson')
+        
+        # Check if columnar, CSV or JSON
+        if table is not None:
+            df = table.to_pandas()
+        elif 'file' in request.files:
             file = request.files['file']
             df = pd.read_csv(file)
         else:
-            data = request.json
-            df = pd.DataFrame(data)
+            df = pd.DataFrame(records)
+        stages.lap('parse')
         
-        results = []
-        for _, row in df.iterrows():
-            try:
-                X = preprocess_input(row.to_dict())
-                prediction = model.predict(X)[0]
-                probability = model.predict_proba(X)[0][1]
-                
-                results.append({
-                    'student_id': row.get('student_id', 'unknown'),
-                    'prediction': 'Pass' if prediction == 1 else 'Fail',
-                    'probability': float(probability),
-                    'risk_level': determine_risk_level(probability)
-                })
-            except Exception as e:
-                results.append({
-                    'student_id': row.get('student_id', 'unknown'),
-                    'error': str(e)
-                })
-        
-        return jsonify({
-            'total': len(results),
-            'predictions': results,
-            'summary': {
-                'pass': sum(1 for r in results if r.get('prediction') == 'Pass'),
-                'fail': sum(1 for r in results if r.get('prediction') == 'Fail'),
-                'high_risk': sum(1 for r in results if r.get('risk_level') == 'high')
-            }
-        })
+        if wants_arrow():
+            scored = score_students(bundle, df, columns=True)
+            stages.lap('score')
+            summary = dumps({'total': len(df), 'summary': score_summary(scored)})
+            response = Response(ipc_stream(results_batch(scored), {'summary': summary}, BULK_CHUNK_SIZE),
+                                mimetype=ARROW_STREAM_MIMETYPE)
+        else:
+            results, summary = score_students(bundle, df)
+            stages.lap('score')
+            response = json_response({
+                'total': len(results),
+                'predictions': results,
+                'summary': summary
+            })
+        stages.lap('encode')
+        metrics.scored_rows_total.inc(('/api/predict/bulk', bundle.version), len(df))
+        return response
     
+    except ColumnarUnavailable as e:
+        metrics.errors_total.inc(('/api/predict/bulk', type(e).__name__))
+        return jsonify({'error': str(e)}), 415
     except Exception as e:
+        metrics.errors_total.inc(('/api/predict/bulk', type(e).__name__))
         print(f"Error in bulk prediction: {e}")
         traceback.print_exc()
         return jsonify({'error': str(e)}), 400
 
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """
+    Submit a bulk scoring job (same bodies as /api/predict/bulk: CSV, Parquet or
+    Arrow IPC upload, or a JSON array)
+    Returns 202 with the job id; poll /api/jobs/<job_id> for progress
+    """
+    name = request.args.get('model')
+    if name and name not in registry.available():
+        return model_not_found(name)
+    if not store.current:
+        return model_unavailable()
+    model_path = registry.model_path(name) if name else None
+    
+    try:
+        # Jobs read CSV; columnar uploads are converted when they are spooled
+        table = columnar_upload(store.current.model_card['feature_names'])
+        if table is not None:
+            status = job_manager.submit(lambda path: table.to_pandas().to_csv(path, index=False), model_path)
+        elif 'file' in request.files:
+            upload = request.files['file']
+            status = job_manager.submit(upload.save, model_path)
+        else:
+            records = request.json
+            if not isinstance(records, list):
+                return jsonify({'error': 'Expected a JSON array of students'}), 400
+            status = job_manager.submit(lambda path: pd.DataFrame(records).to_csv(path, index=False), model_path)
+        
+        status['status_url'] = f"/api/jobs/{status['job_id']}"
+        status['results_url'] = f"/api/jobs/{status['job_id']}/results"
+        return jsonify(status), 202
+    
+    except ColumnarUnavailable as e:
+        return jsonify({'error': str(e)}), 415
+    except Exception as e:
+        print(f"Error submitting job: {e}")
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Job state, row progress and running summary"""
+    status = job_manager.status(job_id)
+    if status is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(status)
+
+@app.route('/api/jobs/<job_id>/results', methods=['GET'])
+def job_results(job_id):
+    """NDJSON results (one line per student) once the job is done"""
+    status = job_manager.status(job_id)
+    if status is None:
+        return jsonify({'error': 'Job not found'}), 404
+    path = job_manager.results_path(job_id)
+    if path is None:
+        return jsonify({'error': f"Job is {status['state']}", 'state': status['state']}), 409
+    return send_file(path, mimetype='application/x-ndjson')
+
+@app.route('/api/models', methods=['GET'])
+def list_models():
+    """Saved models that can be requested with ?model=<name>, and which are loaded"""
+    bundle = store.current
+    return jsonify({
+        'default': bundle.model_card['best_model'] if bundle else None,
+        **registry.stats()
+    })
+
+def cached_response(bundle, key, build):
+    """Responses that only depend on the model card are encoded once per bundle"""
+    body = bundle.responses.get(key)
+    if body is None:
+        body = bundle.responses[key] = dumps(build(bundle.model_card))
+    return encoded_response(body)
+
 @app.route('/api/analytics', methods=['GET'])
 def get_analytics():
     """Get cohort analytics and metrics"""
-    if not model_card:
+    bundle = store.current
+    if not bundle:
         return jsonify({'error': 'Model card not found'}), 500
     
     # Return model performance metrics and feature importance
-    return jsonify({
+    return cached_response(bundle, 'analytics', lambda model_card: {
         'model_performance': model_card['model_results'],
         'feature_importance': model_card['feature_importance'][model_card['best_model']],
         'best_model': model_card['best_model'],
@@ -228,31 +836,44 @@ def get_analytics():
 @app.route('/api/model/info', methods=['GET'])
 def model_info():
     """Get model metadata"""
-    if not model_card:
+    bundle = store.current
+    if not bundle:
         return jsonify({'error': 'Model card not found'}), 500
     
-    return jsonify(model_card)
+    return cached_response(bundle, 'model_info', lambda model_card: model_card)
 
 if __name__ == '__main__':
     print("\n" + "=" * 60)
     print("Student Performance Prediction API")
     print("=" * 60)
     
-    if model:
+    create_app()
+    if store.current:
+        model_card = store.current.model_card
         print("\n✅ API Server Ready")
         print(f"   Model: {model_card['best_model']}")
         print(f"   Features: {len(model_card['feature_names'])}")
         print("\n📍 Endpoints:")
         print("   GET  /api/health         - Health check")
+        print("   GET  /api/health/live    - Liveness probe")
+        print("   GET  /api/health/ready   - Readiness probe")
+        print("   GET  /api/metrics        - Prometheus metrics")
         print("   POST /api/predict        - Single prediction")
         print("   POST /api/predict/bulk   - Bulk predictions")
+        print("   POST /api/jobs           - Async bulk scoring job")
+        print("   GET  /api/jobs/<id>      - Job status / progress")
         print("   GET  /api/analytics      - Model analytics")
         print("   GET  /api/model/info     - Model metadata")
+        print("   GET  /api/models         - Models selectable with ?model=<name>")
+        print("   POST /api/admin/reload   - Hot-swap new model artifacts")
+        print("   GET  /api/admin/profiles - Saved request profiles (X-Profile: 1 to capture)")
+    elif config.LEAN_STARTUP:
+        print("\n⏳ Lean startup: model loading in the background (poll /api/health/ready)")
     else:
         print("\n⚠️  Model not loaded!")
         print("   Run: python train_model.py")
     
-    print("\n🚀 Starting server on http://localhost:5000")
+    print("\n🚀 Starting development server on http://localhost:5000 (production: python serve.py)")
     print("=" * 60 + "\n")
     
     app.run(debug=True, host='0.0.0.0', port=5000)
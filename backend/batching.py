@@ -0,0 +1,122 @@
+"""
+Dynamic micro-batching for single-student predictions
+Concurrent /api/predict requests are collected for a short window and
+scored together in one predict_proba call
+"""
+
+import queue
+import threading
+import time
+from collections import deque
+import numpy as np
+
+class _Pending:
+    """One queued request waiting for its slice of a batch result"""
+
+    __slots__ = ('row', 'predictor', 'enqueued', 'done', 'result', 'error')
+
+    def __init__(self, row, predictor):
+        self.row = row
+        self.predictor = predictor
+        self.enqueued = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class MicroBatcher:
+    """
+    Scores queued rows in batches of up to max_rows, waiting at most window_ms
+    Each row carries the predictor its request started with, so rows queued
+    across a model reload are never scored by the wrong model
+    """
+
+    def __init__(self, window_ms=2.0, max_rows=64):
+        self.window = window_ms / 1000
+        self.max_rows = max_rows
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._rows = 0
+        self._max_batch = 0
+        self._batch_sizes = deque(maxlen=1024)
+        self._queue_delays = deque(maxlen=1024)
+        self._worker = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+        self._worker.start()
+
+    def predict(self, X, predictor):
+        """Queue a (1, n_features) row and block until its batch has been scored"""
+        # Copy: the assembler reuses its row buffer on the next request
+        pending = _Pending(np.array(X, dtype=np.float64), predictor)
+        self._queue.put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _collect(self):
+        """Block for the first row, then gather more until the window or size limit"""
+        batch = [self._queue.get()]
+        deadline = batch[0].enqueued + self.window
+        while len(batch) < self.max_rows:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0
+                             else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _score(self, batch):
+        """Score rows that share a predictor in one call and hand each its slice"""
+        try:
+            result = batch[0].predictor.predict(np.vstack([p.row for p in batch]))
+        except Exception as e:
+            for pending in batch:
+                pending.error = e
+        else:
+            for i, pending in enumerate(batch):
+                pending.result = {key: values[i:i + 1] for key, values in result.items()}
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+
+            # Normally one group; two only while a model swap is in progress
+            groups = {}
+            for pending in batch:
+                groups.setdefault(id(pending.predictor), []).append(pending)
+            for group in groups.values():
+                self._score(group)
+
+            with self._lock:
+                self._batches += 1
+                self._rows += len(batch)
+                self._max_batch = max(self._max_batch, len(batch))
+                self._batch_sizes.append(len(batch))
+                self._queue_delays.extend(started - p.enqueued for p in batch)
+
+            for pending in batch:
+                pending.done.set()
+
+    def stats(self):
+        """Batch size and queueing delay over recent batches"""
+        with self._lock:
+            sizes = np.array(self._batch_sizes, dtype=np.float64)
+            delays = np.array(self._queue_delays, dtype=np.float64) * 1000
+            stats = {
+                'window_ms': self.window * 1000,
+                'max_rows': self.max_rows,
+                'batches': self._batches,
+                'rows': self._rows,
+                'max_batch_size': self._max_batch,
+                'queued': self._queue.qsize()
+            }
+        if len(sizes):
+            stats['mean_batch_size'] = round(float(sizes.mean()), 2)
+            stats['queue_delay_ms'] = {
+                'p50': round(float(np.percentile(delays, 50)), 3),
+                'p99': round(float(np.percentile(delays, 99)), 3),
+                'max': round(float(delays.max()), 3)
+            }
+        return stats
@@ -0,0 +1,520 @@
+"""
+Microbenchmarks for the prediction API hot paths
+Run from the backend directory after train_model.py: python benchmark.py
+Save results with --output and check them against a baseline with --compare
+"""
+
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+from contextlib import redirect_stdout
+import numpy as np
+import pandas as pd
+
+from generate_data import generate_student_data
+
+def best_time(fn, number, repeat=5):
+    """Best per-call time in microseconds over several timeit rounds"""
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number * 1e6
+
+def request_payloads(n_students=200):
+    """Synthetic /api/predict payloads with derived features left for the server"""
+    df = generate_student_data(n_students)
+    df = df.drop(columns=['engagement_index', 'final_result', 'final_grade', 'target_category'])
+    return df.to_dict('records')
+
+def load_app():
+    """The app module with its default model loaded"""
+    import app
+    app.create_app()
+    return app
+
+def bench_feature_assembly(number=2000):
+    """pandas preprocess_input vs the compiled FeatureAssembler for one student"""
+    app = load_app()
+
+    payloads = request_payloads()
+
+    # Both paths must produce exactly the same bits for every payload (also
+    # covered by tests/test_scoring.py; checked here on the served feature order)
+    for data in payloads:
+        expected = app.preprocess_input(data).to_numpy(dtype=np.float64)
+        actual = app.store.current.assembler.assemble(data)
+        if actual is None or expected.tobytes() != actual.tobytes():
+            raise RuntimeError(f"FeatureAssembler differs from preprocess_input for {data['student_id']}")
+
+    data = payloads[0]
+    pandas_us = best_time(lambda: app.preprocess_input(data).to_numpy(dtype=np.float64), number // 10)
+    assembler_us = best_time(lambda: app.store.current.assembler.assemble(data), number)
+
+    print("\n⏱️  Feature assembly (single student)")
+    print(f"   Verified bit-identical on {len(payloads)} payloads")
+    print(f"   pandas preprocess_input: {pandas_us:8.1f} µs")
+    print(f"   FeatureAssembler:        {assembler_us:8.1f} µs  ({pandas_us / assembler_us:.0f}x faster)")
+
+    return {'pandas_us': pandas_us, 'assembler_us': assembler_us}
+
+def bench_request_path(models=None, number=200):
+    """preprocess_input, calculate_shap_values, the predictor and the whole /api/predict per saved model"""
+    app = load_app()
+
+    data = request_payloads(1)[0]
+    feature_names = app.store.current.model_card['feature_names']
+    preprocess_us = best_time(lambda: app.preprocess_input(data, feature_names), number)
+    print("\n⏱️  Request path (single student)")
+    print(f"   preprocess_input: {preprocess_us:8.1f} µs")
+    timings = {'preprocess_input_us': preprocess_us}
+
+    # Repeats of one payload would otherwise be answered by the prediction cache
+    client = app.app.test_client()
+    cache, app.prediction_cache = app.prediction_cache, None
+    try:
+        for name in models or app.registry.available():
+            bundle = app.registry.get(name)
+            X = bundle.assembler.assemble(data).copy()
+            row = {
+                'predict_us': best_time(lambda: bundle.predictor.predict(X), number),
+                'calculate_shap_values_us': best_time(lambda: app.calculate_shap_values(X, bundle.explainer), number),
+                'endpoint_us': best_time(lambda: client.post(f'/api/predict?model={name}', json=data), number)
+            }
+            timings[name] = row
+            print(f"   {name:20s} predict {row['predict_us']:8.1f} µs  "
+                  f"shap {row['calculate_shap_values_us']:8.1f} µs  /api/predict {row['endpoint_us']:8.1f} µs")
+    finally:
+        app.prediction_cache = cache
+    return timings
+
+def bench_bulk_scoring(sizes=(1000, 10000, 100000), models=None, repeat=3):
+    """score_students (the /api/predict/bulk scoring path) per saved model and roster size"""
+    app = load_app()
+
+    roster = synthetic_roster(max(sizes))
+    print("\n⏱️  Bulk scoring")
+    timings = {}
+    for name in models or app.registry.available():
+        bundle = app.registry.get(name)
+        timings[name] = {}
+        for size in sizes:
+            frame = roster.iloc[:size]
+            seconds = best_time(lambda: app.score_students(bundle, frame), 1, repeat) / 1e6
+            timings[name][size] = {'score_seconds': seconds, 'rows_per_second': size / seconds}
+            print(f"   {name:20s} {size:7,d} rows  {seconds * 1000:9.1f} ms  {size / seconds:>10,.0f} rows/s")
+    return timings
+
+def bench_training(sizes=(500, 2000, 10000)):
+    """load_and_preprocess_data and train_models on generate_student_data datasets"""
+    from sklearn.model_selection import train_test_split
+    from train_model import create_feature_set, load_and_preprocess_data, train_models
+
+    print("\n⏱️  Training")
+    timings = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            path = os.path.join(tmp, f'students_{size}.csv')
+            generate_student_data(size).to_csv(path, index=False)
+            load_seconds = best_time(lambda: load_and_preprocess_data(path), 1, 3) / 1e6
+
+            X, y, _ = create_feature_set(load_and_preprocess_data(path))
+            split = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+            start = time.perf_counter()
+            with redirect_stdout(io.StringIO()):
+                models, _ = train_models(*split)
+            train_seconds = time.perf_counter() - start
+
+            timings[size] = {'load_seconds': load_seconds, 'train_seconds': train_seconds}
+            print(f"   {size:6,d} students  load {load_seconds * 1000:8.1f} ms  "
+                  f"train {train_seconds:7.2f} s ({', '.join(models)})")
+    return timings
+
+def bench_json_encoding(n_rows=10000, number=20):
+    """Flask jsonify vs the configured response encoder for bulk, single and model-card bodies"""
+    app = load_app()
+    from encoding import ENCODERS, encoder_name, orjson, timestamp
+
+    bundle = app.store.current
+    results, summary = app.score_students(bundle, synthetic_roster(n_rows))
+    bodies = {
+        f'bulk ({n_rows:,} rows)': {'total': len(results), 'predictions': results, 'summary': summary},
+        'single prediction': dict(results[0], confidence=results[0]['probability'],
+                                  timestamp=timestamp(), model_version=bundle.model_card['best_model']),
+        'model info': bundle.model_card
+    }
+
+    print(f"\n⏱️  JSON encoding (configured encoder: {encoder_name()})")
+    timings = {}
+    with app.app.app_context():
+        for label, body in bodies.items():
+            rounds = number if label.startswith('bulk') else number * 100
+            jsonify_us = best_time(lambda: app.jsonify(body).get_data(), rounds)
+            row = {'jsonify_us': jsonify_us}
+            for name, dumps in ENCODERS.items():
+                if name != 'orjson' or orjson is not None:
+                    row[f'{name}_us'] = best_time(lambda: dumps(body), rounds)
+            timings[label] = row
+            print(f"   {label:20s} " + "  ".join(f"{key[:-3]} {us:10.1f} µs" for key, us in row.items()))
+    return timings
+
+def bench_columnar_upload(n_rows=100000, number=3):
+    """Bulk request bodies: CSV vs Parquet/Arrow IPC uploads, JSON vs Arrow IPC results"""
+    app = load_app()
+    from columnar import ColumnarUnavailable, input_columns, ipc_stream, pyarrow, read_table, results_batch
+    from encoding import dumps
+
+    try:
+        pa = pyarrow()
+    except ColumnarUnavailable as e:
+        print(f"\n⏭️  Columnar uploads skipped: {e}")
+        return None
+
+    bundle = app.store.current
+    roster = synthetic_roster(n_rows)
+    table = pa.Table.from_pandas(roster, preserve_index=False)
+    columns = input_columns(bundle.model_card['feature_names'])
+    parquet, arrow = io.BytesIO(), io.BytesIO()
+    pa.parquet.write_table(table, parquet)
+    with pa.ipc.new_stream(arrow, table.schema) as writer:
+        writer.write_table(table)
+    uploads = {
+        'csv': (roster.to_csv(index=False).encode(), lambda body: pd.read_csv(io.BytesIO(body))),
+        'parquet': (parquet.getvalue(), lambda body: read_table(body, 'parquet', columns).to_pandas()),
+        'arrow_stream': (arrow.getvalue(), lambda body: read_table(body, 'arrow_stream', columns).to_pandas())
+    }
+
+    print(f"\n⏱️  Bulk upload parsing ({n_rows:,} rows)")
+    timings = {}
+    for fmt, (body, parse) in uploads.items():
+        parse_ms = best_time(lambda: parse(body), number) / 1000
+        timings[fmt] = {'bytes': len(body), 'parse_ms': parse_ms}
+        print(f"   {fmt:12s} {len(body) / 1e6:7.1f} MB  parse {parse_ms:8.1f} ms")
+
+    # Scoring included: JSON results need a dict per student, Arrow takes the columns as they are
+    def json_results():
+        results, summary = app.score_students(bundle, roster)
+        return dumps({'total': len(results), 'predictions': results, 'summary': summary})
+
+    json_ms = best_time(json_results, number) / 1000
+    arrow_ms = best_time(lambda: ipc_stream(results_batch(app.score_students(bundle, roster, columns=True))),
+                         number) / 1000
+    print(f"   score + encode results: JSON {json_ms:.1f} ms, Arrow IPC {arrow_ms:.1f} ms")
+    timings['results'] = {'json_ms': json_ms, 'arrow_ms': arrow_ms}
+    return timings
+
+def bench_metrics_overhead(number=20000):
+    """Per-request cost of the /api/metrics instrumentation on /api/predict"""
+    import metrics
+
+    def instrumented_request():
+        stages = metrics.StageTimer('/bench')
+        for stage in ('preprocess', 'cache', 'predict', 'explain', 'encode'):
+            stages.lap(stage)
+        metrics.scored_rows_total.inc(('/bench', 'v1'))
+        metrics.request_seconds.observe(('/bench',), 0.0005)
+        metrics.requests_total.inc(('/bench', 'POST', '200'))
+
+    overhead_us = best_time(instrumented_request, number)
+    print(f"\n⏱️  Metrics: {overhead_us:.2f} µs of instrumentation per /api/predict request")
+    return {'per_request_us': overhead_us}
+
+def held_out_split(data_path='sample_students.csv'):
+    """The X_test train_model.py evaluated on (same split and seed)"""
+    from sklearn.model_selection import train_test_split
+    from train_model import create_feature_set, load_and_preprocess_data
+
+    X, y, _ = create_feature_set(load_and_preprocess_data(data_path))
+    _, X_test, _, _ = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+    return X_test.to_numpy(dtype=np.float64)
+
+def load_saved_model(name):
+    import pickle
+
+    with open(f'models/{name}.pkl', 'rb') as f:
+        return pickle.load(f)
+
+def compare_with_pipeline(name, model, compiled, batch_sizes, label='compiled'):
+    """Held-out equivalence (1e-6) and per-batch latency of a stand-in vs its pipeline"""
+    from model_compiler import max_abs_difference
+
+    X_test = held_out_split()
+    difference = max_abs_difference(model, compiled, X_test)
+    if not difference <= 1e-6:
+        raise RuntimeError(f"{name}: {label} model differs by {difference:.2e}")
+    print(f"   Held-out max |Δp|: {difference:.1e} on {len(X_test)} rows")
+
+    rows = synthetic_roster_matrix(max(batch_sizes))
+    timings = {}
+    for size in batch_sizes:
+        batch = rows[:size]
+        number = max(1, 2000 // size)
+        pipeline_us = best_time(lambda: model.predict_proba(batch), number)
+        compiled_us = best_time(lambda: compiled.predict_proba(batch), number)
+        timings[size] = {'pipeline_us': pipeline_us, f'{label}_us': compiled_us}
+        print(f"   {size:5d} rows: pipeline {pipeline_us:10.1f} µs  {label} {compiled_us:10.1f} µs  "
+              f"({pipeline_us / compiled_us:5.1f}x)")
+    return timings
+
+def bench_compiled_trees(models=('random_forest', 'xgboost'), batch_sizes=(1, 16, 256, 4096)):
+    """Compiled tree evaluator vs the pickled pipeline's predict_proba"""
+    from model_compiler import compile_pipeline
+
+    timings = {}
+    for name in models:
+        model = load_saved_model(name)
+        compiled = compile_pipeline(model)
+        print(f"\n⏱️  Compiled trees: {name} ({compiled.n_nodes:,} nodes, depth {compiled.max_depth})")
+        timings[name] = compare_with_pipeline(name, model, compiled, batch_sizes)
+    return timings
+
+def bench_fused_linear(models=('logistic_regression', 'svm'), batch_sizes=(1, 16, 256, 4096)):
+    """Fused imputer/scaler(/coefficients) vs the pickled pipeline's predict_proba"""
+    from model_compiler import fuse_pipeline
+
+    timings = {}
+    for name in models:
+        model = load_saved_model(name)
+        fused = fuse_pipeline(model)
+        print(f"\n⏱️  Fused preprocessing: {name} ({type(fused).__name__})")
+        timings[name] = compare_with_pipeline(name, model, fused, batch_sizes, label='fused')
+    return timings
+
+def bench_native_xgboost(batch_sizes=(1, 16, 256, 4096, 65536), thread_counts=None):
+    """Booster.inplace_predict vs the XGBoost pipeline at several explicit thread counts"""
+    from model_compiler import native_xgboost
+
+    model = load_saved_model('xgboost')
+    cores = os.cpu_count() or 1
+    timings = {}
+    for nthread in thread_counts or sorted({1, cores}):
+        native = native_xgboost(model, nthread)
+        print(f"\n⏱️  Native XGBoost: inplace_predict, nthread={nthread}")
+        timings[nthread] = compare_with_pipeline('xgboost', model, native, batch_sizes, label='native')
+    return timings
+
+# Runs in a fresh interpreter so every import and load is cold
+_STARTUP_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter() - start
+app.create_app()
+while app.store.current is None and app.store.stats()['reloading']:
+    time.sleep(0.002)
+ready = time.perf_counter() - start
+client = app.app.test_client()
+response = client.post('/api/predict', json=json.loads(sys.argv[1]))
+print(json.dumps({
+    'import_seconds': imported,
+    'ready_seconds': ready,
+    'artifact_load_seconds': app.store.stats()['last_reload_seconds'],
+    'first_request_ms': client.get('/api/health').get_json()['startup']['first_request_ms'],
+    'status': response.status_code
+}))
+"""
+
+def import_times(importtime_log):
+    """Self import time per top-level package (ms) from python -X importtime output"""
+    totals = {}
+    for line in importtime_log.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        package = name.strip().split('.')[0]
+        totals[package] = totals.get(package, 0.0) + int(self_us) / 1000
+    return totals
+
+def bench_startup(modes=None, top=8):
+    """Cold-start profile: per-package import time, artifact load, readiness and first request"""
+    modes = modes or {
+        'default': {},
+        'lean': {'LEAN_STARTUP': '1'},
+        'lean + mmap': {'LEAN_STARTUP': '1', 'MODEL_ARTIFACT_FORMAT': 'mmap'}
+    }
+    payload = json.dumps(request_payloads(1)[0], default=float)
+    backend = os.path.dirname(os.path.abspath(__file__))
+    profiles = {}
+    for mode, overrides in modes.items():
+        env = dict(os.environ, MODEL_WATCH_INTERVAL_SECONDS='0', **overrides,
+                   PYTHONPATH=os.pathsep.join(filter(None, [backend, os.environ.get('PYTHONPATH')])))
+        run = subprocess.run([sys.executable, '-X', 'importtime', '-c', _STARTUP_PROBE, payload],
+                             env=env, capture_output=True, text=True, check=True)
+        result = json.loads(run.stdout.strip().splitlines()[-1])
+        result['imports_ms'] = import_times(run.stderr)
+        profiles[mode] = result
+
+        heaviest = sorted(result['imports_ms'].items(), key=lambda item: -item[1])[:top]
+        print(f"\n⏱️  Startup ({mode})")
+        print(f"   import app:      {result['import_seconds'] * 1000:8.1f} ms")
+        print(f"   ready after:     {result['ready_seconds'] * 1000:8.1f} ms "
+              f"(artifact load + warm-up {result['artifact_load_seconds'] * 1000:.1f} ms)")
+        print(f"   first request:   {result['first_request_ms']:8.1f} ms (HTTP {result['status']})")
+        print("   heaviest imports: " + ", ".join(f"{name} {ms:.0f} ms" for name, ms in heaviest))
+    return profiles
+
+def synthetic_roster(n_rows, base_students=10000):
+    """n_rows students tiled from generate_student_data (generating 1M directly is slow)"""
+    base = generate_student_data(min(n_rows, base_students))
+    repeats = -(-n_rows // len(base))
+    return pd.concat([base] * repeats, ignore_index=True).iloc[:n_rows]
+
+def synthetic_roster_matrix(n_rows):
+    """Model-ready feature matrix for n_rows synthetic students"""
+    from scoring import build_feature_matrix, load_predictor
+
+    _, model_card = load_predictor()
+    X, _, _ = build_feature_matrix(synthetic_roster(n_rows), model_card['feature_names'])
+    return X
+
+def bench_sharded_scaling(n_rows=1_000_000, worker_counts=None, shard_rows=25000):
+    """Sharded predict_proba throughput on n_rows synthetic students vs worker count"""
+    from sharding import ShardedScorer
+    from scoring import build_feature_matrix, load_predictor, score_matrix
+
+    predictor, model_card = load_predictor()
+    X, valid, _ = build_feature_matrix(synthetic_roster(n_rows), model_card['feature_names'])
+    cores = os.cpu_count() or 1
+    worker_counts = worker_counts or sorted({w for w in (1, 2, 4, 8, 16, 32) if w <= cores} | {cores})
+
+    print(f"\n⏱️  Sharded bulk scoring ({n_rows:,} rows, {shard_rows:,}-row shards, {model_card['best_model']})")
+    start = time.perf_counter()
+    expected, _ = score_matrix(predictor, X, valid)
+    baseline = time.perf_counter() - start
+    print(f"   in-process:  {baseline:7.2f}s  {n_rows / baseline:>12,.0f} rows/s")
+
+    timings = {'in_process_seconds': baseline}
+    for workers in worker_counts:
+        scorer = ShardedScorer(workers, shard_rows, min_rows=0)
+        scorer.score_matrix(X[:workers * shard_rows], valid[:workers * shard_rows])  # start workers, load models
+        start = time.perf_counter()
+        probabilities, _ = scorer.score_matrix(X, valid)
+        elapsed = time.perf_counter() - start
+        scorer.shutdown()
+        assert np.allclose(probabilities, expected, equal_nan=True), "sharded results out of order"
+        timings[f'workers_{workers}_seconds'] = elapsed
+        print(f"   {workers:2d} workers:  {elapsed:7.2f}s  {n_rows / elapsed:>12,.0f} rows/s  "
+              f"speedup {timings[f'workers_{worker_counts[0]}_seconds'] / elapsed:5.2f}x")
+
+    return timings
+
+# Keys ending like this are timings (lower is better); *_per_second is throughput
+_TIME_SUFFIXES = ('_us', '_ms', '_seconds')
+
+def flatten(results, prefix=''):
+    """{'a': {'b_us': 1}} -> {'a/b_us': 1}, numbers only"""
+    flat = {}
+    for key, value in results.items():
+        path = f'{prefix}/{key}' if prefix else str(key)
+        if isinstance(value, dict):
+            flat.update(flatten(value, path))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = value
+    return flat
+
+def direction(path):
+    """1 when a bigger number is worse, -1 when it is better, 0 for non-performance values"""
+    parts = path.split('/')
+    if parts[-1].endswith('_per_second'):
+        return -1
+    if any(part.endswith(_TIME_SUFFIXES) for part in parts):
+        return 1
+    return 0
+
+def compare(baseline, current, threshold=0.10):
+    """
+    Metrics present in both result files that moved by more than threshold
+    Returns (regressions, improvements) as lists of (path, old, new, change)
+    """
+    old, new = flatten(baseline['results']), flatten(current['results'])
+    regressions, improvements = [], []
+    for path in sorted(old.keys() & new.keys()):
+        sign = direction(path)
+        if not sign or not old[path]:
+            continue
+        change = (new[path] - old[path]) / old[path]
+        if change * sign > threshold:
+            regressions.append((path, old[path], new[path], change))
+        elif change * sign < -threshold:
+            improvements.append((path, old[path], new[path], change))
+    return regressions, improvements
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_compare(baseline_path, current_path, threshold):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(current_path) as f:
+        current = json.load(f)
+    regressions, improvements = compare(baseline, current, threshold)
+    print(f"Comparing {current['meta'].get('commit')} against {baseline['meta'].get('commit')} "
+          f"(threshold {threshold:.0%})")
+    for label, rows in (('❌ Regressions', regressions), ('✅ Improvements', improvements)):
+        print(f"\n{label}: {len(rows)}")
+        for path, before, after, change in rows:
+            print(f"   {path:60s} {before:12.4g} -> {after:12.4g}  ({change:+.1%})")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backend hot-path benchmarks")
+    parser.add_argument('--sharding-rows', type=int, default=1_000_000,
+                        help="Synthetic rows for the sharded scaling benchmark (0 skips it)")
+    parser.add_argument('--only', help="Comma-separated suites to run (default: all)")
+    parser.add_argument('--output', help="Write all results to this JSON file")
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'),
+                        help="Compare two --output files instead of running; exits 1 on regressions")
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help="Relative change that counts as a regression (default 0.10)")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(run_compare(*args.compare, args.threshold))
+
+    suites = {
+        'startup': bench_startup,
+        'feature_assembly': bench_feature_assembly,
+        'request_path': bench_request_path,
+        'bulk_scoring': bench_bulk_scoring,
+        'training': bench_training,
+        'json_encoding': bench_json_encoding,
+        'columnar_upload': bench_columnar_upload,
+        'metrics_overhead': bench_metrics_overhead,
+        'compiled_trees': bench_compiled_trees,
+        'fused_linear': bench_fused_linear,
+        'native_xgboost': bench_native_xgboost,
+        'sharding': lambda: bench_sharded_scaling(args.sharding_rows) if args.sharding_rows else None
+    }
+    selected = args.only.split(',') if args.only else list(suites)
+    unknown = [name for name in selected if name not in suites]
+    if unknown:
+        parser.error(f"unknown suite(s): {', '.join(unknown)} (choose from {', '.join(suites)})")
+
+    print("=" * 60)
+    print("Student Performance Prediction - Benchmarks")
+    print("=" * 60)
+
+    results = {name: suites[name]() for name in selected}
+
+    if args.output:
+        report = {
+            'meta': {
+                'commit': git_commit(),
+                'created_at': datetime.datetime.now().isoformat(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count()
+            },
+            'results': results
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, default=float)
+        print(f"\n💾 Results written to {args.output}")
@@ -0,0 +1,110 @@
+"""
+In-process prediction cache
+Bounded LRU with TTL, keyed on a canonical hash of the engineered feature
+vector plus the model version
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict, deque
+import numpy as np
+
+# Retired versions remembered per model: enough for requests that straddle a few swaps
+RETIRED_PER_MODEL = 4
+
+def feature_key(X):
+    """Canonical hash of a feature row: -0.0 and every NaN payload hash the same"""
+    canonical = np.where(np.isnan(X), np.nan, np.asarray(X, dtype=np.float64) + 0.0)
+    return hashlib.blake2b(np.ascontiguousarray(canonical).tobytes(), digest_size=16).digest()
+
+class PredictionCache:
+    """
+    LRU of scored responses shared by every served model
+    Versions look like '<model name>@<training date>'; when a model gets a new
+    version its old entries are dropped, and requests still running on the
+    retired version bypass the cache instead of flushing the new one
+    """
+
+    def __init__(self, max_entries=4096, ttl_seconds=300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self._entries = OrderedDict()
+        self._versions = {}  # model name -> live version
+        self._retired = {}  # model name -> its last RETIRED_PER_MODEL versions
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _check_version(self, version):
+        """Adopt a new model version; False for retired ones (called with the lock held)"""
+        name = version.partition('@')[0]
+        live = self._versions.get(name)
+        if version == live:
+            return True
+        retired = self._retired.get(name)
+        if retired is not None and version in retired:
+            return False
+        if live is not None:
+            if retired is None:
+                retired = self._retired[name] = deque(maxlen=RETIRED_PER_MODEL)
+            retired.append(live)
+            stale = [key for key in self._entries if key[0] == live]
+            for key in stale:
+                del self._entries[key]
+            if stale:
+                self.invalidations += 1
+        self._versions[name] = version
+        return True
+
+    def get(self, X, version):
+        """Cached result for X under this model version, or None"""
+        key = (version, feature_key(X))
+        with self._lock:
+            if not self._check_version(version):
+                self.misses += 1
+                return None
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, result = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, X, version, result):
+        """Store a result, evicting the least recently used entries beyond max_entries"""
+        key = (version, feature_key(X))
+        with self._lock:
+            if not self._check_version(version):
+                return
+            self._entries[key] = (time.monotonic(), result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        """Counters for /api/health"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations
+            }
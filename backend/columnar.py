@@ -0,0 +1,145 @@
+"""
+Parquet and Arrow IPC support for bulk scoring
+pyarrow is optional and imported on first use; without it columnar uploads
+and Arrow responses are refused and CSV/JSON keep working as before
+"""
+
+import io
+import numpy as np
+
+from scoring import ACTIVITY_COLUMNS, DERIVED_FEATURES
+
+ARROW_STREAM_MIMETYPE = 'application/vnd.apache.arrow.stream'
+
+# Upload formats by declared content type
+CONTENT_TYPES = {
+    'application/vnd.apache.parquet': 'parquet',
+    'application/x-parquet': 'parquet',
+    'application/parquet': 'parquet',
+    'application/vnd.apache.arrow.file': 'arrow_file',
+    'application/vnd.apache.arrow.stream': 'arrow_stream'
+}
+
+# ...and by leading bytes, for clients that send application/octet-stream.
+# IPC streams start with a 0xFFFFFFFF continuation marker before the schema
+MAGIC_BYTES = (
+    (b'PAR1', 'parquet'),
+    (b'ARROW1', 'arrow_file'),
+    (b'\xff\xff\xff\xff', 'arrow_stream')
+)
+
+class ColumnarUnavailable(RuntimeError):
+    """Raised when a columnar upload or response needs pyarrow and it isn't installed"""
+
+_pyarrow = None
+
+def pyarrow():
+    """The pyarrow module, imported on first use"""
+    global _pyarrow
+    if _pyarrow is None:
+        try:
+            import pyarrow as pa
+            import pyarrow.ipc
+            import pyarrow.parquet
+        except ImportError:  # optional: pip install pyarrow
+            raise ColumnarUnavailable('Parquet/Arrow support requires pyarrow (pip install pyarrow)')
+        _pyarrow = pa
+    return _pyarrow
+
+def detect_format(head, content_type=None):
+    """
+    'parquet', 'arrow_file' or 'arrow_stream' for an upload, None for CSV/JSON
+    The content type wins; otherwise the first bytes of the body decide
+    """
+    if content_type:
+        fmt = CONTENT_TYPES.get(content_type.split(';')[0].strip().lower())
+        if fmt:
+            return fmt
+    for magic, fmt in MAGIC_BYTES:
+        if head.startswith(magic):
+            return fmt
+    return None
+
+def input_columns(feature_names):
+    """Raw columns bulk scoring reads (derived features are computed when absent)"""
+    columns = ['student_id']
+    columns += [f for f in feature_names if f not in DERIVED_FEATURES]
+    columns += list(DERIVED_FEATURES) + ACTIVITY_COLUMNS + ['internal_marks_avg', 'attendance_pct']
+    return list(dict.fromkeys(columns))
+
+def read_table(source, fmt, columns=None):
+    """
+    Read a Parquet file or Arrow IPC file/stream (a file object or bytes) into a
+    pyarrow Table; only the requested columns that exist are read, and Parquet
+    skips the others without decoding them
+    """
+    pa = pyarrow()
+    if isinstance(source, bytes):
+        source = pa.BufferReader(source)
+    if fmt == 'parquet':
+        parquet = pa.parquet.ParquetFile(source)
+        names = parquet.schema_arrow.names
+        wanted = [c for c in columns if c in names] if columns is not None else None
+        return parquet.read(columns=wanted)
+
+    if fmt == 'arrow_file':
+        table = pa.ipc.open_file(source).read_all()
+    else:
+        table = pa.ipc.open_stream(source).read_all()
+    if columns is not None:
+        table = table.select([c for c in columns if c in table.column_names])
+    return table
+
+def table_frames(table, chunk_size):
+    """
+    DataFrames of chunk_size rows from a Table
+    Numeric columns convert straight to NumPy buffers, never per-row Python objects
+    """
+    for start in range(0, table.num_rows, chunk_size):
+        yield table.slice(start, chunk_size).to_pandas()
+
+def _id_array(pa, ids):
+    """
+    Student ids keep their type when it's uniform, otherwise they become strings
+    Missing ids (None, or the NaN pandas fills in for absent ones) are null
+    """
+    ids = [None if isinstance(i, float) and i != i else i for i in ids]
+    try:
+        return pa.array(ids)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array([None if i is None else str(i) for i in ids], type=pa.string())
+
+def results_batch(scored):
+    """One Arrow record batch from score_columns output; invalid rows are null"""
+    pa = pyarrow()
+    valid = scored['valid']
+    invalid = ~valid
+
+    factors, methods = iter(scored['factors']), iter(scored['methods'])
+    top_factors, explanation_methods = [], []
+    for ok in valid.tolist():
+        top_factors.append(next(factors) if ok else None)
+        explanation_methods.append(next(methods) if ok else None)
+
+    return pa.RecordBatch.from_arrays([
+        _id_array(pa, scored['ids']),
+        pa.array(np.where(scored['labels'] == 1, 'Pass', 'Fail'), mask=invalid),
+        pa.array(scored['probabilities'], mask=invalid),
+        pa.array(scored['risks'], mask=invalid),
+        pa.array(top_factors, type=pa.list_(pa.struct([('feature', pa.string()),
+                                                       ('impact', pa.float64())]))),
+        pa.array(explanation_methods, type=pa.string()),
+        pa.array(scored['errors'], type=pa.string())
+    ], names=['student_id', 'prediction', 'probability', 'risk_level', 'top_factors',
+              'explanation_method', 'error'])
+
+def ipc_stream(batch, metadata=None, chunk_rows=None):
+    """Serialize a record batch as an Arrow IPC stream of chunk_rows-row batches"""
+    pa = pyarrow()
+    table = pa.Table.from_batches([batch])
+    if metadata:
+        table = table.replace_schema_metadata(metadata)
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table, max_chunksize=chunk_rows)
+    return sink.getvalue()
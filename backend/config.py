@@ -0,0 +1,93 @@
+"""
+Runtime configuration for the prediction API
+Every setting can be overridden with an environment variable of the same name
+"""
+
+import os
+
+def _flag(name, default=False):
+    """Read a boolean environment variable ('1', 'true', 'yes', 'on')"""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+# Lean startup: defer pandas until first use and load the model in the
+# background, so the process answers liveness probes before it is ready
+LEAN_STARTUP = _flag('LEAN_STARTUP')
+
+# Micro-batching for /api/predict (off by default)
+PREDICT_BATCHING = _flag('PREDICT_BATCHING')
+PREDICT_BATCH_WINDOW_MS = float(os.environ.get('PREDICT_BATCH_WINDOW_MS', 2.0))
+PREDICT_BATCH_MAX_ROWS = int(os.environ.get('PREDICT_BATCH_MAX_ROWS', 64))
+
+# Explanations: 'importance' (model card weights) or 'tree_shap' (RandomForest/XGBoost only)
+EXPLANATION_MODE = os.environ.get('EXPLANATION_MODE', 'importance')
+SHAP_LATENCY_BUDGET_MS = float(os.environ.get('SHAP_LATENCY_BUDGET_MS', 50.0))
+SHAP_CACHE_SIZE = int(os.environ.get('SHAP_CACHE_SIZE', 10000))
+
+# Prediction cache for /api/predict (0 entries disables it)
+PREDICTION_CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE', 4096))
+PREDICTION_CACHE_TTL_SECONDS = float(os.environ.get('PREDICTION_CACHE_TTL_SECONDS', 300.0))
+
+# Asynchronous bulk jobs (spooled under JOBS_DIR, scored by a local process pool)
+JOBS_DIR = os.environ.get('JOBS_DIR', 'jobs')
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+# Finished jobs (and their results) are deleted after this many hours (0 keeps them)
+JOB_RETENTION_HOURS = float(os.environ.get('JOB_RETENTION_HOURS', 24.0))
+
+# Multi-core bulk scoring: inputs of at least BULK_SHARD_MIN_ROWS rows are split
+# into BULK_SHARD_ROWS-row shards across BULK_SHARD_WORKERS processes (1 disables)
+BULK_SHARD_WORKERS = int(os.environ.get('BULK_SHARD_WORKERS', os.cpu_count() or 1))
+BULK_SHARD_ROWS = int(os.environ.get('BULK_SHARD_ROWS', 25000))
+BULK_SHARD_MIN_ROWS = int(os.environ.get('BULK_SHARD_MIN_ROWS', 50000))
+
+# Hot reload: poll the model artifacts every N seconds (0 disables the watcher)
+MODEL_WATCH_INTERVAL_SECONDS = float(os.environ.get('MODEL_WATCH_INTERVAL_SECONDS', 10.0))
+
+# Shared secret for /api/admin/* (X-Admin-Token header); unset disables them
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+# Multi-model registry: every models/*.pkl can be requested by name; cold models
+# are evicted once their combined pickle size on disk exceeds this budget
+MODEL_REGISTRY_BUDGET_MB = float(os.environ.get('MODEL_REGISTRY_BUDGET_MB', 1024))
+
+# Compiled tree evaluator for RandomForest/XGBoost: batches of up to
+# COMPILED_TREES_MAX_ROWS rows skip the estimator for flattened NumPy trees
+COMPILED_TREES = _flag('COMPILED_TREES', default=True)
+COMPILED_TREES_MAX_ROWS = int(os.environ.get('COMPILED_TREES_MAX_ROWS', 128))
+
+# Fused preprocessing for imputer/scaler pipelines: logistic regression becomes
+# one NaN-fill, dot product and sigmoid; SVM skips the separate sklearn steps
+FUSED_LINEAR = _flag('FUSED_LINEAR', default=True)
+
+# Native XGBoost serving: score through Booster.inplace_predict with imputer
+# medians applied in NumPy, using XGBOOST_NTHREAD threads per call
+XGBOOST_NATIVE = _flag('XGBOOST_NATIVE', default=True)
+XGBOOST_NTHREAD = int(os.environ.get('XGBOOST_NTHREAD', os.cpu_count() or 1))
+
+# Model artifact format: 'pickle', or 'mmap' to map the compiled/fused arrays
+# train_model.py writes next to each pickle (shared across worker processes)
+MODEL_ARTIFACT_FORMAT = os.environ.get('MODEL_ARTIFACT_FORMAT', 'pickle')
+
+# Warm-up: every new bundle scores WARMUP_ROWS synthetic rows (singly and as a
+# batch) before it serves. WARMUP_SOURCE is 'card' (uniform within the model
+# card's feature ranges) or 'generate' (generate_student_data); 0 rows disables
+WARMUP_ROWS = int(os.environ.get('WARMUP_ROWS', 256))
+WARMUP_SOURCE = os.environ.get('WARMUP_SOURCE', 'card')
+
+# Request profiling: admins can profile one request with X-Profile: 1 (needs
+# ADMIN_TOKEN); PROFILE_SAMPLE_EVERY=N also profiles 1 in N predict requests.
+# Profiles are kept in a ring of PROFILE_RING_SIZE files under PROFILE_DIR
+PROFILE_SAMPLE_EVERY = int(os.environ.get('PROFILE_SAMPLE_EVERY', 0))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+PROFILE_RING_SIZE = int(os.environ.get('PROFILE_RING_SIZE', 50))
+
+# Production server (serve.py): WEB_WORKERS processes forked after the model is
+# preloaded; WORKER_THREADS native (BLAS/OpenMP/XGBoost) threads per worker,
+# 0 meaning cores / workers
+WEB_WORKERS = int(os.environ.get('WEB_WORKERS', os.cpu_count() or 1))
+WORKER_THREADS = int(os.environ.get('WORKER_THREADS', 0))
+
+# Response JSON encoder: 'auto' (orjson when installed), 'orjson' or 'stdlib'
+JSON_ENCODER = os.environ.get('JSON_ENCODER', 'auto')
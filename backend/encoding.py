@@ -0,0 +1,59 @@
+"""
+Response encoding for the prediction API
+JSON goes through orjson when it is installed (it serializes NumPy scalars
+and arrays natively) and through the standard library otherwise. Both give
+the same documents as Flask's jsonify (which also sorts keys), except that orjson writes NaN and
+infinity as null where jsonify writes the non-standard NaN/Infinity tokens
+"""
+
+import json
+from datetime import datetime
+import numpy as np
+from flask import Response
+
+import config
+
+try:
+    import orjson
+except ImportError:  # optional: pip install orjson
+    orjson = None
+
+def _stdlib_default(value):
+    """NumPy values the json module can't serialize on its own"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def _stdlib_dumps(obj):
+    return json.dumps(obj, default=_stdlib_default, separators=(',', ':')).encode()
+
+def _orjson_dumps(obj):
+    return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+def encoder_name(setting=None):
+    """'orjson' or 'stdlib' for a JSON_ENCODER setting ('auto' prefers orjson)"""
+    setting = setting or config.JSON_ENCODER
+    if setting == 'stdlib' or orjson is None:
+        return 'stdlib'
+    return 'orjson'
+
+ENCODERS = {'orjson': _orjson_dumps, 'stdlib': _stdlib_dumps}
+dumps = ENCODERS[encoder_name()]
+
+def json_response(obj, status=200):
+    """Flask response with obj encoded by the configured encoder"""
+    return Response(dumps(obj), status=status, mimetype='application/json')
+
+def encoded_response(body, status=200):
+    """Flask response for bytes that were encoded (and cached) earlier"""
+    return Response(body, status=status, mimetype='application/json')
+
+def ndjson(records):
+    """One JSON line per record, as a single bytes chunk"""
+    return b''.join(dumps(record) + b'\n' for record in records)
+
+def timestamp():
+    """Response timestamp, in the format jsonify-era responses used (microseconds)"""
+    return datetime.now().isoformat()
@@ -0,0 +1,190 @@
+"""
+Explanations for predictions
+Importance-based factors are precomputed once per model so a whole batch
+costs one multiply and an argpartition; TreeSHAP is available as opt-in
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+class ExplanationEngine:
+    """Top contributing factors as value * importance, scaled for display"""
+
+    # Reported with every explanation: importance impacts and SHAP values are on different scales
+    method = 'importance'
+
+    def __init__(self, feature_names, importance, top_k=3, scale=10):
+        # Only features with a recorded importance can be reported
+        self.columns = np.array([i for i, f in enumerate(feature_names) if f in importance], dtype=np.intp)
+        self.weights = np.array([importance[feature_names[i]] for i in self.columns], dtype=np.float64) * scale
+        self.display_names = [feature_names[i].replace('_', ' ').title() for i in self.columns]
+        self.top_k = min(top_k, len(self.columns))
+
+    @classmethod
+    def from_model_card(cls, model_card, model_name=None):
+        """Build the engine for model_name (defaults to the card's best model)"""
+        model_name = model_name or model_card['best_model']
+        importance = model_card['feature_importance'].get(model_name, {})
+        return cls(model_card['feature_names'], importance)
+
+    def impacts(self, X):
+        """(N, n_reported) impact matrix for an (N, n_features) input"""
+        impacts = X[:, self.columns] * self.weights
+        # Missing inputs are imputed by the model; they contribute nothing here
+        return np.nan_to_num(impacts, nan=0.0, posinf=0.0, neginf=0.0)
+
+    def top_indices(self, impacts):
+        """Column indices of the top_k largest |impact| per row, largest first"""
+        k = self.top_k
+        if k == 0:
+            return np.empty((len(impacts), 0), dtype=np.intp)
+        magnitude = np.abs(impacts)
+        if k < magnitude.shape[1]:
+            top = np.argpartition(-magnitude, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(k), (len(magnitude), k))
+        order = np.argsort(-np.take_along_axis(magnitude, top, axis=1), axis=1, kind='stable')
+        return np.take_along_axis(top, order, axis=1)
+
+    def explain(self, X):
+        """(impact matrix, method name per row) for an (N, n_features) input"""
+        return self.impacts(X), [self.method] * len(X)
+
+    def factors(self, X):
+        """(list of top factor lists, explanation method per row) for the rows of X"""
+        impacts, methods = self.explain(X)
+        top = self.top_indices(impacts)
+        values = np.take_along_axis(impacts, top, axis=1).tolist()
+        names = self.display_names
+        return [
+            [{'feature': names[j], 'impact': v} for j, v in zip(row_idx, row_values)]
+            for row_idx, row_values in zip(top.tolist(), values)
+        ], methods
+
+    def top_factors(self, X):
+        """List of top factor lists, one per row of X"""
+        return self.factors(X)[0]
+
+    def stats(self):
+        """Engine summary for /api/health"""
+        return {'mode': 'importance'}
+
+class ShapExplanationEngine(ExplanationEngine):
+    """
+    Exact TreeSHAP contributions for RandomForest/XGBoost pipelines
+    The explainer is built once per model; contributions are memoized by
+    (model version, feature-vector hash) and rows that would blow the latency
+    budget fall back to the importance-based engine, reported with method
+    'importance' instead of 'shap'
+    """
+
+    method = 'shap'
+
+    def __init__(self, model, feature_names, fallback, model_version,
+                 cache_size=10000, latency_budget_ms=50.0, batch_rows=256, top_k=3):
+        import shap
+
+        self.preprocess = model[:-1]
+        self.explainer = shap.TreeExplainer(model[-1])
+        self.fallback = fallback
+        self.model_version = model_version
+        self.columns = np.arange(len(feature_names), dtype=np.intp)
+        self.display_names = [f.replace('_', ' ').title() for f in feature_names]
+        self.top_k = min(top_k, len(feature_names))
+        self.cache_size = cache_size
+        self.latency_budget = latency_budget_ms / 1000
+        self.batch_rows = batch_rows
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._seconds_per_row = None
+        self.hits = 0
+        self.misses = 0
+        self.fallbacks = 0
+
+    def _key(self, row):
+        return (self.model_version, hashlib.blake2b(row.tobytes(), digest_size=16).digest())
+
+    def _shap_values(self, X):
+        """Class-1 contributions for raw rows, whatever layout the shap version returns"""
+        values = self.explainer.shap_values(self.preprocess.transform(X))
+        if isinstance(values, list):
+            values = values[1]
+        elif values.ndim == 3:
+            values = values[:, :, 1]
+        return np.asarray(values, dtype=np.float64)
+
+    def impacts(self, X):
+        """SHAP contributions per row, importance-based impacts for rows over budget"""
+        return self.explain(X)[0]
+
+    def explain(self, X):
+        """(impact matrix, 'shap' or 'importance' per row) for an (N, n_features) input"""
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        impacts = np.zeros((len(X), len(self.columns)))
+        methods = [self.method] * len(X)
+        keys = [self._key(row) for row in X]
+
+        missing = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                cached = self._cache.get(key)
+                if cached is None:
+                    missing.append(i)
+                else:
+                    self._cache.move_to_end(key)
+                    impacts[i] = cached
+            self.hits += len(X) - len(missing)
+            self.misses += len(missing)
+
+        if not missing:
+            return impacts, methods
+
+        # Score misses in batches while the running cost estimate says rows still
+        # fit the budget; the last batch is cut to what fits, the rest gets cheap factors
+        start = time.perf_counter()
+        done = 0
+        while done < len(missing):
+            batch = missing[done:done + self.batch_rows]
+            elapsed = time.perf_counter() - start
+            estimate = self._seconds_per_row
+            if estimate is not None:
+                fits = int((self.latency_budget - elapsed) / estimate)
+                if fits < 1:
+                    break
+                batch = batch[:fits]
+            batch_start = time.perf_counter()
+            values = self._shap_values(X[batch])
+            per_row = (time.perf_counter() - batch_start) / len(batch)
+            impacts[batch] = values
+            with self._lock:
+                self._seconds_per_row = per_row if estimate is None else 0.8 * estimate + 0.2 * per_row
+                for i, row_values in zip(batch, values):
+                    self._cache[keys[i]] = row_values
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            done += len(batch)
+
+        if done < len(missing):
+            rows = np.array(missing[done:])
+            impacts[np.ix_(rows, self.fallback.columns)] = self.fallback.impacts(X[rows])
+            for i in rows.tolist():
+                methods[i] = self.fallback.method
+            with self._lock:
+                self.fallbacks += len(rows)
+        return impacts, methods
+
+    def stats(self):
+        """Cache and fallback counters for /api/health"""
+        with self._lock:
+            return {
+                'mode': 'tree_shap',
+                'cache_entries': len(self._cache),
+                'cache_hits': self.hits,
+                'cache_misses': self.misses,
+                'fallback_rows': self.fallbacks,
+                'latency_budget_ms': self.latency_budget * 1000,
+                'ms_per_row': round(self._seconds_per_row * 1000, 4) if self._seconds_per_row else None
+            }
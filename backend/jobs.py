@@ -0,0 +1,208 @@
+"""
+Asynchronous bulk scoring jobs
+Uploads are spooled to disk and scored by a local process pool, so long
+roster runs don't hold HTTP workers and need no external broker
+"""
+
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import multiprocessing
+import threading
+
+from explanations import ExplanationEngine
+from scoring import BULK_CHUNK_SIZE, load_predictor, score_frame
+from startup import lazy_import
+
+pd = lazy_import('pandas')
+
+_JOB_ID = re.compile(r'^[0-9a-f]{32}$')
+
+def _write_status(job_dir, status):
+    """Atomically replace status.json so readers never see a partial file"""
+    tmp = os.path.join(job_dir, 'status.json.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(status, f)
+    os.replace(tmp, os.path.join(job_dir, 'status.json'))
+
+def _read_status(job_dir):
+    with open(os.path.join(job_dir, 'status.json')) as f:
+        return json.load(f)
+
+def _count_rows(path, chunk_size=BULK_CHUNK_SIZE):
+    """
+    Data rows in a CSV as the parser sees them, for progress reporting
+    Quoted fields can span lines, so counting newlines would overshoot
+    """
+    return sum(len(chunk) for chunk in pd.read_csv(path, usecols=[0], dtype=str, chunksize=chunk_size))
+
+def run_job(job_dir, model_path, card_path, chunk_size=BULK_CHUNK_SIZE):
+    """Worker entry point: score input.csv chunk by chunk into results.ndjson"""
+    status = _read_status(job_dir)
+    status.update(state='running', started_at=datetime.now().isoformat())
+    _write_status(job_dir, status)
+
+    input_path = os.path.join(job_dir, 'input.csv')
+    partial_path = os.path.join(job_dir, 'results.ndjson.part')
+    try:
+        predictor, model_card = load_predictor(model_path, card_path)
+        explainer = ExplanationEngine.from_model_card(model_card)
+        status['rows_total'] = _count_rows(input_path, chunk_size)
+        status['model_version'] = model_card['best_model']
+
+        with open(partial_path, 'w') as out:
+            for df in pd.read_csv(input_path, chunksize=chunk_size):
+                results, summary = score_frame(predictor, explainer, model_card['feature_names'], df)
+                out.write(''.join(json.dumps(r) + '\n' for r in results))
+                out.flush()
+                status['rows_done'] += len(results)
+                for key in status['summary']:
+                    status['summary'][key] += summary[key]
+                _write_status(job_dir, status)
+
+        os.replace(partial_path, os.path.join(job_dir, 'results.ndjson'))
+        status['state'] = 'done'
+    except Exception as e:
+        status.update(state='failed', error=str(e))
+    status['finished_at'] = datetime.now().isoformat()
+    _write_status(job_dir, status)
+    return status['state']
+
+class JobManager:
+    """Submits bulk jobs to a lazily created process pool and reads their status from disk"""
+
+    def __init__(self, jobs_dir='jobs', max_workers=2, model_path='models/best_model.pkl',
+                 card_path='models/model_card.json', chunk_size=BULK_CHUNK_SIZE,
+                 retention_hours=24.0):
+        self.jobs_dir = os.path.abspath(jobs_dir)
+        self.max_workers = max_workers
+        self.model_path = model_path
+        self.card_path = card_path
+        self.chunk_size = chunk_size
+        self.retention_seconds = retention_hours * 3600
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                # spawn: the API process has live threads, which fork doesn't copy safely
+                self._pool = ProcessPoolExecutor(self.max_workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+            return self._pool
+
+    def job_dir(self, job_id):
+        """Directory for a job id, or None for ids that can't be ours"""
+        if not _JOB_ID.match(job_id or ''):
+            return None
+        path = os.path.join(self.jobs_dir, job_id)
+        return path if os.path.isdir(path) else None
+
+    def _job_dirs(self):
+        try:
+            names = os.listdir(self.jobs_dir)
+        except FileNotFoundError:
+            return []
+        return [os.path.join(self.jobs_dir, name) for name in names if _JOB_ID.match(name)]
+
+    def fail_interrupted(self):
+        """
+        Mark jobs a previous process left queued or running as failed
+        Their worker pool died with that process, so nothing would ever finish them.
+        Call once at startup, before this process submits anything; returns the count
+        """
+        failed = 0
+        for job_dir in self._job_dirs():
+            try:
+                status = _read_status(job_dir)
+            except (OSError, ValueError):
+                # Died while the upload was being spooled
+                status = {'job_id': os.path.basename(job_dir), 'state': 'queued', 'rows_done': 0,
+                          'rows_total': None, 'summary': {'pass': 0, 'fail': 0, 'high_risk': 0}}
+            if status['state'] not in ('queued', 'running'):
+                continue
+            status.update(state='failed', error='Interrupted by a server restart; resubmit the job',
+                          finished_at=datetime.now().isoformat())
+            _write_status(job_dir, status)
+            failed += 1
+        return failed
+
+    def purge_expired(self):
+        """Delete finished jobs whose status last changed over retention_hours ago; returns the count"""
+        if self.retention_seconds <= 0:
+            return 0
+        cutoff = time.time() - self.retention_seconds
+        purged = 0
+        for job_dir in self._job_dirs():
+            try:
+                finished = _read_status(job_dir)['state'] in ('done', 'failed')
+                expired = os.path.getmtime(os.path.join(job_dir, 'status.json')) < cutoff
+            except (OSError, ValueError, KeyError):
+                continue  # still being submitted, or already purged
+            if finished and expired:
+                shutil.rmtree(job_dir, ignore_errors=True)
+                purged += 1
+        return purged
+
+    def submit(self, save_input, model_path=None):
+        """
+        Create a job whose input.csv is written by save_input(path) and queue it
+        model_path picks another saved model (defaults to best_model.pkl)
+        Returns the initial status
+        """
+        self.purge_expired()
+        job_id = uuid.uuid4().hex
+        job_dir = os.path.join(self.jobs_dir, job_id)
+        os.makedirs(job_dir)  # jobs_dir too, on the first submit
+        save_input(os.path.join(job_dir, 'input.csv'))
+
+        status = {
+            'job_id': job_id,
+            'state': 'queued',
+            'rows_done': 0,
+            'rows_total': None,
+            'summary': {'pass': 0, 'fail': 0, 'high_risk': 0},
+            'created_at': datetime.now().isoformat()
+        }
+        _write_status(job_dir, status)
+
+        future = self._executor().submit(run_job, job_dir, model_path or self.model_path,
+                                         self.card_path, self.chunk_size)
+        future.add_done_callback(lambda f: self._on_done(job_dir, f))
+        return status
+
+    def _on_done(self, job_dir, future):
+        """Record jobs whose worker died before it could write its own status"""
+        if future.exception() is None:
+            return
+        status = _read_status(job_dir)
+        status.update(state='failed', error=f"Worker crashed: {future.exception()}",
+                      finished_at=datetime.now().isoformat())
+        _write_status(job_dir, status)
+        with self._lock:
+            # A broken pool rejects every later submit; start fresh next time
+            self._pool = None
+
+    def status(self, job_id):
+        """Current status with a progress fraction, or None for unknown jobs"""
+        job_dir = self.job_dir(job_id)
+        if job_dir is None:
+            return None
+        status = _read_status(job_dir)
+        total = status.get('rows_total')
+        status['progress'] = round(status['rows_done'] / total, 4) if total else (
+            1.0 if status['state'] == 'done' else 0.0)
+        return status
+
+    def results_path(self, job_id):
+        """Path to a finished job's NDJSON results, or None"""
+        job_dir = self.job_dir(job_id)
+        if job_dir is None:
+            return None
+        path = os.path.join(job_dir, 'results.ndjson')
+        return path if os.path.exists(path) else None
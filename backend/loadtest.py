@@ -0,0 +1,252 @@
+"""
+HTTP load generator for the prediction API
+Drives a server on this machine with a weighted mix of single, bulk and
+analytics requests built from generate_student_data, and reports throughput,
+latency percentiles and error rates per request type and concurrency level
+
+Usage (from the backend directory, after train_model.py):
+    python loadtest.py --serve builtin --concurrency 1,4,16 --duration 20
+    python loadtest.py --serve production --workers 4 --concurrency 16,64
+    python loadtest.py --url http://127.0.0.1:8000 --mix single=80,bulk=15,analytics=5
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+import numpy as np
+
+from generate_data import generate_student_data
+
+# Labels generate_student_data adds that a real client wouldn't send
+OUTCOME_COLUMNS = ['engagement_index', 'final_result', 'final_grade', 'target_category']
+
+ENDPOINTS = {
+    'single': ('POST', '/api/predict'),
+    'bulk': ('POST', '/api/predict/bulk'),
+    'analytics': ('GET', '/api/analytics')
+}
+
+# Werkzeug's threaded dev server, quiet so request logging doesn't skew results
+_BUILTIN_SERVER = """
+import logging, sys
+logging.getLogger('werkzeug').setLevel(logging.WARNING)
+import app
+app.create_app().run(host='127.0.0.1', port=int(sys.argv[1]), threaded=True)
+"""
+
+def parse_mix(text):
+    """'single=90,bulk=8,analytics=2' -> {'single': 90.0, ...}"""
+    mix = {}
+    for part in text.split(','):
+        kind, _, weight = part.partition('=')
+        kind = kind.strip()
+        if kind not in ENDPOINTS:
+            raise ValueError(f"unknown request type {kind!r} (choose from {', '.join(ENDPOINTS)})")
+        mix[kind] = float(weight or 1)
+    return mix
+
+def build_payloads(n_students, bulk_rows, bulk_bodies=20, seed=0):
+    """
+    Pre-encoded request bodies: one per student for /api/predict and
+    bulk_bodies random bulk_rows-row slices for /api/predict/bulk
+    """
+    records = generate_student_data(n_students).drop(columns=OUTCOME_COLUMNS).to_dict('records')
+    rng = random.Random(seed)
+    bulk_rows = min(bulk_rows, len(records))
+    starts = [rng.randrange(len(records) - bulk_rows + 1) for _ in range(bulk_bodies)]
+    return {
+        'single': [json.dumps(record).encode() for record in records],
+        'bulk': [json.dumps(records[start:start + bulk_rows]).encode() for start in starts],
+        'analytics': [None],
+        'bulk_rows': bulk_rows
+    }
+
+def worker(host, port, mix, payloads, deadline, samples, seed):
+    """Closed loop: one keep-alive connection, next request as soon as the last one returns"""
+    rng = random.Random(seed)
+    kinds, weights = list(mix), list(mix.values())
+    cursor = {kind: rng.randrange(len(payloads[kind])) for kind in kinds}
+    conn = http.client.HTTPConnection(host, port, timeout=120)
+    while time.perf_counter() < deadline:
+        kind = rng.choices(kinds, weights)[0]
+        method, path = ENDPOINTS[kind]
+        body = payloads[kind][cursor[kind] % len(payloads[kind])]
+        cursor[kind] += 1
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+
+        start = time.perf_counter()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException) as e:
+            status = type(e).__name__
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=120)
+        samples.append((kind, time.perf_counter() - start, status))
+    conn.close()
+
+def run_level(host, port, mix, payloads, concurrency, duration, seed=0):
+    """Run concurrency workers for duration seconds; returns (samples, elapsed seconds)"""
+    per_worker = [[] for _ in range(concurrency)]
+    start = time.perf_counter()
+    deadline = start + duration
+    threads = [threading.Thread(target=worker, daemon=True,
+                                args=(host, port, mix, payloads, deadline, per_worker[i], seed + i))
+               for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return [sample for samples in per_worker for sample in samples], elapsed
+
+def summarize(samples, elapsed, bulk_rows):
+    """Throughput, error rate and latency percentiles (ms) per request type and overall"""
+    report = {}
+    kinds = sorted({kind for kind, _, _ in samples})
+    for kind in kinds + ['all']:
+        selected = [s for s in samples if kind == 'all' or s[0] == kind]
+        latencies = np.array([latency for _, latency, _ in selected]) * 1000
+        errors = sum(1 for _, _, status in selected if not (isinstance(status, int) and status < 400))
+        p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+        report[kind] = {
+            'requests': len(selected),
+            'errors': errors,
+            'error_rate': errors / len(selected),
+            'requests_per_second': len(selected) / elapsed,
+            'p50_ms': p50, 'p90_ms': p90, 'p99_ms': p99, 'max_ms': latencies.max()
+        }
+        if kind == 'bulk':
+            report[kind]['rows_per_second'] = len(selected) * bulk_rows / elapsed
+    statuses = {}
+    for _, _, status in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    report['status_counts'] = statuses
+    return report
+
+def print_level(concurrency, report):
+    print(f"\n📈 Concurrency {concurrency}")
+    print(f"   {'type':10s} {'requests':>9s} {'req/s':>9s} {'errors':>8s} "
+          f"{'p50 ms':>9s} {'p90 ms':>9s} {'p99 ms':>9s} {'max ms':>9s}")
+    for kind, row in report.items():
+        if kind == 'status_counts':
+            continue
+        print(f"   {kind:10s} {row['requests']:9d} {row['requests_per_second']:9.1f} "
+              f"{row['error_rate']:8.2%} {row['p50_ms']:9.1f} {row['p90_ms']:9.1f} "
+              f"{row['p99_ms']:9.1f} {row['max_ms']:9.1f}")
+    if 'bulk' in report:
+        print(f"   bulk rows/s: {report['bulk']['rows_per_second']:,.0f}")
+    if any(status != '200' for status in report['status_counts']):
+        print(f"   statuses: {report['status_counts']}")
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def wait_ready(host, port, timeout=300, process=None):
+    """Poll /api/health/ready until the server reports a loaded model"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"server exited with status {process.returncode} (see --server-log)")
+        conn = http.client.HTTPConnection(host, port, timeout=5)
+        try:
+            conn.request('GET', '/api/health/ready')
+            if conn.getresponse().status == 200:
+                return
+        except (OSError, http.client.HTTPException):
+            pass
+        finally:
+            conn.close()
+        time.sleep(0.25)
+    raise TimeoutError(f"server on {host}:{port} not ready after {timeout}s")
+
+def start_server(kind, port, workers=None, log_path=None):
+    """
+    Start the app in a child process so the server doesn't share the load generator's GIL
+    'builtin' is Flask's threaded server, 'production' is serve.py's pre-forked workers
+    """
+    backend = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [backend, os.environ.get('PYTHONPATH')])))
+    if kind == 'builtin':
+        command = [sys.executable, '-c', _BUILTIN_SERVER, str(port)]
+    else:
+        command = [sys.executable, os.path.join(backend, 'serve.py'), '--host', '127.0.0.1',
+                   '--port', str(port)] + (['--workers', str(workers)] if workers else [])
+    log = open(log_path, 'w') if log_path else subprocess.DEVNULL
+    return subprocess.Popen(command, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local HTTP load test for the prediction API")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--url', help="Base URL of an already running server")
+    target.add_argument('--serve', choices=['builtin', 'production'],
+                        help="Start the app (Flask's server or serve.py) on a free local port for the test")
+    parser.add_argument('--workers', type=int, help="serve.py worker processes for --serve production")
+    parser.add_argument('--concurrency', default='1,4,16',
+                        help="Comma-separated concurrent client counts to step through (default 1,4,16)")
+    parser.add_argument('--duration', type=float, default=20.0, help="Seconds per concurrency level")
+    parser.add_argument('--warmup', type=float, default=3.0, help="Unmeasured seconds before each level")
+    parser.add_argument('--mix', default='single=90,bulk=8,analytics=2',
+                        help="Request weights (default single=90,bulk=8,analytics=2)")
+    parser.add_argument('--students', type=int, default=10000,
+                        help="Distinct students in the payload pool (more than PREDICTION_CACHE_SIZE avoids cache hits)")
+    parser.add_argument('--bulk-rows', type=int, default=500, help="Students per bulk request")
+    parser.add_argument('--server-log', help="Where --serve writes the server's output (default: discarded)")
+    parser.add_argument('--output', help="Write the per-level reports to this JSON file")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    levels = [int(level) for level in args.concurrency.split(',')]
+
+    print("=" * 60)
+    print("Student Performance Prediction - Load Test")
+    print("=" * 60)
+    print(f"\n🧪 Building payloads: {args.students:,} students, {args.bulk_rows}-row bulk bodies")
+    payloads = build_payloads(args.students, args.bulk_rows)
+
+    server = None
+    if args.serve:
+        host, port = '127.0.0.1', free_port()
+        print(f"🚀 Starting {args.serve} server on {host}:{port}")
+        server = start_server(args.serve, port, args.workers, args.server_log)
+    else:
+        url = urllib.parse.urlsplit(args.url)
+        host, port = url.hostname, url.port or 80
+
+    reports = {}
+    try:
+        wait_ready(host, port, process=server)
+        print(f"✅ Server ready; mix {args.mix}, {args.duration:g}s per level")
+        for concurrency in levels:
+            if args.warmup:
+                run_level(host, port, mix, payloads, concurrency, args.warmup)
+            samples, elapsed = run_level(host, port, mix, payloads, concurrency, args.duration)
+            reports[concurrency] = summarize(samples, elapsed, payloads['bulk_rows'])
+            print_level(concurrency, reports[concurrency])
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    # Saturation point: past this level more clients only add queueing latency
+    throughput = {level: report['all']['requests_per_second'] for level, report in reports.items()}
+    best = max(throughput, key=throughput.get)
+    print(f"\n🏁 Peak throughput {throughput[best]:.1f} req/s at concurrency {best}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'mix': mix, 'duration': args.duration, 'bulk_rows': payloads['bulk_rows'],
+                       'levels': reports}, f, indent=2, default=float)
+        print(f"💾 Report written to {args.output}")
@@ -0,0 +1,166 @@
+"""
+Prometheus metrics for the prediction API
+Counters and fixed-bucket histograms kept in plain dicts behind one lock
+each, rendered in the text exposition format by /api/metrics. Recording a
+sample is a bisect plus two increments, so a fully instrumented request
+costs a few microseconds
+"""
+
+import threading
+import time
+from bisect import bisect_left
+
+# Seconds; /api/predict sits in the sub-millisecond buckets, bulk in the upper ones
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Monotonic count per label tuple"""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = list(self._values.items())
+        return [f'{self.name}{_labels(self.labels, key)} {_number(value)}' for key, value in values]
+
+class Histogram:
+    """Cumulative-bucket histogram per label tuple (counts are stored per bucket, summed on render)"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [count per bucket..., count above the last, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[i] += 1
+            series[-1] += value
+
+    def render(self):
+        with self._lock:
+            series = [(key, list(values)) for key, values in self._series.items()]
+        lines = []
+        for key, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), values[:-1]):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f'{self.name}_bucket{_labels(self.labels, key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labels, key)} {_number(values[-1])}')
+            lines.append(f'{self.name}_count{_labels(self.labels, key)} {cumulative}')
+        return lines
+
+class Gauge:
+    """Values read from a callback at scrape time: fn() -> [(label tuple, value), ...]"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labels=(), fn=None):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.fn = fn
+
+    def render(self):
+        samples = self.fn() if self.fn else []
+        return [f'{self.name}{_labels(self.labels, key)} {_number(value)}' for key, value in samples]
+
+class MetricsRegistry:
+    """The metrics /api/metrics exposes, in registration order"""
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self._add(Counter(self.prefix + name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(self.prefix + name, documentation, labels, buckets))
+
+    def gauge(self, name, documentation, labels=(), fn=None):
+        return self._add(Gauge(self.prefix + name, documentation, labels, fn))
+
+    def render(self):
+        """Text exposition format (version 0.0.4)"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+class StageTimer:
+    """Times consecutive pipeline stages of one request: each lap() records the time since the last"""
+
+    __slots__ = ('endpoint', 'last')
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.last = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        stage_seconds.observe((self.endpoint, stage), now - self.last)
+        self.last = now
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+registry = MetricsRegistry('student_api_')
+
+requests_total = registry.counter(
+    'http_requests_total', 'HTTP requests by endpoint, method and status',
+    ('endpoint', 'method', 'status'))
+request_seconds = registry.histogram(
+    'http_request_duration_seconds',
+    'Time to produce the response (streamed bodies: until streaming starts)', ('endpoint',))
+stage_seconds = registry.histogram(
+    'stage_duration_seconds', 'Time per pipeline stage within a request', ('endpoint', 'stage'))
+errors_total = registry.counter(
+    'request_errors_total', 'Requests that failed with an exception, by exception type',
+    ('endpoint', 'error'))
+scored_rows_total = registry.counter(
+    'scored_rows_total', 'Students scored, by endpoint and model version',
+    ('endpoint', 'model_version'))
+model_info = registry.gauge(
+    'model_info', 'Loaded models (1 per version) and the evaluator serving them',
+    ('model', 'version', 'evaluator', 'default'))
@@ -0,0 +1,529 @@
+"""
+Compiled evaluators for fitted sklearn pipelines
+Tree ensembles (RandomForest, XGBoost) are flattened into contiguous NumPy
+node arrays, with the SimpleImputer's medians folded in, and scored by
+vectorized traversal. Linear pipelines fold imputer and scaler into a single
+NaN-fill plus affine map
+"""
+
+import functools
+import json
+import os
+import pickle
+import shutil
+import threading
+import numpy as np
+
+TREE_CLASSIFIERS = ('RandomForestClassifier', 'XGBClassifier')
+
+def _reject_infinite(X):
+    """ValueError for infinite values, as sklearn's input validation raises; NaN is left to the imputer"""
+    if np.isinf(X).any():
+        raise ValueError(f"Input X contains infinity or a value too large for dtype('{X.dtype}').")
+
+class CompiledTreeEnsemble:
+    """
+    Drop-in replacement for a fitted tree pipeline's predict/predict_proba
+    Leaves point at themselves, so every row walks exactly max_depth steps
+    """
+
+    def __init__(self, feature, threshold, children, missing_left, value, roots, max_depth,
+                 classes, strict, aggregate, medians=None, base_margin=0.0, chunk_rows=4096):
+        self.feature = feature
+        self.threshold = threshold
+        # children[2 * node + went_left]; leaves are their own children
+        self.children = children
+        self.missing_left = missing_left
+        self.medians = medians
+        self.value = value
+        self.roots = roots
+        self.max_depth = max_depth
+        self.classes_ = np.asarray(classes)
+        # sklearn splits on x <= t, XGBoost on x < t
+        self.strict = strict
+        self.aggregate = aggregate
+        self.base_margin = base_margin
+        self.chunk_rows = chunk_rows
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    def summary(self):
+        return {'evaluator': type(self).__name__, 'memory_mapped': isinstance(self.feature.base, np.memmap)}
+
+    def _leaf_values(self, X):
+        """(n_rows, n_trees) leaf values for a float32 input"""
+        n_features = X.shape[1]
+        flat = X.ravel()
+        nodes = np.repeat(self.roots[None, :], len(X), axis=0)
+        row_offsets = (np.arange(len(X)) * n_features)[:, None]
+        check_missing = self.medians is None and np.isnan(flat).any()
+        for _ in range(self.max_depth):
+            x = flat[row_offsets + self.feature[nodes]]
+            threshold = self.threshold[nodes]
+            go_left = x < threshold if self.strict else x <= threshold
+            if check_missing:
+                go_left = np.where(np.isnan(x), self.missing_left[nodes], go_left)
+            nodes = self.children[2 * nodes + go_left]
+        return self.value[nodes]
+
+    def _positive_proba(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        _reject_infinite(X)
+        # Both sklearn trees and XGBoost score float32 copies of the input
+        with np.errstate(over='ignore'):
+            X = X.astype(np.float32)
+        if not self.strict:
+            # sklearn trees validate again after their cast, so float32 overflow is rejected too
+            _reject_infinite(X)
+        if self.medians is not None:
+            # The folded SimpleImputer: fill gaps with its float32-cast medians
+            X = np.where(np.isnan(X), self.medians, X)
+        if self.threshold.dtype == np.float64:
+            X = X.astype(np.float64)
+        out = np.empty(len(X))
+        for start in range(0, len(X), self.chunk_rows):
+            leaves = self._leaf_values(X[start:start + self.chunk_rows])
+            if self.aggregate == 'mean':
+                out[start:start + len(leaves)] = leaves.mean(axis=1)
+            else:
+                margin = self.base_margin + leaves.sum(axis=1)
+                out[start:start + len(leaves)] = 1.0 / (1.0 + np.exp(-margin))
+        return out
+
+    def predict_proba(self, X):
+        positive = self._positive_proba(X)
+        return np.column_stack([1.0 - positive, positive])
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+def _split_pipeline(model, dtype=np.float32):
+    """(imputer medians or None, final estimator) for imputer+trees pipelines"""
+    steps = [step for _, step in model.steps] if hasattr(model, 'steps') else [model]
+    *preprocess, classifier = steps
+    medians = None
+    for step in preprocess:
+        if type(step).__name__ != 'SimpleImputer' or getattr(step, 'add_indicator', False):
+            raise ValueError(f"Can't fold {type(step).__name__} into compiled trees")
+        # Imputed values reach the trees as float32 like every other input
+        medians = np.asarray(step.statistics_, dtype=dtype)
+    return medians, classifier
+
+def _pack(trees, threshold_dtype):
+    """
+    Concatenate per-tree node arrays into one address space
+    Each tree is (left, right, feature, threshold, default_left, leaf_value)
+    with -1 children marking leaves
+    """
+    offsets = np.cumsum([0] + [len(t[0]) for t in trees])
+    left, right, feature, threshold, default_left, value = (
+        np.concatenate([t[i] for t in trees]) for i in range(6))
+    node_ids = np.arange(len(left))
+    tree_offset = np.repeat(offsets[:-1], [len(t[0]) for t in trees])
+    is_leaf = left < 0
+
+    left = np.where(is_leaf, node_ids, left + tree_offset)
+    right = np.where(is_leaf, node_ids, right + tree_offset)
+    children = np.column_stack([right, left]).ravel().astype(np.intp)
+    feature = np.where(is_leaf, 0, feature).astype(np.intp)
+    threshold = np.where(is_leaf, 0, threshold).astype(threshold_dtype)
+
+    depths = [_tree_depth(t[0], t[1]) for t in trees]
+    return dict(feature=feature, threshold=threshold, children=children,
+                missing_left=default_left.astype(bool), value=value.astype(np.float64),
+                roots=offsets[:-1].astype(np.intp), max_depth=max(depths))
+
+def _tree_depth(left, right):
+    depth = np.zeros(len(left), dtype=np.int64)
+    for node in range(len(left)):
+        if left[node] >= 0:
+            depth[left[node]] = depth[right[node]] = depth[node] + 1
+    return int(depth.max())
+
+def _forest_trees(forest):
+    trees = []
+    for estimator in forest.estimators_:
+        tree = estimator.tree_
+        counts = tree.value[:, 0, :]
+        # predict_proba normalizes leaf class weights per tree
+        positive = counts[:, 1] / counts.sum(axis=1)
+        trees.append((tree.children_left, tree.children_right, tree.feature,
+                      tree.threshold, np.zeros(tree.node_count, dtype=bool), positive))
+    return trees
+
+def _xgboost_trees(booster):
+    model = json.loads(booster.save_raw(raw_format='json'))['learner']
+    if model['objective']['name'] != 'binary:logistic':
+        raise ValueError(f"Unsupported XGBoost objective {model['objective']['name']}")
+    if model['gradient_booster']['name'] != 'gbtree':
+        raise ValueError(f"Unsupported XGBoost booster {model['gradient_booster']['name']}")
+
+    trees = []
+    for tree in model['gradient_booster']['model']['trees']:
+        left = np.asarray(tree['left_children'], dtype=np.int64)
+        conditions = np.asarray(tree['split_conditions'], dtype=np.float32)
+        # Leaves keep their output in split_conditions
+        trees.append((left, np.asarray(tree['right_children'], dtype=np.int64),
+                      np.asarray(tree['split_indices'], dtype=np.int64), conditions,
+                      np.asarray(tree['default_left'], dtype=bool),
+                      np.where(left < 0, conditions, 0).astype(np.float64)))
+
+    best_iteration = booster.attr('best_iteration')
+    if best_iteration is not None:
+        trees = trees[:int(best_iteration) + 1]
+
+    # base_score is stored in probability space, as '5E-1' or '[5E-1]'
+    base_score = float(model['learner_model_param']['base_score'].strip('[]'))
+    return trees, float(np.log(base_score / (1 - base_score)))
+
+def compile_pipeline(model):
+    """Compile a fitted RandomForest or XGBoost pipeline; ValueError for anything else"""
+    medians, classifier = _split_pipeline(model)
+    kind = type(classifier).__name__
+
+    if kind == 'RandomForestClassifier':
+        arrays = _pack(_forest_trees(classifier), threshold_dtype=np.float64)
+        return CompiledTreeEnsemble(**arrays, classes=classifier.classes_, strict=False,
+                                    aggregate='mean', medians=medians)
+
+    if kind == 'XGBClassifier':
+        trees, base_margin = _xgboost_trees(classifier.get_booster())
+        arrays = _pack(trees, threshold_dtype=np.float32)
+        return CompiledTreeEnsemble(**arrays, classes=classifier.classes_, strict=True,
+                                    aggregate='sigmoid', medians=medians, base_margin=base_margin)
+
+    raise ValueError(f"No compiled evaluator for {kind}")
+
+def max_abs_difference(model, compiled, X):
+    """Largest |predict_proba| gap between the pipeline and its compiled form"""
+    return float(np.max(np.abs(model.predict_proba(X)[:, 1] - compiled.predict_proba(X)[:, 1])))
+
+class FusedLinearModel:
+    """
+    Logistic regression with imputer and scaler folded into its coefficients
+    sigmoid(w . (x - mean) / scale + b) == sigmoid((w / scale) . x + b')
+    """
+
+    def __init__(self, medians, coef, intercept, classes):
+        self.medians = medians
+        self.coef = coef
+        self.intercept = intercept
+        self.classes_ = np.asarray(classes)
+
+    def decision_function(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        # An infinite feature would saturate the sigmoid where the pipeline raises
+        _reject_infinite(X)
+        if self.medians is not None:
+            X = np.where(np.isnan(X), self.medians, X)
+        return X @ self.coef + self.intercept
+
+    def predict_proba(self, X):
+        positive = 1.0 / (1.0 + np.exp(-self.decision_function(X)))
+        return np.column_stack([1.0 - positive, positive])
+
+    def predict(self, X):
+        return self.classes_[(self.decision_function(X) > 0).astype(np.intp)]
+
+    def summary(self):
+        return {'evaluator': type(self).__name__, 'memory_mapped': isinstance(self.coef.base, np.memmap)}
+
+class FusedPreprocessingModel:
+    """
+    Any other estimator behind one fused NaN-fill and standardization
+    Same arithmetic as SimpleImputer + StandardScaler, minus two sklearn
+    transform calls and their input validation
+    """
+
+    def __init__(self, medians, mean, scale, classifier):
+        self.medians = medians
+        self.mean = mean
+        self.scale = scale
+        self.classifier = classifier
+        self.classes_ = classifier.classes_
+
+    def transform(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        _reject_infinite(X)
+        if self.medians is not None:
+            X = np.where(np.isnan(X), self.medians, X)
+        return (X - self.mean) / self.scale
+
+    def predict_proba(self, X):
+        return self.classifier.predict_proba(self.transform(X))
+
+    def predict(self, X):
+        return self.classifier.predict(self.transform(X))
+
+def _affine_steps(model):
+    """(medians or None, mean, scale, classifier) for imputer -> scaler -> classifier pipelines"""
+    if not hasattr(model, 'steps'):
+        raise ValueError(f"{type(model).__name__} has no preprocessing to fuse")
+    *preprocess, classifier = [step for _, step in model.steps]
+    n_features = classifier.n_features_in_
+    medians, mean, scale = None, np.zeros(n_features), np.ones(n_features)
+    seen_scaler = False
+    for step in preprocess:
+        kind = type(step).__name__
+        if kind == 'SimpleImputer' and not step.add_indicator and not seen_scaler:
+            medians = np.asarray(step.statistics_, dtype=np.float64)
+        elif kind == 'StandardScaler' and not seen_scaler:
+            seen_scaler = True
+            if step.mean_ is not None:
+                mean = np.asarray(step.mean_, dtype=np.float64)
+            if step.scale_ is not None:
+                scale = np.asarray(step.scale_, dtype=np.float64)
+        else:
+            raise ValueError(f"Can't fuse {kind} into an affine map")
+    return medians, mean, scale, classifier
+
+def fuse_pipeline(model):
+    """
+    Fuse a fitted imputer/scaler pipeline; ValueError when there is nothing to fuse
+    Binary LogisticRegression collapses to FusedLinearModel, other classifiers
+    (SVC) keep their estimator behind FusedPreprocessingModel
+    """
+    medians, mean, scale, classifier = _affine_steps(model)
+    if type(classifier).__name__ == 'LogisticRegression' and len(classifier.classes_) == 2:
+        coef = classifier.coef_[0] / scale
+        intercept = float(classifier.intercept_[0] - coef @ mean)
+        return FusedLinearModel(medians, coef, intercept, classifier.classes_)
+    if type(classifier).__name__ in TREE_CLASSIFIERS:
+        raise ValueError(f"{type(classifier).__name__} is compiled, not fused")
+    return FusedPreprocessingModel(medians, mean, scale, classifier)
+
+class NativeXGBoostModel:
+    """
+    XGBoost pipeline served straight from its Booster with inplace_predict
+    Skips the Pipeline, the imputer transform and the XGBClassifier wrapper,
+    and pins the Booster's thread count instead of inheriting n_jobs
+    """
+
+    def __init__(self, booster, medians, classes, nthread):
+        # Own copy, so nthread doesn't leak into the pickled classifier
+        self.booster = booster.copy()
+        self.booster.set_param({'nthread': nthread})
+        self.nthread = nthread
+        self.medians = medians
+        self.classes_ = np.asarray(classes)
+        best_iteration = booster.attr('best_iteration')
+        self.iteration_range = (0, int(best_iteration) + 1) if best_iteration is not None else (0, 0)
+
+    def _positive_proba(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        # inplace_predict takes ±inf silently; the pipeline's imputer rejects it
+        _reject_infinite(X)
+        if self.medians is not None:
+            X = np.where(np.isnan(X), self.medians, X)
+        return self.booster.inplace_predict(X, iteration_range=self.iteration_range,
+                                            predict_type='value', validate_features=False)
+
+    def predict_proba(self, X):
+        positive = self._positive_proba(X).astype(np.float64)
+        return np.column_stack([1.0 - positive, positive])
+
+    def predict(self, X):
+        # XGBClassifier.predict thresholds binary:logistic at 0.5
+        return self.classes_[(self._positive_proba(X) > 0.5).astype(np.intp)]
+
+    def summary(self):
+        return {'evaluator': type(self).__name__, 'nthread': self.nthread}
+
+def native_xgboost(model, nthread):
+    """NativeXGBoostModel for a fitted imputer + XGBClassifier pipeline; ValueError otherwise"""
+    # Fill in float64 like the imputer; XGBoost casts to float32 itself
+    medians, classifier = _split_pipeline(model, dtype=np.float64)
+    if type(classifier).__name__ != 'XGBClassifier' or len(classifier.classes_) != 2:
+        raise ValueError(f"{type(classifier).__name__} is not a binary XGBClassifier")
+    return NativeXGBoostModel(classifier.get_booster(), medians, classifier.classes_, nthread)
+
+class CompiledPipeline:
+    """
+    Serves batches from the compiled evaluator and falls back to the pipeline
+    past max_rows: tree traversal cost grows with rows x trees x depth, so
+    large batches are faster in the estimator's native code. Fused linear
+    models have no limit (max_rows None)
+    """
+
+    def __init__(self, model, compiled, max_rows=None):
+        self.model = model
+        self.compiled = compiled
+        self.max_rows = max_rows
+        # From the compiled side, so a DeferredModel fallback stays unloaded
+        self.classes_ = compiled.classes_
+
+    def _route(self, X):
+        if self.max_rows is None or len(X) <= self.max_rows:
+            return self.compiled
+        return self.model
+
+    def summary(self):
+        fallback = self.model.summary() if hasattr(self.model, 'summary') else None
+        return {'evaluator': type(self.compiled).__name__, 'max_rows': self.max_rows,
+                'fallback': fallback['evaluator'] if fallback else type(self.model).__name__}
+
+    def predict_proba(self, X):
+        return self._route(X).predict_proba(X)
+
+    def predict(self, X):
+        return self._route(X).predict(X)
+
+class DeferredModel:
+    """
+    A model built by load() on first use, e.g. the pickled pipeline behind
+    memory-mapped arrays, which only large batches and TreeSHAP need
+    """
+
+    def __init__(self, load, name):
+        self._load = load
+        self.name = name
+        self._model = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = self._load()
+        return self._model
+
+    def predict_proba(self, X):
+        return self.load().predict_proba(X)
+
+    def predict(self, X):
+        return self.load().predict(X)
+
+    def __getitem__(self, index):
+        # Pipeline slicing (model[:-1], model[-1]) for TreeSHAP
+        return self.load()[index]
+
+    def summary(self):
+        loaded = self._model is not None
+        return {'evaluator': type(self._model).__name__ if loaded else self.name, 'loaded': loaded}
+
+def compile_for_serving(model, X, max_rows=128, tolerance=1e-6, trees=True, linear=True,
+                        fallback=None):
+    """
+    Compile (trees) or fuse (imputer/scaler pipelines) and verify on X
+    Returns (CompiledPipeline or None, reason); None means serve the pipeline as is
+    fallback scores the batches past max_rows (default: the pipeline itself)
+    """
+    classifier = model.steps[-1][1] if hasattr(model, 'steps') else model
+    try:
+        if type(classifier).__name__ in TREE_CLASSIFIERS:
+            if not trees:
+                return None, "compiled trees disabled"
+            compiled = compile_pipeline(model)
+        else:
+            if not linear:
+                return None, "fused preprocessing disabled"
+            compiled, max_rows = fuse_pipeline(model), None
+    except (ValueError, KeyError, AttributeError) as e:
+        return None, str(e)
+    difference = max_abs_difference(model, compiled, X)
+    if not difference <= tolerance:
+        return None, f"max |Δp| {difference:.2e} exceeds {tolerance:.0e}"
+    return CompiledPipeline(fallback or model, compiled, max_rows), f"max |Δp| {difference:.1e}"
+
+# Memory-mappable artifacts: models/<name>.arrays/ holds one .npy file per array
+# plus meta.json. Loaded with mmap_mode='r', every worker process maps the same
+# page-cache copy instead of unpickling a private one
+_LAYOUTS = {
+    'CompiledTreeEnsemble': (
+        CompiledTreeEnsemble,
+        ('feature', 'threshold', 'children', 'missing_left', 'value', 'roots', 'medians', 'classes'),
+        ('max_depth', 'strict', 'aggregate', 'base_margin')
+    ),
+    'FusedLinearModel': (FusedLinearModel, ('medians', 'coef', 'classes'), ('intercept',)),
+}
+
+def arrays_path(model_path):
+    """models/random_forest.pkl -> models/random_forest.arrays"""
+    return os.path.splitext(model_path)[0] + '.arrays'
+
+def _source_stamp(model_path):
+    stat = os.stat(model_path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+def export_arrays(model, model_path):
+    """
+    Write the compiled or fused form of a pickled pipeline next to model_path
+    Returns the directory, or None for models without an array form (SVM)
+    """
+    classifier = model.steps[-1][1] if hasattr(model, 'steps') else model
+    try:
+        compiled = (compile_pipeline(model) if type(classifier).__name__ in TREE_CLASSIFIERS
+                    else fuse_pipeline(model))
+    except ValueError:
+        return None
+    kind = type(compiled).__name__
+    if kind not in _LAYOUTS:
+        return None
+
+    _, arrays, scalars = _LAYOUTS[kind]
+    directory = arrays_path(model_path)
+    tmp_directory = f"{directory}.tmp"
+    shutil.rmtree(tmp_directory, ignore_errors=True)
+    os.makedirs(tmp_directory)
+    for name in arrays:
+        value = getattr(compiled, 'classes_' if name == 'classes' else name)
+        if value is not None:
+            np.save(os.path.join(tmp_directory, f"{name}.npy"), np.ascontiguousarray(value))
+    meta = {
+        'kind': kind,
+        'scalars': {name: getattr(compiled, name) for name in scalars},
+        # Ties the arrays to the exact pickle they were compiled from
+        'source': _source_stamp(model_path)
+    }
+    with open(os.path.join(tmp_directory, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=2)
+
+    # Swap directories; processes still mapping the old files keep their pages
+    old_directory = f"{directory}.old"
+    shutil.rmtree(old_directory, ignore_errors=True)
+    if os.path.isdir(directory):
+        os.rename(directory, old_directory)
+    os.rename(tmp_directory, directory)
+    shutil.rmtree(old_directory, ignore_errors=True)
+    return directory
+
+def load_arrays(model_path, mmap_mode='r'):
+    """Memory-mapped compiled model for model_path; ValueError when missing or stale"""
+    directory = arrays_path(model_path)
+    try:
+        with open(os.path.join(directory, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+        stale = meta['source'] != _source_stamp(model_path)
+    except (OSError, ValueError, KeyError):
+        raise ValueError(f"no array artifact at {directory}")
+    if stale:
+        raise ValueError(f"{directory} is older than {model_path}")
+
+    cls, arrays, _ = _LAYOUTS[meta['kind']]
+    kwargs = dict(meta['scalars'])
+    for name in arrays:
+        path = os.path.join(directory, f"{name}.npy")
+        # Plain ndarray views of the maps: np.memmap's subclass hooks double the
+        # cost of every fancy-indexing step in the traversal
+        kwargs[name] = np.asarray(np.load(path, mmap_mode=mmap_mode)) if os.path.exists(path) else None
+    return cls(**kwargs)
+
+def _unpickle(model_path, source):
+    if _source_stamp(model_path) != source:
+        raise ValueError(f"{model_path} was replaced after its arrays were mapped")
+    with open(model_path, 'rb') as f:
+        return pickle.load(f)
+
+class MappedModel(DeferredModel):
+    """Memory-mapped arrays (.mapped) plus the pickle they came from, unpickled on first use"""
+
+    def __init__(self, mapped, model_path, source):
+        super().__init__(functools.partial(_unpickle, model_path, source), 'Pipeline')
+        self.mapped = mapped
+
+def map_model(model_path, mmap_mode='r'):
+    """MappedModel for model_path; ValueError when its arrays are missing or stale"""
+    source = _source_stamp(model_path)
+    return MappedModel(load_arrays(model_path, mmap_mode), model_path, source)
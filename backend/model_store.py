@@ -0,0 +1,326 @@
+"""
+Model loading, zero-downtime hot reload and the multi-model registry
+Everything derived from one trained artifact lives in a ModelBundle. A
+reload builds and warms a new bundle in the background, then swaps the
+single `current` reference, so requests already in flight finish on the
+bundle they started with
+"""
+
+import glob
+import json
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from model_compiler import map_model
+from scoring import model_version
+
+class ModelBundle:
+    """A model, its card and every per-model helper, swapped as one unit"""
+
+    def __init__(self, model, model_card, predictor, assembler, explainer, model_path=None):
+        self.model = model
+        self.model_path = model_path
+        # Set by whoever loaded the bundle: the card it came with and the
+        # artifact_stamp() of both files, so other processes can pin this version
+        self.card_path = None
+        self.stamp = None
+        self.model_card = model_card
+        self.predictor = predictor
+        self.assembler = assembler
+        self.explainer = explainer
+        self.version = model_version(model_card)
+        self.loaded_at = datetime.now().isoformat()
+        self.warmup = None
+        # Encoded static responses (model info, analytics), built on first request
+        self.responses = {}
+
+def artifact_stamp(model_path, card_path):
+    """Modification times of a model and its card, or None while either is missing"""
+    try:
+        return (os.stat(model_path).st_mtime_ns, os.stat(card_path).st_mtime_ns)
+    except OSError:
+        return None
+
+def card_changed(stamp, previous):
+    """
+    True when stamp shows a new model card (vs the previous stamp) written no earlier
+    than the pickle. train_model.py writes the card last, so a changed pickle under
+    an older card is a model still being written (its card would describe the old one)
+    """
+    if stamp is None:
+        return False
+    model_mtime, card_mtime = stamp
+    if previous is not None and card_mtime == previous[1]:
+        return False
+    return card_mtime >= model_mtime
+
+def read_artifacts(model_path, card_path, artifact_format='pickle'):
+    """
+    Load the model and read its card
+    artifact_format='mmap' maps the compiled arrays save_model_artifacts wrote
+    next to the pickle (a MappedModel, which unpickles on first use), and only
+    unpickles now when there are none (or they're stale)
+    """
+    model = None
+    if artifact_format == 'mmap':
+        try:
+            model = map_model(model_path)
+        except (OSError, ValueError) as e:
+            print(f"ℹ️  Memory-mapped artifact unavailable ({e}); unpickling {model_path}")
+    if model is None:
+        with open(model_path, 'rb') as f:
+            model = pickle.load(f)
+    with open(card_path, 'r') as f:
+        model_card = json.load(f)
+    return model, model_card
+
+class ModelStore:
+    """
+    Holds the serving bundle and replaces it when new artifacts appear
+    build_bundle(model, model_card) does all the loading and warm-up work
+    """
+
+    def __init__(self, build_bundle, model_path='models/best_model.pkl',
+                 card_path='models/model_card.json', artifact_format='pickle'):
+        self.build_bundle = build_bundle
+        self.model_path = model_path
+        self.card_path = card_path
+        self.artifact_format = artifact_format
+        self.current = None
+        self.reloads = 0
+        self.last_error = None
+        self.last_reload_seconds = None
+        self._stamp = None
+        self._reload_lock = threading.Lock()
+        self._flag_lock = threading.Lock()
+        self._reloading = False
+        self._watcher = None
+
+    def artifact_stamp(self):
+        """Modification times of both artifacts, or None while either is missing"""
+        return artifact_stamp(self.model_path, self.card_path)
+
+    def load(self):
+        """Synchronous load used at startup; returns True when a model is serving"""
+        with self._flag_lock:
+            self._reloading = True
+        return self._reload()
+
+    def _reload(self):
+        # Serializes builds; _flag_lock only guards the cheap 'reloading' check
+        with self._reload_lock:
+            try:
+                return self._build_and_swap()
+            finally:
+                with self._flag_lock:
+                    self._reloading = False
+
+    def _build_and_swap(self):
+        # Remember the stamp even if loading fails so the watcher waits for new files
+        self._stamp = stamp = self.artifact_stamp()
+        start = time.perf_counter()
+        try:
+            model, model_card = read_artifacts(self.model_path, self.card_path, self.artifact_format)
+            # Files replaced mid-read: no stamp, so no other process can claim this version
+            read_stamp = stamp if self.artifact_stamp() == stamp else None
+            bundle = self.build_bundle(model, model_card)
+            bundle.model_path, bundle.card_path, bundle.stamp = self.model_path, self.card_path, read_stamp
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"❌ Error loading model: {e}")
+            return False
+
+        # One reference assignment: handlers read self.current once per request
+        previous = self.current
+        self.current = bundle
+        self.last_error = None
+        self.last_reload_seconds = round(time.perf_counter() - start, 3)
+        if previous is not None:
+            self.reloads += 1
+            print(f"🔄 Swapped model {previous.version} -> {bundle.version} "
+                  f"(built in {self.last_reload_seconds}s)")
+        return True
+
+    def reload_async(self, on_done=None):
+        """
+        Build the new bundle on a background thread; False if a reload is already running
+        on_done(loaded) is called from that thread when the build finishes
+        """
+        with self._flag_lock:
+            if self._reloading:
+                return False
+            self._reloading = True
+
+        def run():
+            loaded = self._reload()
+            if on_done is not None:
+                on_done(loaded)
+
+        threading.Thread(target=run, name='model-reload', daemon=True).start()
+        return True
+
+    def card_changed(self, stamp):
+        """True when stamp shows a complete new model (see card_changed)"""
+        return card_changed(stamp, self._stamp)
+
+    def watch(self, interval_seconds):
+        """
+        Poll the artifacts and reload when a new card appears (and has stopped changing)
+        A pickle replaced by hand, without a new card, needs /api/admin/reload
+        """
+        def poll():
+            while True:
+                time.sleep(interval_seconds)
+                stamp = self.artifact_stamp()
+                if not self.card_changed(stamp):
+                    continue
+                # Let train_model.py finish writing before loading
+                time.sleep(min(interval_seconds, 1.0))
+                if self.artifact_stamp() == stamp:
+                    self.reload_async()
+
+        self._watcher = threading.Thread(target=poll, name='model-watch', daemon=True)
+        self._watcher.start()
+
+    def stats(self):
+        """Reload state for /api/health"""
+        bundle = self.current
+        return {
+            'version': bundle.version if bundle else None,
+            'loaded_at': bundle.loaded_at if bundle else None,
+            'reloads': self.reloads,
+            'reloading': self._reloading,
+            'last_reload_seconds': self.last_reload_seconds,
+            'last_error': self.last_error,
+            'watching': self._watcher is not None
+        }
+
+class ModelRegistry:
+    """
+    Serves every model save_model_artifacts wrote, not just best_model.pkl
+    Models load lazily on first use and the least recently used ones are
+    evicted once their combined artifact size exceeds the memory budget. The
+    budget counts each model's pickle size on disk, a stand-in for (not a
+    measurement of) the memory its loaded bundle takes
+    A loaded model's files are checked at most every refresh_seconds, and it is
+    only replaced once a new card has been written after its pickle
+    """
+
+    def __init__(self, build_bundle, models_dir='models', memory_budget_mb=1024,
+                 artifact_format='pickle', refresh_seconds=0.0):
+        self.build_bundle = build_bundle
+        self.models_dir = models_dir
+        self.artifact_format = artifact_format
+        self.refresh_seconds = refresh_seconds
+        self.card_path = os.path.join(models_dir, 'model_card.json')
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+        self._loaded = OrderedDict()  # name -> [bundle, size_bytes, stamp, checked_at]
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self.loads = 0
+        self.evictions = 0
+
+    def model_path(self, name):
+        return os.path.join(self.models_dir, f"{name}.pkl")
+
+    def available(self):
+        """Model names with a saved artifact (best_model.pkl is an alias, not a model)"""
+        names = (os.path.splitext(os.path.basename(p))[0]
+                 for p in glob.glob(os.path.join(self.models_dir, '*.pkl')))
+        return sorted(n for n in names if n != 'best_model')
+
+    def _stamp(self, name):
+        return artifact_stamp(self.model_path(name), self.card_path)
+
+    def _cached(self, name):
+        """The loaded bundle for name while its files are still current, else None"""
+        with self._lock:
+            entry = self._loaded.get(name)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[3] < self.refresh_seconds:
+                self._loaded.move_to_end(name)
+                return entry[0]
+            stamp = entry[2]
+
+        current = self._stamp(name)
+        if current is None or card_changed(current, stamp):
+            return None
+        with self._lock:
+            entry = self._loaded.get(name)
+            if entry is None:
+                return None
+            entry[3] = time.monotonic()
+            self._loaded.move_to_end(name)
+            return entry[0]
+
+    def get(self, name):
+        """
+        Bundle for a model name, loading it on first use; KeyError for unknown names
+        Anything else raised comes from reading or building the model
+        """
+        bundle = self._cached(name)
+        if bundle is not None:
+            return bundle
+        # Only names from the directory listing become paths
+        if name not in self.available():
+            raise KeyError(name)
+        with self._lock:
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+
+        # One loader per model; other requests for it wait instead of loading twice
+        with load_lock:
+            bundle = self._cached(name)
+            if bundle is not None:
+                return bundle
+
+            stamp = self._stamp(name)
+            model, model_card = read_artifacts(self.model_path(name), self.card_path,
+                                               self.artifact_format)
+            read_stamp = stamp if self._stamp(name) == stamp else None
+            # The card describes every model; present it as if this one were best
+            bundle = self.build_bundle(model, dict(model_card, best_model=name))
+            bundle.model_path, bundle.card_path, bundle.stamp = self.model_path(name), self.card_path, read_stamp
+            size = os.path.getsize(self.model_path(name))
+
+            with self._lock:
+                self._loaded[name] = [bundle, size, stamp, time.monotonic()]
+                self._loaded.move_to_end(name)
+                self.loads += 1
+                self._evict(keep=name)
+            return bundle
+
+    def _evict(self, keep):
+        """Drop least recently used models until the budget fits (called with the lock held)"""
+        total = sum(entry[1] for entry in self._loaded.values())
+        for name in list(self._loaded):
+            if total <= self.memory_budget:
+                break
+            if name == keep:
+                continue
+            total -= self._loaded.pop(name)[1]
+            self.evictions += 1
+            print(f"♻️  Evicted model {name} from registry")
+
+    def bundles(self):
+        """Currently loaded bundles, least recently used first"""
+        with self._lock:
+            return [entry[0] for entry in self._loaded.values()]
+
+    def stats(self):
+        """Loaded models and memory use for /api/models and /api/health"""
+        with self._lock:
+            loaded = {name: {'version': bundle.version, 'size_mb': round(size / 1024 / 1024, 2)}
+                      for name, (bundle, size, _, _) in self._loaded.items()}
+            return {
+                'available': self.available(),
+                'loaded': loaded,
+                'memory_used_mb': round(sum(v['size_mb'] for v in loaded.values()), 2),
+                'memory_budget_mb': round(self.memory_budget / 1024 / 1024, 2),
+                'loads': self.loads,
+                'evictions': self.evictions
+            }
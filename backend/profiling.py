@@ -0,0 +1,123 @@
+"""
+On-demand request profiling
+A request runs under cProfile when an admin asks for it (X-Profile header)
+or when the 1-in-N sampler picks it. Profiles are kept as .prof files (the
+pstats format snakeviz, flameprof and gprof2dot read) in a bounded on-disk
+ring: once PROFILE_RING_SIZE profiles exist the oldest is deleted
+"""
+
+import cProfile
+import glob
+import io
+import itertools
+import json
+import os
+import pstats
+import re
+import threading
+import time
+import uuid
+from datetime import datetime
+
+_PROFILE_ID = re.compile(r'^[0-9a-f]{32}$')
+
+class RequestProfiler:
+    """cProfile runner for view functions plus the ring of saved profiles"""
+
+    def __init__(self, directory='profiles', ring_size=50, sample_every=0):
+        self.directory = directory
+        self.ring_size = ring_size
+        self.sample_every = sample_every
+        self._counter = itertools.count(1)
+        # One profile at a time: cProfile can't nest, and on Python 3.12+ it is process-wide
+        self._active = threading.Lock()
+        self._ring_lock = threading.Lock()
+        self.captured = 0
+        self.skipped = 0
+
+    def should_sample(self):
+        """True for every sample_every-th call (never when sampling is off)"""
+        return self.sample_every > 0 and next(self._counter) % self.sample_every == 0
+
+    def run(self, fn, endpoint, trigger):
+        """
+        Call fn() under cProfile and save the profile to the ring
+        Returns (fn's result, profile id); the id is None when another request
+        was already being profiled and fn ran unprofiled
+        """
+        if not self._active.acquire(blocking=False):
+            self.skipped += 1
+            return fn(), None
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            result = profiler.runcall(fn)
+        finally:
+            elapsed = time.perf_counter() - started
+            self._active.release()
+        profile_id = self._save(profiler, {
+            'endpoint': endpoint,
+            'trigger': trigger,
+            'created_at': datetime.now().isoformat(),
+            'duration_ms': round(elapsed * 1000, 3)
+        })
+        return result, profile_id
+
+    def _save(self, profiler, meta):
+        """Write <time_ns>-<id>.prof plus a .json sidecar, then trim the ring"""
+        profile_id = uuid.uuid4().hex
+        meta['profile_id'] = profile_id
+        base = os.path.join(self.directory, f"{time.time_ns():020d}-{profile_id}")
+        with self._ring_lock:
+            os.makedirs(self.directory, exist_ok=True)
+            profiler.dump_stats(base + '.prof.tmp')
+            os.replace(base + '.prof.tmp', base + '.prof')
+            with open(base + '.json', 'w') as f:
+                json.dump(meta, f)
+            self.captured += 1
+
+            # Names sort by capture time, so the oldest come first
+            saved = sorted(glob.glob(os.path.join(self.directory, '*.prof')))
+            for path in saved[:max(len(saved) - self.ring_size, 0)]:
+                for stale in (path, path[:-len('.prof')] + '.json'):
+                    try:
+                        os.remove(stale)
+                    except FileNotFoundError:
+                        pass
+        return profile_id
+
+    def path(self, profile_id):
+        """The .prof file for an id, or None if it is unknown or has left the ring"""
+        if not _PROFILE_ID.match(profile_id):
+            return None
+        matches = glob.glob(os.path.join(self.directory, f"*-{profile_id}.prof"))
+        return os.path.abspath(matches[0]) if matches else None
+
+    def list(self):
+        """Metadata for every saved profile, newest first"""
+        profiles = []
+        for path in sorted(glob.glob(os.path.join(self.directory, '*.json')), reverse=True):
+            try:
+                with open(path) as f:
+                    profiles.append(json.load(f))
+            except (FileNotFoundError, ValueError):
+                continue  # trimmed or half-written meanwhile
+        return profiles
+
+    def text(self, profile_id, sort='cumulative', limit=40):
+        """pstats report for a saved profile, or None if it is unknown"""
+        path = self.path(profile_id)
+        if path is None:
+            return None
+        out = io.StringIO()
+        pstats.Stats(path, stream=out).sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+    def stats(self):
+        """Sampler settings and capture counts for /api/health"""
+        return {
+            'sample_every': self.sample_every,
+            'ring_size': self.ring_size,
+            'captured': self.captured,
+            'skipped_busy': self.skipped
+        }
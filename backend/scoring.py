@@ -0,0 +1,369 @@
+"""
+Vectorized scoring helpers for the prediction API
+Builds feature matrices for whole frames and scores them in chunks
+"""
+
+import json
+import os
+import pickle
+import threading
+import time
+import warnings
+import numpy as np
+
+from startup import lazy_import
+
+pd = lazy_import('pandas')
+
+# Pipelines are fitted on DataFrames but scored on plain arrays
+warnings.filterwarnings('ignore', message='X does not have valid feature names')
+
+# Rows scored per predict_proba call in bulk mode
+BULK_CHUNK_SIZE = 10000
+
+ACTIVITY_COLUMNS = [
+    'cultural_activity_score',
+    'class_participation_score',
+    'sports_activity_score',
+    'curricular_activity_score'
+]
+
+DERIVED_FEATURES = ('engagement_index', 'internal_to_attendance_ratio')
+
+# sklearn's error for infinite input; bulk rows and /api/predict report the same
+INFINITE_INPUT_ERROR = "Input X contains infinity or a value too large for dtype('float64')."
+
+# Plain JSON numbers; anything else (None, strings, bools) takes the pandas path
+_NUMERIC_TYPES = (int, float)
+
+def engineer_features(df):
+    """Derive engagement index and ratio features for a whole frame in one pass"""
+    df = df.copy()
+
+    # Missing activity columns count as 0, same as preprocess_input
+    if 'engagement_index' not in df.columns:
+        engagement = 0.0
+        for col in ACTIVITY_COLUMNS:
+            engagement = engagement + (df[col] if col in df.columns else 0) * 0.25
+        df['engagement_index'] = engagement
+
+    if 'internal_to_attendance_ratio' not in df.columns:
+        internal = df['internal_marks_avg'] if 'internal_marks_avg' in df.columns else 0
+        attendance = df['attendance_pct'] if 'attendance_pct' in df.columns else 1
+        df['internal_to_attendance_ratio'] = internal / (attendance + 1)
+
+    return df
+
+def build_feature_matrix(df, feature_names):
+    """
+    Build a float64 feature matrix plus a per-row validity mask
+    Returns (X, valid, errors) where errors holds a message for invalid rows
+    """
+    n_rows = len(df)
+    errors = np.full(n_rows, None, dtype=object)
+
+    missing = [f for f in feature_names if f not in df.columns and f not in DERIVED_FEATURES]
+    if missing:
+        errors[:] = f"Missing feature column(s): {', '.join(missing)}"
+        return np.empty((n_rows, len(feature_names))), np.zeros(n_rows, dtype=bool), errors
+
+    # Coerce raw inputs to numbers; anything non-null that fails is a bad row
+    raw_columns = set(feature_names) | set(ACTIVITY_COLUMNS) | {'internal_marks_avg', 'attendance_pct'}
+    numeric = df.copy()
+    valid = np.ones(n_rows, dtype=bool)
+    for col in raw_columns:
+        if col not in numeric.columns:
+            continue
+        coerced = pd.to_numeric(numeric[col], errors='coerce')
+        bad = (coerced.isna() & numeric[col].notna()).to_numpy()
+        if bad.any():
+            for i in np.flatnonzero(bad & valid):
+                errors[i] = f"could not convert string to float: {numeric[col].iloc[i]!r}"
+            valid &= ~bad
+        numeric[col] = coerced.astype('float64')
+
+    X = engineer_features(numeric)[feature_names].to_numpy(dtype=np.float64)
+
+    # The imputer handles NaN, but infinities (e.g. attendance_pct == -1) are rejected
+    infinite = np.isinf(X).any(axis=1)
+    if infinite.any():
+        for i in np.flatnonzero(infinite & valid):
+            errors[i] = INFINITE_INPUT_ERROR
+        valid &= ~infinite
+
+    return X, valid, errors
+
+class FeatureAssembler:
+    """
+    Builds a model input row straight from request JSON, without pandas
+    Compiled once from the model card's feature order
+    """
+
+    def __init__(self, feature_names):
+        self.feature_names = list(feature_names)
+        self._raw = [(i, name) for i, name in enumerate(self.feature_names)
+                     if name not in DERIVED_FEATURES]
+        self._engagement_idx = (self.feature_names.index('engagement_index')
+                                if 'engagement_index' in self.feature_names else None)
+        self._ratio_idx = (self.feature_names.index('internal_to_attendance_ratio')
+                           if 'internal_to_attendance_ratio' in self.feature_names else None)
+        self._local = threading.local()
+
+    def _row(self):
+        """Per-thread preallocated (1, n_features) float64 buffer"""
+        row = getattr(self._local, 'row', None)
+        if row is None:
+            row = self._local.row = np.empty((1, len(self.feature_names)), dtype=np.float64)
+        return row
+
+    def assemble(self, data):
+        """
+        Return a (1, n_features) row for data, or None when the payload needs the
+        pandas path (missing fields, non-numeric values, division by zero)
+        The returned buffer is reused by the next call on the same thread
+        """
+        row = self._row()
+        values = row[0]
+        try:
+            for i, name in self._raw:
+                value = data[name]
+                if type(value) not in _NUMERIC_TYPES:
+                    return None
+                values[i] = value
+
+            # Same operation order as preprocess_input so results are bit-identical
+            if self._engagement_idx is not None:
+                value = data.get('engagement_index')
+                if value is None and 'engagement_index' not in data:
+                    for col in ACTIVITY_COLUMNS:
+                        activity = data.get(col, 0)
+                        if type(activity) not in _NUMERIC_TYPES:
+                            return None
+                        term = activity * 0.25
+                        value = term if value is None else value + term
+                elif type(value) not in _NUMERIC_TYPES:
+                    return None
+                values[self._engagement_idx] = value
+
+            if self._ratio_idx is not None:
+                value = data.get('internal_to_attendance_ratio')
+                if value is None and 'internal_to_attendance_ratio' not in data:
+                    internal = data.get('internal_marks_avg', 0)
+                    attendance = data.get('attendance_pct', 1)
+                    if type(internal) not in _NUMERIC_TYPES or type(attendance) not in _NUMERIC_TYPES:
+                        return None
+                    value = internal / (attendance + 1)
+                elif type(value) not in _NUMERIC_TYPES:
+                    return None
+                values[self._ratio_idx] = value
+        except (KeyError, ZeroDivisionError):
+            return None
+        return row
+
+def risk_levels(probabilities):
+    """Vectorized version of determine_risk_level"""
+    return np.where(probabilities > 0.7, 'low',
+                    np.where(probabilities > 0.4, 'medium', 'high'))
+
+class Predictor:
+    """
+    Wraps a fitted pipeline so label, probability, confidence and risk level
+    all come from a single predict_proba call instead of predict + predict_proba
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.classes = np.asarray(model.classes_)
+        self.single_pass = True
+        self.label_agreement = None
+        self.predict_seconds = 0.0
+        self.calls = 0
+
+    def verify(self, X, timing_rounds=20):
+        """
+        Check argmax(predict_proba) against the model's own predict() on a probe batch
+        and time the predict() call that single-pass scoring skips
+        """
+        derived = self.classes[self.model.predict_proba(X).argmax(axis=1)]
+        predicted = self.model.predict(X)
+        self.label_agreement = float(np.mean(derived == predicted))
+        # SVC(probability=True) thresholds its decision function, not the Platt
+        # probabilities, so it can disagree near the boundary; keep predict() then
+        self.single_pass = self.label_agreement == 1.0
+
+        timings = []
+        for _ in range(timing_rounds):
+            start = time.perf_counter()
+            self.model.predict(X[:1])
+            timings.append(time.perf_counter() - start)
+        self.predict_seconds = float(np.median(timings))
+        return self.single_pass
+
+    def predict(self, X):
+        """Return label, probability, confidence and risk_level arrays for X"""
+        proba = self.model.predict_proba(X)
+        probabilities = proba[:, 1]
+        if self.single_pass:
+            # Same rule predict() uses for argmax classifiers (first class wins ties)
+            labels = self.classes[proba.argmax(axis=1)]
+        else:
+            labels = self.model.predict(X)
+        self.calls += 1
+        return {
+            'label': labels,
+            'probability': probabilities,
+            'confidence': np.where(labels == 1, probabilities, 1 - probabilities),
+            'risk_level': risk_levels(probabilities)
+        }
+
+    def stats(self):
+        """Single-pass status and the pipeline time it has saved so far"""
+        saved_ms = self.predict_seconds * 1000 if self.single_pass else 0.0
+        return {
+            'single_pass': self.single_pass,
+            'label_agreement': self.label_agreement,
+            # Set when a compiled or fused evaluator stands in for the pipeline
+            'compiled': self.model.summary() if hasattr(self.model, 'summary') else None,
+            'saved_ms_per_request': round(saved_ms, 3),
+            'calls': self.calls,
+            'total_saved_ms': round(saved_ms * self.calls, 1)
+        }
+
+def score_matrix(predictor, X, valid, chunk_size=BULK_CHUNK_SIZE):
+    """
+    Score valid rows with one predictor call per chunk
+    Returns (probabilities, labels); invalid rows get NaN and -1
+    """
+    probabilities = np.full(len(X), np.nan)
+    labels = np.full(len(X), -1, dtype=np.int64)
+    rows = np.flatnonzero(valid)
+    for start in range(0, len(rows), chunk_size):
+        idx = rows[start:start + chunk_size]
+        result = predictor.predict(X[idx])
+        probabilities[idx] = result['probability']
+        labels[idx] = result['label']
+    return probabilities, labels
+
+def score_columns(predictor, explainer, feature_names, df, sharded=None):
+    """
+    Score a frame of students in vectorized chunks, keeping the results as columns
+    Large frames go to the ShardedScorer's worker processes when one is given
+    Returns ids, valid, labels, probabilities, risks and errors (one entry per
+    row) plus factors and their explanation methods (one entry per valid row)
+    """
+    # Build the whole feature matrix once; bad rows are masked out, not raised
+    X, valid, errors = build_feature_matrix(df, feature_names)
+    if sharded is not None and sharded.should_shard(len(X)):
+        probabilities, labels = sharded.score_matrix(X, valid)
+    else:
+        probabilities, labels = score_matrix(predictor, X, valid)
+    factors, methods = explainer.factors(X[valid])
+    return {
+        'ids': student_ids(df),
+        'valid': valid,
+        'labels': labels,
+        'probabilities': probabilities,
+        'risks': risk_levels(probabilities),
+        'errors': errors,
+        'factors': factors,
+        'methods': methods
+    }
+
+def score_summary(scored):
+    """pass/fail/high_risk counts for score_columns output"""
+    valid, labels = scored['valid'], scored['labels']
+    return {
+        'pass': int((valid & (labels == 1)).sum()),
+        'fail': int((valid & (labels != 1)).sum()),
+        'high_risk': int((valid & (scored['risks'] == 'high')).sum())
+    }
+
+def score_frame(predictor, explainer, feature_names, df, sharded=None):
+    """
+    Score a frame of students as per-student result dicts
+    Returns (results, summary) where summary holds pass/fail/high_risk counts
+    """
+    scored = score_columns(predictor, explainer, feature_names, df, sharded)
+    errors = scored['errors']
+    factors = iter(scored['factors'])
+    methods = iter(scored['methods'])
+
+    # Whole columns become Python values in C (tolist), not one float() per row
+    outcomes = np.where(scored['labels'] == 1, 'Pass', 'Fail').tolist()
+    probability_values = scored['probabilities'].tolist()
+    risk_values = scored['risks'].tolist()
+    valid_values = scored['valid'].tolist()
+
+    results = []
+    for i, student_id in enumerate(scored['ids']):
+        if valid_values[i]:
+            results.append({
+                'student_id': student_id,
+                'prediction': outcomes[i],
+                'probability': probability_values[i],
+                'risk_level': risk_values[i],
+                'top_factors': next(factors),
+                'explanation_method': next(methods)
+            })
+        else:
+            results.append({
+                'student_id': student_id,
+                'error': errors[i]
+            })
+
+    return results, score_summary(scored)
+
+def probe_matrix(feature_names, n_students=200):
+    """Feature matrix for synthetic students, used to verify and warm up models"""
+    from generate_data import generate_student_data
+
+    X, valid, _ = build_feature_matrix(generate_student_data(n_students), feature_names)
+    return X[valid]
+
+def range_matrix(model_card, n_rows=256, missing_rate=0.02, seed=0):
+    """
+    Rows drawn uniformly within the training ranges recorded in the model card
+    A few cells are left missing so the imputer path is exercised too; returns
+    None for cards written before feature_ranges was recorded
+    """
+    ranges = model_card.get('feature_ranges')
+    names = model_card['feature_names']
+    if not ranges or any(name not in ranges for name in names):
+        return None
+    rng = np.random.default_rng(seed)
+    low = np.array([ranges[name]['min'] for name in names], dtype=np.float64)
+    high = np.array([ranges[name]['max'] for name in names], dtype=np.float64)
+    X = rng.uniform(low, high, size=(n_rows, len(names)))
+    X[rng.random(X.shape) < missing_rate] = np.nan
+    return X
+
+# Per-process predictor for worker pools, reloaded only when the artifacts change
+_loaded_predictor = {}
+
+def load_predictor(model_path='models/best_model.pkl', card_path='models/model_card.json'):
+    """Load, verify and cache (predictor, model_card) for this process"""
+    key = (model_path, os.path.getmtime(model_path), os.path.getmtime(card_path))
+    if key not in _loaded_predictor:
+        with open(model_path, 'rb') as f:
+            model = pickle.load(f)
+        with open(card_path, 'r') as f:
+            model_card = json.load(f)
+        # For a specific saved model, present the card as if it were the best one
+        name = os.path.splitext(os.path.basename(model_path))[0]
+        if name != 'best_model':
+            model_card = dict(model_card, best_model=name)
+        predictor = Predictor(model)
+        predictor.verify(probe_matrix(model_card['feature_names']))
+        _loaded_predictor.clear()
+        _loaded_predictor[key] = (predictor, model_card)
+    return _loaded_predictor[key]
+
+def model_version(model_card):
+    """Identifier that changes whenever a new model is trained"""
+    return f"{model_card['best_model']}@{model_card['training_date']}"
+
+def student_ids(df):
+    """Student ids as plain Python values, 'unknown' when the column is absent"""
+    if 'student_id' in df.columns:
+        return df['student_id'].tolist()
+    return ['unknown'] * len(df)
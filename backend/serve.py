@@ -0,0 +1,152 @@
+"""
+Production entry point for the prediction API
+The master process loads and warms up the model once (app.create_app),
+freezes the garbage collector, and then forks WEB_WORKERS workers that
+accept connections on one shared listening socket. The model's arrays and
+Python objects are shared copy-on-write instead of being loaded per worker
+
+Usage (from the backend directory, after train_model.py):
+    python serve.py --workers 4 --port 8000
+"""
+
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+import config
+
+# Native thread pools that otherwise size themselves to every core in every worker
+BLAS_THREAD_VARS = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS',
+                    'VECLIB_MAXIMUM_THREADS', 'NUMEXPR_NUM_THREADS')
+
+def limit_native_threads(threads):
+    """
+    Cap BLAS/OpenMP and XGBoost threads per worker (explicit environment settings win)
+    Must run before NumPy is imported: the pools are sized when the libraries load
+    """
+    for name in BLAS_THREAD_VARS:
+        os.environ.setdefault(name, str(threads))
+    if 'XGBOOST_NTHREAD' not in os.environ:
+        config.XGBOOST_NTHREAD = threads
+
+def preload():
+    """
+    Load and warm up the model in the master, before any fork
+    Background threads don't survive fork, so they are left to each worker
+    """
+    config.LEAN_STARTUP = False
+    # The workers already use every core; a process pool per worker would oversubscribe
+    if 'BULK_SHARD_WORKERS' not in os.environ:
+        config.BULK_SHARD_WORKERS = 1
+
+    import app
+    app.create_app(start_threads=False)
+    if app.store.current is None:
+        sys.exit("❌ No model loaded; run train_model.py first")
+    return app
+
+def run_worker(app, listener):
+    """Worker body: serve requests on the inherited socket until told to stop"""
+    import logging
+    from werkzeug.serving import make_server
+
+    # Back to the defaults the master overrode for supervision
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    gc.enable()
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)  # no per-request access log
+
+    app.start_background_threads()
+    host, port = listener.getsockname()[:2]
+    server = make_server(host, port, app.app, threaded=True, fd=listener.fileno())
+    server.serve_forever()
+
+class Master:
+    """Forks the workers, replaces any that exit, and stops them all on SIGTERM/SIGINT"""
+
+    def __init__(self, app, listener, workers):
+        self.app = app
+        self.listener = listener
+        self.workers = workers
+        self.children = set()
+        self.stopping = False
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                run_worker(self.app, self.listener)
+            except BaseException:
+                status = 1
+            finally:
+                os._exit(status)
+        self.children.add(pid)
+
+    def stop(self, signum, frame):
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for _ in range(self.workers):
+            self.spawn()
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            self.children.discard(pid)
+            if not self.stopping:
+                print(f"⚠️  Worker {pid} exited ({os.waitstatus_to_exitcode(status)}); starting a replacement")
+                time.sleep(1)  # don't spin if workers die on startup
+                self.spawn()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-forking production server for the prediction API")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=config.WEB_WORKERS,
+                        help="Worker processes (default WEB_WORKERS, the core count)")
+    parser.add_argument('--threads', type=int, default=config.WORKER_THREADS,
+                        help="BLAS/OpenMP/XGBoost threads per worker (default WORKER_THREADS, or cores / workers)")
+    parser.add_argument('--no-gc-freeze', action='store_true',
+                        help="Skip gc.freeze() before forking (for memory comparisons)")
+    args = parser.parse_args()
+
+    if not hasattr(os, 'fork'):
+        sys.exit("❌ serve.py needs os.fork (Linux/macOS); use app.py on this platform")
+
+    workers = max(1, args.workers)
+    threads = args.threads or max(1, (os.cpu_count() or 1) // workers)
+    limit_native_threads(threads)
+
+    # Collections in the master would only churn pages the workers are about to share
+    gc.disable()
+    started = time.perf_counter()
+    app = preload()
+    if not args.no_gc_freeze:
+        # Move everything loaded so far to a permanent generation: worker collections
+        # then never traverse it, which would write to each object's GC header and
+        # copy the page it lives on into that worker
+        gc.freeze()
+    print(f"✅ Preloaded {app.store.current.version} in {time.perf_counter() - started:.2f}s "
+          f"({gc.get_freeze_count():,} objects frozen)")
+
+    listener = socket.create_server((args.host, args.port), reuse_port=False, backlog=2048)
+    listener.set_inheritable(True)
+    print(f"🚀 Serving on http://{args.host}:{args.port} with {workers} worker(s), "
+          f"{threads} native thread(s) each")
+    Master(app, listener, workers).run()
+    print("👋 All workers stopped")
@@ -0,0 +1,224 @@
+"""
+Multi-core sharded bulk inference
+Large feature matrices are split into row shards and scored by worker
+processes that each build their own predictor for the model, the same
+way the API builds its bundles
+
+Offline usage:
+    python sharding.py students.csv predictions.csv --workers 8
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+
+import config
+from model_store import artifact_stamp, read_artifacts
+from scoring import (
+    Predictor, build_feature_matrix, probe_matrix, risk_levels, score_matrix, student_ids
+)
+from startup import lazy_import
+
+pd = lazy_import('pandas')
+
+def verified_predictor(model, model_card):
+    """A verified single-pass Predictor around the model as loaded (the offline default)"""
+    predictor = Predictor(model)
+    predictor.verify(probe_matrix(model_card['feature_names']))
+    return predictor
+
+# Per worker process, set by _init_worker
+_worker = {'build_predictor': verified_predictor, 'artifact_format': 'pickle', 'loaded': {}}
+
+def _init_worker(build_predictor, artifact_format):
+    """Keep each worker to a single thread; models load on the first shard that needs them"""
+    from threadpoolctl import threadpool_limits
+
+    # N workers x M BLAS/OpenMP threads would oversubscribe the cores
+    threadpool_limits(1)
+    config.XGBOOST_NTHREAD = 1
+    _worker.update(build_predictor=build_predictor, artifact_format=artifact_format)
+
+def _single_threaded(model):
+    classifier = model[-1] if hasattr(model, 'steps') else model
+    if hasattr(classifier, 'get_params') and 'n_jobs' in classifier.get_params():
+        classifier.set_params(n_jobs=1)
+
+class ArtifactChanged(RuntimeError):
+    """The model files on disk are no longer the version a shard was pinned to"""
+
+def _worker_predictor(model_path, card_path, stamp):
+    """
+    This worker's predictor for the model_path version with artifact_stamp() == stamp,
+    built the way the API builds its bundles; ArtifactChanged once the files differ
+    """
+    key = (model_path, stamp)
+    loaded = _worker['loaded']
+    if key not in loaded:
+        if artifact_stamp(model_path, card_path) != stamp:
+            raise ArtifactChanged(f"{model_path} was replaced after this version was loaded")
+        model, model_card = read_artifacts(model_path, card_path, _worker['artifact_format'])
+        if artifact_stamp(model_path, card_path) != stamp:
+            raise ArtifactChanged(f"{model_path} was replaced while it was being read")
+        _single_threaded(model)
+        # For a specific saved model, present the card as if it were the best one
+        name = os.path.splitext(os.path.basename(model_path))[0]
+        if name != 'best_model':
+            model_card = dict(model_card, best_model=name)
+        loaded.clear()
+        loaded[key] = _worker['build_predictor'](model, model_card)
+    return loaded[key]
+
+def _score_shard(model_path, card_path, stamp, X, valid):
+    predictor = _worker_predictor(model_path, card_path, stamp)
+    return score_matrix(predictor, X, valid, chunk_size=len(X) or 1)
+
+class ShardedScorer:
+    """
+    Scores row shards in a lazily created process pool and merges them in input order
+    Workers make their predictors with build_predictor(model, model_card); the API
+    passes its own, so shards are scored by the same compiled, fused or native
+    evaluator as in-process requests. It must be a module-level function
+    """
+
+    def __init__(self, workers=None, shard_rows=25000, min_rows=50000,
+                 model_path='models/best_model.pkl', card_path='models/model_card.json',
+                 build_predictor=verified_predictor, artifact_format='pickle'):
+        self.workers = workers or os.cpu_count()
+        self.shard_rows = shard_rows
+        self.min_rows = min_rows
+        self.model_path = model_path
+        self.card_path = card_path
+        self.build_predictor = build_predictor
+        self.artifact_format = artifact_format
+        self.stale_shards = 0
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                    initargs=(self.build_predictor, self.artifact_format)
+                )
+            return self._pool
+
+    def should_shard(self, n_rows):
+        """Only inputs big enough to amortize the inter-process copies are sharded"""
+        return self.workers > 1 and n_rows >= self.min_rows
+
+    def score_matrix(self, X, valid, model_path=None, card_path=None, stamp=None, local=None):
+        """
+        Same contract as scoring.score_matrix, computed across worker processes
+        model_path/card_path pick the artifacts (default: best_model.pkl). Workers
+        only score with the files whose artifact_stamp() is stamp (default: the
+        files as they are now); a shard whose worker finds newer ones is scored
+        by local, the caller's predictor for that version, or raises ArtifactChanged
+        """
+        if len(X) == 0:
+            return np.empty(0), np.empty(0, dtype=np.int64)
+        model_path = model_path or self.model_path
+        card_path = card_path or self.card_path
+        stamp = stamp or artifact_stamp(model_path, card_path)
+        pool = self._executor()
+        shards = [
+            (start, pool.submit(_score_shard, model_path, card_path, stamp,
+                                X[start:start + self.shard_rows], valid[start:start + self.shard_rows]))
+            for start in range(0, len(X), self.shard_rows)
+        ]
+        results = []
+        try:
+            # Results are collected in submission order, so concatenation restores input order
+            for start, future in shards:
+                try:
+                    results.append(future.result())
+                except ArtifactChanged:
+                    if local is None:
+                        raise
+                    # A retrain landed before this worker had loaded the pinned version
+                    end = start + self.shard_rows
+                    results.append(score_matrix(local, X[start:end], valid[start:end]))
+                    self.stale_shards += 1
+        except BrokenProcessPool:
+            # A worker died; every later submit to this pool would fail too
+            with self._lock:
+                if self._pool is pool:
+                    self._pool = None
+            raise
+        finally:
+            for _, future in shards:
+                future.cancel()
+        probabilities, labels = zip(*results)
+        return np.concatenate(probabilities), np.concatenate(labels)
+
+    def bound(self, bundle):
+        """View of this scorer (same pool) that scores with a ModelBundle's exact version"""
+        return _BoundShards(self, bundle)
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+class _BoundShards:
+    def __init__(self, scorer, bundle):
+        self.scorer = scorer
+        self.bundle = bundle
+
+    def should_shard(self, n_rows):
+        return self.scorer.should_shard(n_rows)
+
+    def score_matrix(self, X, valid):
+        bundle = self.bundle
+        if bundle.stamp is None:
+            # Its files changed while it loaded, so no worker can load the same version
+            return score_matrix(bundle.predictor, X, valid)
+        return self.scorer.score_matrix(X, valid, bundle.model_path, bundle.card_path,
+                                        bundle.stamp, local=bundle.predictor)
+
+def score_csv(input_path, output_path, scorer):
+    """Offline scoring of a whole CSV into a predictions CSV"""
+    # Every shard scores with the model as it is now, even if a retrain lands meanwhile
+    stamp = artifact_stamp(scorer.model_path, scorer.card_path)
+    with open(scorer.card_path, 'r') as f:
+        model_card = json.load(f)
+    df = pd.read_csv(input_path)
+    X, valid, errors = build_feature_matrix(df, model_card['feature_names'])
+    probabilities, labels = scorer.score_matrix(X, valid, stamp=stamp)
+
+    pd.DataFrame({
+        'student_id': student_ids(df),
+        'prediction': np.where(valid, np.where(labels == 1, 'Pass', 'Fail'), None),
+        'probability': probabilities,
+        'risk_level': np.where(valid, risk_levels(probabilities), None),
+        'error': errors
+    }).to_csv(output_path, index=False)
+    return int(valid.sum()), len(df)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score a student CSV across worker processes")
+    parser.add_argument('input', help="CSV with the bulk upload columns")
+    parser.add_argument('output', help="Where to write the predictions CSV")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--shard-rows', type=int, default=25000)
+    args = parser.parse_args()
+
+    scorer = ShardedScorer(args.workers, args.shard_rows)
+    start = time.perf_counter()
+    scored, total = score_csv(args.input, args.output, scorer)
+    elapsed = time.perf_counter() - start
+    scorer.shutdown()
+
+    print(f"✅ Scored {scored}/{total} students in {elapsed:.2f}s "
+          f"({total / elapsed:,.0f} rows/s, {args.workers} workers)")
+    print(f"📁 Saved to: {args.output}")
@@ -0,0 +1,65 @@
+"""
+Startup profiling and lean-mode import deferral
+LEAN_STARTUP=1 swaps heavy modules for proxies that import on first
+attribute access, and app.py loads the model in the background, so the
+server accepts connections (and answers liveness probes) before it is ready
+"""
+
+import importlib
+import threading
+import time
+
+import config
+
+# Reference point for every startup mark: the first backend module imported
+_STARTED = time.perf_counter()
+
+class _DeferredModule:
+    """Stands in for a module until something reads an attribute from it"""
+
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+
+    def __getattr__(self, attr):
+        module = self.__dict__['_module']
+        if module is None:
+            module = importlib.import_module(self.__dict__['_name'])
+            self.__dict__['_module'] = module
+        return getattr(module, attr)
+
+def lazy_import(name):
+    """The module itself, or a deferred proxy for it when LEAN_STARTUP is on"""
+    if not config.LEAN_STARTUP:
+        return importlib.import_module(name)
+    return _DeferredModule(name)
+
+class StartupProfile:
+    """Seconds from process start to each startup milestone, plus the first request"""
+
+    def __init__(self):
+        self.marks = {}
+        self.first_request_ms = None
+        self._lock = threading.Lock()
+
+    def mark(self, name):
+        """Record a milestone once (later calls for the same name are ignored)"""
+        with self._lock:
+            self.marks.setdefault(name, round(time.perf_counter() - _STARTED, 3))
+
+    def record_request(self, seconds):
+        if self.first_request_ms is None:
+            with self._lock:
+                if self.first_request_ms is None:
+                    self.first_request_ms = round(seconds * 1000, 3)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'lean': config.LEAN_STARTUP,
+                'uptime_seconds': round(time.perf_counter() - _STARTED, 3),
+                'marks': dict(self.marks),
+                'first_request_ms': self.first_request_ms
+            }
+
+profile = StartupProfile()
@@ -0,0 +1,136 @@
+"""
+Shared test fixtures
+Run from the backend directory: pytest tests/
+"""
+
+import json
+import os
+import pickle
+import sys
+
+import numpy as np
+import pytest
+
+# The backend is a flat directory of modules, not a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from generate_data import generate_student_data  # noqa: E402
+from scoring import engineer_features  # noqa: E402
+
+FEATURE_NAMES = [
+    'attendance_pct', 'internal_marks_avg', 'cultural_activity_score',
+    'class_participation_score', 'sports_activity_score', 'curricular_activity_score',
+    'engagement_index', 'internal_to_attendance_ratio',
+    'study_hours_per_week', 'previous_gpa', 'social_support_index'
+]
+
+# Labels generate_student_data adds that a request wouldn't carry
+OUTCOME_COLUMNS = ['engagement_index', 'final_result', 'final_grade', 'target_category']
+
+@pytest.fixture(scope='session')
+def feature_names():
+    return list(FEATURE_NAMES)
+
+@pytest.fixture(scope='session')
+def payloads():
+    """/api/predict bodies for 200 synthetic students, derived features left to the server"""
+    return generate_student_data(200).drop(columns=OUTCOME_COLUMNS).to_dict('records')
+
+@pytest.fixture(scope='session')
+def training_set():
+    """(X, y) for 400 generated students with ~3% of inputs missing, in FEATURE_NAMES order"""
+    df = engineer_features(generate_student_data(400))
+    X = df[FEATURE_NAMES]
+    X = X.mask(np.random.default_rng(0).random(X.shape) < 0.03)
+    return X, (df['final_result'] == 'Pass').astype(int)
+
+@pytest.fixture(scope='session')
+def random_forest(training_set):
+    """A small imputer + RandomForest pipeline shaped like train_model.py's"""
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.impute import SimpleImputer
+    from sklearn.pipeline import Pipeline
+
+    model = Pipeline([
+        ('imputer', SimpleImputer(strategy='median')),
+        ('classifier', RandomForestClassifier(n_estimators=20, max_depth=6, random_state=0))
+    ])
+    return model.fit(*training_set)
+
+@pytest.fixture(scope='session')
+def xgboost_model(training_set):
+    """A small imputer + XGBClassifier pipeline shaped like train_model.py's"""
+    from sklearn.impute import SimpleImputer
+    from sklearn.pipeline import Pipeline
+    from xgboost import XGBClassifier
+
+    model = Pipeline([
+        ('imputer', SimpleImputer(strategy='median')),
+        ('classifier', XGBClassifier(n_estimators=30, max_depth=4, learning_rate=0.3,
+                                     random_state=0, eval_metric='logloss'))
+    ])
+    return model.fit(*training_set)
+
+@pytest.fixture(scope='session')
+def logistic_regression(training_set):
+    """imputer -> scaler -> LogisticRegression, as train_model.py builds it"""
+    from sklearn.impute import SimpleImputer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+
+    model = Pipeline([
+        ('imputer', SimpleImputer(strategy='median')),
+        ('scaler', StandardScaler()),
+        ('classifier', LogisticRegression(class_weight='balanced', max_iter=1000, random_state=42))
+    ])
+    return model.fit(*training_set)
+
+@pytest.fixture(scope='session')
+def svm(training_set):
+    """imputer -> scaler -> SVC(probability=True), as train_model.py builds it"""
+    from sklearn.impute import SimpleImputer
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.svm import SVC
+
+    model = Pipeline([
+        ('imputer', SimpleImputer(strategy='median')),
+        ('scaler', StandardScaler()),
+        ('classifier', SVC(kernel='rbf', probability=True, class_weight='balanced', random_state=42))
+    ])
+    return model.fit(*training_set)
+
+@pytest.fixture(scope='session')
+def held_out(feature_names):
+    """Rows the fixtures weren't fitted on, ~3% missing"""
+    df = engineer_features(generate_student_data(300))
+    X = df[feature_names].to_numpy(dtype=np.float64)
+    X[np.random.default_rng(1).random(X.shape) < 0.03] = np.nan
+    return X
+
+def write_artifacts(models_dir, models, best, training_date='2025-01-10T12:00:00', feature_ranges=None):
+    """save_model_artifacts' layout: <name>.pkl per model, best_model.pkl and model_card.json"""
+    os.makedirs(models_dir, exist_ok=True)
+    for name, model in dict(models, best_model=models[best]).items():
+        with open(os.path.join(models_dir, f'{name}.pkl'), 'wb') as f:
+            pickle.dump(model, f)
+    importance = {
+        name: dict(zip(FEATURE_NAMES, model[-1].feature_importances_.tolist()))
+        if hasattr(model[-1], 'feature_importances_') else {}
+        for name, model in models.items()
+    }
+    card = {'training_date': training_date, 'best_model': best, 'feature_names': FEATURE_NAMES,
+            'model_results': {}, 'feature_importance': importance}
+    if feature_ranges is not None:
+        card['feature_ranges'] = feature_ranges
+    with open(os.path.join(models_dir, 'model_card.json'), 'w') as f:
+        json.dump(card, f)
+    return card
+
+@pytest.fixture
+def models_dir(tmp_path, random_forest):
+    """A models/ directory holding the random forest as the best model"""
+    path = str(tmp_path / 'models')
+    write_artifacts(path, {'random_forest': random_forest}, 'random_forest')
+    return path
@@ -0,0 +1,85 @@
+"""MicroBatcher fan-out: one predict call per batch, each caller gets its own row back"""
+
+import threading
+
+import numpy as np
+import pytest
+
+from batching import MicroBatcher
+
+class RecordingPredictor:
+    """Predictor stand-in whose 'probability' is the row's first value"""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.batches = []
+        self._lock = threading.Lock()
+
+    def predict(self, X):
+        with self._lock:
+            self.batches.append(len(X))
+        if self.fail:
+            raise ValueError('bad batch')
+        return {'label': (X[:, 0] > 0.5).astype(np.int64), 'probability': X[:, 0].copy()}
+
+def predict_concurrently(batcher, rows_and_predictors):
+    """Submit every row from its own thread; returns results (or exceptions) in order"""
+    results = [None] * len(rows_and_predictors)
+    barrier = threading.Barrier(len(rows_and_predictors))
+
+    def call(i, row, predictor):
+        barrier.wait()
+        try:
+            results[i] = batcher.predict(row, predictor)
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=call, args=(i, row, predictor))
+               for i, (row, predictor) in enumerate(rows_and_predictors)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+    return results
+
+def test_concurrent_rows_share_a_call_and_get_their_own_slice():
+    batcher = MicroBatcher(window_ms=200, max_rows=64)
+    predictor = RecordingPredictor()
+    values = np.linspace(0.0, 1.0, 16)
+    results = predict_concurrently(batcher, [(np.array([[v, 1.0]]), predictor) for v in values])
+
+    for value, result in zip(values, results):
+        assert result['probability'].shape == (1,)
+        assert result['probability'][0] == value
+        assert result['label'][0] == int(value > 0.5)
+    assert sum(predictor.batches) == 16
+    assert len(predictor.batches) < 16
+    assert batcher.stats()['rows'] == 16
+
+def test_batches_are_capped_at_max_rows():
+    batcher = MicroBatcher(window_ms=200, max_rows=4)
+    predictor = RecordingPredictor()
+    predict_concurrently(batcher, [(np.array([[0.1 * i, 0.0]]), predictor) for i in range(10)])
+    assert max(predictor.batches) <= 4
+    assert sum(predictor.batches) == 10
+
+def test_rows_are_scored_by_their_own_predictor():
+    batcher = MicroBatcher(window_ms=200, max_rows=64)
+    old, new = RecordingPredictor(), RecordingPredictor()
+    rows = [(np.array([[0.2, 0.0]]), old if i % 2 else new) for i in range(8)]
+    predict_concurrently(batcher, rows)
+    assert sum(old.batches) == 4
+    assert sum(new.batches) == 4
+
+def test_errors_reach_every_caller_in_the_batch():
+    batcher = MicroBatcher(window_ms=200, max_rows=64)
+    results = predict_concurrently(batcher, [(np.array([[0.3, 0.0]]), RecordingPredictor(fail=True))] * 4)
+    assert all(isinstance(result, ValueError) for result in results)
+
+def test_input_buffer_is_copied():
+    # FeatureAssembler reuses its row buffer, so the queued row must be a copy
+    batcher = MicroBatcher(window_ms=1, max_rows=64)
+    row = np.array([[0.25, 0.0]])
+    result = batcher.predict(row, RecordingPredictor())
+    row[0, 0] = 0.75
+    assert result['probability'][0] == pytest.approx(0.25)
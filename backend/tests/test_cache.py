@@ -0,0 +1,64 @@
+"""PredictionCache: keys, LRU/TTL bounds and invalidation on model version changes"""
+
+import numpy as np
+
+from cache import RETIRED_PER_MODEL, PredictionCache, feature_key
+
+ROW = np.array([[80.0, 65.0, 7.0]])
+
+def test_equivalent_rows_share_a_key():
+    assert feature_key(np.array([[0.0, np.nan]])) == feature_key(np.array([[-0.0, -np.nan]]))
+    assert feature_key(ROW) != feature_key(ROW + 1)
+
+def test_hit_after_put():
+    cache = PredictionCache()
+    assert cache.get(ROW, 'rf@1') is None
+    cache.put(ROW, 'rf@1', {'probability': 0.9})
+    assert cache.get(ROW, 'rf@1') == {'probability': 0.9}
+    assert cache.stats()['hits'] == 1
+
+def test_new_version_drops_the_old_entries():
+    cache = PredictionCache()
+    cache.put(ROW, 'rf@1', 'old')
+    cache.put(ROW + 1, 'lr@1', 'other model')
+
+    assert cache.get(ROW, 'rf@2') is None
+    assert cache.stats()['entries'] == 1  # only the other model's entry is left
+    assert cache.stats()['invalidations'] == 1
+    assert cache.get(ROW + 1, 'lr@1') == 'other model'
+
+def test_requests_on_a_retired_version_bypass_the_cache():
+    cache = PredictionCache()
+    cache.put(ROW, 'rf@1', 'old')
+    cache.put(ROW, 'rf@2', 'new')
+
+    # A request that started before the swap neither reads nor flushes rf@2's entries
+    cache.put(ROW, 'rf@1', 'late old result')
+    assert cache.get(ROW, 'rf@1') is None
+    assert cache.get(ROW, 'rf@2') == 'new'
+
+def test_retired_versions_are_bounded():
+    cache = PredictionCache()
+    for i in range(100):
+        cache.put(ROW, f'rf@{i}', i)
+    assert list(cache._retired) == ['rf']
+    assert list(cache._retired['rf']) == [f'rf@{i}' for i in range(99 - RETIRED_PER_MODEL, 99)]
+    assert cache.get(ROW, 'rf@98') is None
+    assert cache.get(ROW, 'rf@99') == 99
+
+def test_lru_eviction_and_ttl(monkeypatch):
+    import cache as cache_module
+
+    cache = PredictionCache(max_entries=2, ttl_seconds=10)
+    cache.put(ROW, 'rf@1', 'a')
+    cache.put(ROW + 1, 'rf@1', 'b')
+    cache.get(ROW, 'rf@1')  # a is now the most recently used
+    cache.put(ROW + 2, 'rf@1', 'c')
+    assert cache.get(ROW + 1, 'rf@1') is None
+    assert cache.get(ROW, 'rf@1') == 'a'
+    assert cache.stats()['evictions'] == 1
+
+    now = cache_module.time.monotonic() + 11
+    monkeypatch.setattr(cache_module.time, 'monotonic', lambda: now)
+    assert cache.get(ROW, 'rf@1') is None
+    assert cache.stats()['expirations'] == 1
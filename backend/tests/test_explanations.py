@@ -0,0 +1,66 @@
+"""Importance and TreeSHAP factors, and the SHAP latency budget"""
+
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from explanations import ExplanationEngine, ShapExplanationEngine
+
+pytest.importorskip('shap')
+
+@pytest.fixture
+def importance_engine(feature_names, random_forest):
+    importance = dict(zip(feature_names, random_forest[-1].feature_importances_))
+    return ExplanationEngine(feature_names, importance)
+
+def shap_engine(random_forest, feature_names, fallback, **kwargs):
+    return ShapExplanationEngine(random_forest, feature_names, fallback, 'rf@test', **kwargs)
+
+def test_importance_factors_report_their_method(importance_engine, training_set):
+    X = training_set[0].to_numpy()[:5]
+    factors, methods = importance_engine.factors(X)
+    assert methods == ['importance'] * 5
+    # Factor entries keep the response's {feature, impact} shape
+    assert all(len(row) == 3 and all(set(f) == {'feature', 'impact'} for f in row) for row in factors)
+    assert importance_engine.top_factors(X) == factors
+
+def test_shap_factors_sum_to_the_prediction(random_forest, feature_names, importance_engine, training_set):
+    engine = shap_engine(random_forest, feature_names, importance_engine, latency_budget_ms=60000)
+    X = training_set[0].to_numpy()[:20]
+    impacts, methods = engine.explain(X)
+    assert methods == ['shap'] * 20
+
+    expected_value = np.atleast_1d(engine.explainer.expected_value)[-1]
+    np.testing.assert_allclose(impacts.sum(axis=1) + expected_value,
+                               random_forest.predict_proba(X)[:, 1], atol=1e-6)
+    assert engine.factors(X)[1] == ['shap'] * 20
+
+    # factors() was served from the cache
+    assert engine.stats()['cache_hits'] == 20
+
+def test_budget_cuts_the_last_batch_instead_of_dropping_it(random_forest, feature_names,
+                                                           importance_engine, training_set, monkeypatch):
+    """Every SHAP row costs exactly 1 ms on a fake clock, so a 50.5 ms budget fits 50 rows"""
+    import explanations
+
+    now = [0.0]
+    monkeypatch.setattr(explanations, 'time', SimpleNamespace(perf_counter=lambda: now[0]))
+    engine = shap_engine(random_forest, feature_names, importance_engine,
+                         latency_budget_ms=50.5, batch_rows=8)
+    shap_values = engine._shap_values
+
+    def timed_shap_values(X):
+        now[0] += 0.001 * len(X)
+        return shap_values(X)
+
+    engine._shap_values = timed_shap_values
+    X = training_set[0].to_numpy()[:250]
+    impacts, methods = engine.explain(X)
+
+    # 6 whole batches (48 rows), then the 7th cut to the 2 rows that still fit
+    assert methods == ['shap'] * 50 + ['importance'] * 200
+    assert engine.stats()['fallback_rows'] == 200
+    np.testing.assert_array_equal(impacts[50:, importance_engine.columns], importance_engine.impacts(X[50:]))
+    # Fallback rows aren't cached, so they get SHAP values once there is budget
+    assert engine.stats()['cache_entries'] == 50
@@ -0,0 +1,93 @@
+"""Bulk job scoring, run in-process (JobManager only adds the process pool around run_job)"""
+
+import json
+import os
+import time
+
+import pandas as pd
+
+from jobs import JobManager, _count_rows, _read_status, _write_status, run_job
+
+def write_job(job_dir, rows):
+    os.makedirs(job_dir)
+    pd.DataFrame(rows).to_csv(os.path.join(job_dir, 'input.csv'), index=False)
+    _write_status(job_dir, {'job_id': 'test', 'state': 'queued', 'rows_done': 0, 'rows_total': None,
+                            'summary': {'pass': 0, 'fail': 0, 'high_risk': 0}})
+
+def test_row_count_follows_the_csv_parser(tmp_path):
+    path = tmp_path / 'input.csv'
+    path.write_text('student_id,notes\n1,"two\nlines"\n2,plain\n3,"and\nthree\nlines"')
+    assert _count_rows(str(path), chunk_size=2) == 3
+
+def test_job_with_multiline_fields(tmp_path, models_dir, payloads):
+    job_dir = str(tmp_path / 'job')
+    rows = [dict(data, notes='line one\nline two') for data in payloads[:25]]
+    rows[3]['attendance_pct'] = 'absent'
+    write_job(job_dir, rows)
+
+    state = run_job(job_dir, os.path.join(models_dir, 'best_model.pkl'),
+                    os.path.join(models_dir, 'model_card.json'), chunk_size=10)
+
+    status = _read_status(job_dir)
+    assert state == 'done', status.get('error')
+    assert status['rows_total'] == status['rows_done'] == 25
+    assert sum(status['summary'][key] for key in ('pass', 'fail')) == 24
+    with open(os.path.join(job_dir, 'results.ndjson')) as f:
+        results = [json.loads(line) for line in f]
+    assert [r['student_id'] for r in results] == [data['student_id'] for data in payloads[:25]]
+    assert 'error' in results[3]
+
+def wait_for_state(manager, job_id, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = manager.status(job_id)
+        if status['state'] in ('done', 'failed'):
+            return status
+        time.sleep(0.1)
+    return manager.status(job_id)
+
+def test_jobs_dir_is_created_on_first_submit(tmp_path, models_dir, payloads):
+    jobs_dir = tmp_path / 'jobs'
+    manager = JobManager(str(jobs_dir), 1, os.path.join(models_dir, 'best_model.pkl'),
+                         os.path.join(models_dir, 'model_card.json'))
+    assert not jobs_dir.exists()
+    assert manager.status('0' * 32) is None
+
+    status = manager.submit(lambda path: pd.DataFrame(payloads[:12]).to_csv(path, index=False))
+    assert (jobs_dir / status['job_id'] / 'input.csv').exists()
+    status = wait_for_state(manager, status['job_id'])
+    assert status['state'] == 'done', status.get('error')
+    assert status['rows_done'] == 12 and status['progress'] == 1.0
+    assert manager.results_path(status['job_id']) is not None
+
+def test_jobs_left_unfinished_by_a_restart_are_failed(tmp_path, payloads):
+    manager = JobManager(str(tmp_path / 'jobs'))
+    states = {}
+    for state in ('queued', 'running', 'done', 'failed'):
+        job_id = format(len(states) + 1, '032x')
+        job_dir = str(tmp_path / 'jobs' / job_id)
+        write_job(job_dir, payloads[:2])
+        _write_status(job_dir, dict(_read_status(job_dir), state=state))
+        states[job_id] = state
+    # A restart mid-upload leaves a directory without status.json
+    os.makedirs(tmp_path / 'jobs' / ('f' * 32))
+
+    assert manager.fail_interrupted() == 3
+    after = {job_id: manager.status(job_id)['state'] for job_id in states}
+    assert after == {job_id: 'done' if state == 'done' else 'failed' for job_id, state in states.items()}
+    assert 'restart' in manager.status('f' * 32)['error']
+
+def test_finished_jobs_expire(tmp_path, payloads):
+    manager = JobManager(str(tmp_path / 'jobs'), retention_hours=1)
+    old = time.time() - 2 * 3600
+    for n, state in enumerate(('done', 'failed', 'running', 'done'), start=1):
+        job_dir = str(tmp_path / 'jobs' / format(n, '032x'))
+        write_job(job_dir, payloads[:2])
+        _write_status(job_dir, dict(_read_status(job_dir), state=state))
+        if n < 4:
+            os.utime(os.path.join(job_dir, 'status.json'), (old, old))
+
+    # Old finished jobs go; a running job and a recent result stay
+    assert manager.purge_expired() == 2
+    assert sorted(os.listdir(tmp_path / 'jobs')) == [format(3, '032x'), format(4, '032x')]
+    assert JobManager(str(tmp_path / 'jobs'), retention_hours=0).purge_expired() == 0
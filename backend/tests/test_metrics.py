@@ -0,0 +1,68 @@
+"""The metrics text exposition format, parsed back the way a Prometheus scraper reads it"""
+
+import math
+import re
+
+import pytest
+
+from metrics import MetricsRegistry
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})? (\S+)$')
+LABEL = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"(?:,|$)')
+
+def unescape(value):
+    return re.sub(r'\\(.)', lambda m: '\n' if m.group(1) == 'n' else m.group(1), value)
+
+def parse(text):
+    """{name: [(labels, value), ...]} plus {name: type} from exposition text"""
+    samples, types = {}, {}
+    assert text.endswith('\n')
+    for line in text.splitlines():
+        if line.startswith('# TYPE '):
+            _, _, name, kind = line.split(' ')
+            types[name] = kind
+            continue
+        if line.startswith('#'):
+            continue
+        match = SAMPLE.match(line)
+        assert match, line
+        name, labels, value = match.groups()
+        labels = {key: unescape(raw) for key, raw in LABEL.findall(labels or '')}
+        samples.setdefault(name, []).append((labels, float(value)))
+    return samples, types
+
+def histogram_series(samples, name, **labels):
+    """(le -> cumulative count, sum, count) for one labelled series"""
+    def matching(suffix):
+        return [(l, v) for l, v in samples[name + suffix]
+                if all(l.get(k) == v for k, v in labels.items())]
+    buckets = {float(l['le']): v for l, v in matching('_bucket')}
+    (_, total), = matching('_sum')
+    (_, count), = matching('_count')
+    return buckets, total, count
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry('test_')
+    counter = registry.counter('events_total', 'Events', ('endpoint', 'error'))
+    awkward = 'say "hi"\\path\nnext line'
+    counter.inc(('/api/predict', awkward), amount=3)
+
+    samples, types = parse(registry.render())
+    assert types == {'test_events_total': 'counter'}
+    assert samples['test_events_total'] == [({'endpoint': '/api/predict', 'error': awkward}, 3.0)]
+
+def test_histograms_are_cumulative_up_to_inf():
+    registry = MetricsRegistry('test_')
+    histogram = registry.histogram('latency_seconds', 'Latency', ('endpoint',), buckets=(0.001, 0.01, 0.1))
+    values = [0.0005, 0.001, 0.002, 0.05, 0.05, 3.0]
+    for value in values:
+        histogram.observe(('bulk',), value)
+    histogram.observe(('single',), 0.0001)
+
+    samples, types = parse(registry.render())
+    assert types['test_latency_seconds'] == 'histogram'
+    buckets, total, count = histogram_series(samples, 'test_latency_seconds', endpoint='bulk')
+    # le is inclusive: 0.001 falls in the 0.001 bucket
+    assert buckets == {0.001: 2, 0.01: 3, 0.1: 5, math.inf: 6}
+    assert count == len(values) and total == pytest.approx(sum(values))
+    assert histogram_series(samples, 'test_latency_seconds', endpoint='single')[2] == 1
@@ -0,0 +1,201 @@
+"""Compiled, fused and native evaluators against the pipelines they stand in for"""
+
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+from model_compiler import (
+    CompiledPipeline, FusedLinearModel, FusedPreprocessingModel, MappedModel, compile_for_serving,
+    compile_pipeline, export_arrays, fuse_pipeline, load_arrays, map_model, native_xgboost
+)
+
+TOLERANCE = 1e-6
+
+def assert_matches_pipeline(model, stand_in, X):
+    np.testing.assert_allclose(stand_in.predict_proba(X), model.predict_proba(X), rtol=0, atol=TOLERANCE)
+    np.testing.assert_array_equal(stand_in.predict(X), model.predict(X))
+
+def infinite_rows(X):
+    rows = X[:3].copy()
+    rows[0, 0] = np.inf
+    rows[2, -1] = -np.inf
+    return rows
+
+@pytest.mark.parametrize('fixture', ['random_forest', 'xgboost_model'])
+def test_compiled_trees_match_predict_proba(request, fixture, held_out):
+    model = request.getfixturevalue(fixture)
+    compiled = compile_pipeline(model)
+    assert_matches_pipeline(model, compiled, held_out)
+    assert_matches_pipeline(model, compiled, held_out[:1])
+
+@pytest.mark.parametrize('fixture', ['random_forest', 'xgboost_model'])
+def test_compiled_trees_reject_infinity_like_the_pipeline(request, fixture, held_out):
+    model = request.getfixturevalue(fixture)
+    rows = infinite_rows(held_out)
+    with pytest.raises(ValueError, match='infinity'):
+        model.predict_proba(rows)
+    with pytest.raises(ValueError, match='infinity'):
+        compile_pipeline(model).predict_proba(rows)
+    with pytest.raises(ValueError, match='infinity'):
+        compile_pipeline(model).predict_proba(rows[2:])
+
+@pytest.mark.filterwarnings('ignore:overflow encountered in cast:RuntimeWarning')
+def test_compiled_forest_rejects_float32_overflow(random_forest, held_out):
+    rows = held_out[:1].copy()
+    rows[0, 1] = 1e300  # finite in float64, inf once sklearn's trees cast to float32
+    with pytest.raises(ValueError):
+        random_forest.predict_proba(rows)
+    with pytest.raises(ValueError):
+        compile_pipeline(random_forest).predict_proba(rows)
+
+def test_serving_wrapper_routes_large_batches_to_the_pipeline(random_forest, held_out):
+    served, detail = compile_for_serving(random_forest, held_out, max_rows=64)
+    assert isinstance(served, CompiledPipeline), detail
+    assert served._route(held_out[:64]) is served.compiled
+    assert served._route(held_out[:65]) is random_forest
+    assert_matches_pipeline(random_forest, served, held_out)
+
+def test_fused_logistic_regression_matches_the_pipeline(logistic_regression, held_out):
+    fused = fuse_pipeline(logistic_regression)
+    assert isinstance(fused, FusedLinearModel)
+    assert_matches_pipeline(logistic_regression, fused, held_out)
+    assert_matches_pipeline(logistic_regression, fused, held_out[:1])
+
+def test_fused_svm_matches_the_pipeline(svm, held_out):
+    fused = fuse_pipeline(svm)
+    assert isinstance(fused, FusedPreprocessingModel)
+    np.testing.assert_allclose(fused.predict_proba(held_out), svm.predict_proba(held_out),
+                               rtol=0, atol=TOLERANCE)
+    np.testing.assert_array_equal(fused.predict(held_out), svm.predict(held_out))
+
+@pytest.mark.parametrize('fixture', ['logistic_regression', 'svm'])
+def test_fused_models_reject_infinity_like_the_pipeline(request, fixture, held_out):
+    model = request.getfixturevalue(fixture)
+    rows = infinite_rows(held_out)
+    with pytest.raises(ValueError, match='infinity'):
+        model.predict_proba(rows)
+    with pytest.raises(ValueError, match='infinity'):
+        fuse_pipeline(model).predict_proba(rows)
+    with pytest.raises(ValueError, match='infinity'):
+        fuse_pipeline(model).predict(rows[:1])
+
+def test_fused_linear_model_serves_every_batch_size(logistic_regression, held_out):
+    served, detail = compile_for_serving(logistic_regression, held_out, max_rows=64)
+    assert isinstance(served.compiled, FusedLinearModel), detail
+    assert served.max_rows is None
+    assert served._route(held_out) is served.compiled
+
+def test_native_xgboost_matches_the_pipeline(xgboost_model, held_out):
+    native = native_xgboost(xgboost_model, nthread=1)
+    assert_matches_pipeline(xgboost_model, native, held_out)
+    assert_matches_pipeline(xgboost_model, native, held_out[:1])
+
+def test_native_xgboost_rejects_infinity_like_the_pipeline(xgboost_model, held_out):
+    rows = infinite_rows(held_out)
+    native = native_xgboost(xgboost_model, nthread=1)
+    with pytest.raises(ValueError, match='infinity'):
+        xgboost_model.predict_proba(rows)
+    with pytest.raises(ValueError, match='infinity'):
+        native.predict_proba(rows)
+    with pytest.raises(ValueError, match='infinity'):
+        native.predict(rows[2:])
+
+def test_batches_past_max_rows_go_to_the_native_fallback(xgboost_model, held_out):
+    native = native_xgboost(xgboost_model, nthread=1)
+    served, detail = compile_for_serving(xgboost_model, held_out, max_rows=64, fallback=native)
+    assert isinstance(served, CompiledPipeline), detail
+    assert served._route(held_out) is native
+    assert_matches_pipeline(xgboost_model, served, held_out)
+    with pytest.raises(ValueError, match='infinity'):
+        served.predict_proba(np.vstack([held_out, infinite_rows(held_out)]))
+
+def saved(model, directory, name='model'):
+    """Pickle model the way train_model.py does and write its arrays next to it"""
+    model_path = os.path.join(directory, f'{name}.pkl')
+    with open(model_path, 'wb') as f:
+        pickle.dump(model, f)
+    assert export_arrays(model, model_path)
+    return model_path
+
+@pytest.mark.parametrize('fixture', ['random_forest', 'xgboost_model', 'logistic_regression'])
+def test_exported_arrays_round_trip(request, fixture, held_out, tmp_path):
+    model = request.getfixturevalue(fixture)
+    mapped = load_arrays(saved(model, str(tmp_path)))
+    assert mapped.summary()['memory_mapped']
+    assert_matches_pipeline(model, mapped, held_out)
+
+def test_arrays_are_stale_once_the_pickle_changes(random_forest, tmp_path):
+    model_path = saved(random_forest, str(tmp_path))
+    stat = os.stat(model_path)
+
+    # Same size, touched one nanosecond later
+    os.utime(model_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    with pytest.raises(ValueError, match='older than'):
+        load_arrays(model_path)
+
+    # Same mtime, different size
+    with open(model_path, 'ab') as f:
+        f.write(b'\0')
+    os.utime(model_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    with pytest.raises(ValueError, match='older than'):
+        load_arrays(model_path)
+
+    with pytest.raises(ValueError, match='no array artifact'):
+        load_arrays(os.path.join(str(tmp_path), 'missing.pkl'))
+
+def test_mapped_models_unpickle_on_first_use(random_forest, held_out, tmp_path):
+    model_path = saved(random_forest, str(tmp_path))
+    model = map_model(model_path)
+    assert isinstance(model, MappedModel) and not model.summary()['loaded']
+
+    # Pipeline slicing (TreeSHAP) and large batches go to the pickle
+    assert type(model[-1]).__name__ == 'RandomForestClassifier'
+    assert model.summary() == {'evaluator': 'Pipeline', 'loaded': True}
+    assert_matches_pipeline(random_forest, model, held_out)
+
+    # The pickle must still be the one the arrays were mapped from
+    replaced = map_model(model_path)
+    stat = os.stat(model_path)
+    os.utime(model_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    with pytest.raises(ValueError, match='replaced'):
+        replaced.predict(held_out)
+
+@pytest.mark.parametrize('fixture, fallback', [
+    ('random_forest', 'Pipeline'), ('xgboost_model', 'NativeXGBoostModel'), ('logistic_regression', None)
+])
+def test_mapped_models_serve_like_compiled_ones(request, fixture, fallback, held_out, feature_names,
+                                                tmp_path, monkeypatch):
+    import app
+    import config
+
+    monkeypatch.setattr(config, 'COMPILED_TREES_MAX_ROWS', 16)
+    model = request.getfixturevalue(fixture)
+    model_card = {'best_model': fixture, 'feature_names': feature_names, 'feature_importance': {}}
+    mapped = map_model(saved(model, str(tmp_path)))
+    predictor = app.build_predictor(mapped, model_card)
+    served = predictor.model
+    assert isinstance(served, CompiledPipeline) and served.compiled is mapped.mapped
+
+    if fallback is None:
+        # Fused linear models serve every batch from the arrays
+        assert served.max_rows is None
+    else:
+        assert served.max_rows == 16
+        assert served._route(held_out[:16]) is mapped.mapped
+        assert served._route(held_out).summary()['evaluator'] == fallback
+    probabilities = predictor.predict(held_out)['probability']
+    np.testing.assert_allclose(probabilities, model.predict_proba(held_out)[:, 1], rtol=0, atol=TOLERANCE)
+
+def test_tree_shap_explains_mapped_models(random_forest, held_out, feature_names, tmp_path, monkeypatch):
+    import app
+    import config
+    from explanations import ShapExplanationEngine
+
+    monkeypatch.setattr(config, 'EXPLANATION_MODE', 'tree_shap')
+    model_card = {'best_model': 'random_forest', 'training_date': '2025-01-10T12:00:00',
+                  'feature_names': feature_names, 'feature_importance': {}}
+    explainer = app.build_explainer(map_model(saved(random_forest, str(tmp_path))), model_card)
+    assert isinstance(explainer, ShapExplanationEngine)
+    assert explainer.factors(held_out[:2])[1] == ['shap', 'shap']
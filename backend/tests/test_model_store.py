@@ -0,0 +1,119 @@
+"""ModelStore reloads and the registry: only a complete new model (card written last) is picked up"""
+
+import os
+import time
+from types import SimpleNamespace
+
+from conftest import write_artifacts
+from model_store import ModelStore
+
+def stub_bundle(model, model_card):
+    return SimpleNamespace(model=model, model_card=model_card,
+                           version=f"{model_card['best_model']}@{model_card['training_date']}")
+
+def make_store(models_dir):
+    return ModelStore(stub_bundle, os.path.join(models_dir, 'best_model.pkl'),
+                      os.path.join(models_dir, 'model_card.json'))
+
+def set_mtime(path, seconds):
+    os.utime(path, ns=(seconds * 10**9, seconds * 10**9))
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+def test_new_pickle_under_the_old_card_is_not_a_new_model(models_dir):
+    store = make_store(models_dir)
+    model_path, card_path = store.model_path, store.card_path
+    set_mtime(model_path, 1000)
+    set_mtime(card_path, 1001)
+    assert store.load()
+
+    # train_model.py has replaced the pickle but not yet the card
+    set_mtime(model_path, 2000)
+    assert not store.card_changed(store.artifact_stamp())
+
+    # The card lands last
+    set_mtime(card_path, 2001)
+    assert store.card_changed(store.artifact_stamp())
+
+    # A new card that is older than the pickle still waits
+    set_mtime(card_path, 1500)
+    assert not store.card_changed(store.artifact_stamp())
+
+def test_watcher_reloads_once_the_card_is_written(models_dir, random_forest):
+    store = make_store(models_dir)
+    set_mtime(store.model_path, 1000)
+    set_mtime(store.card_path, 1001)
+    assert store.load()
+    assert store.current.version == 'random_forest@2025-01-10T12:00:00'
+    store.watch(0.02)
+
+    write_artifacts(models_dir, {'random_forest': random_forest}, 'random_forest',
+                    training_date='2025-02-01T09:00:00')
+    set_mtime(store.model_path, 2000)
+    set_mtime(store.card_path, 1001)  # pickles done, card not yet replaced
+    time.sleep(0.3)
+    assert store.reloads == 0
+
+    set_mtime(store.card_path, 2001)
+    assert wait_for(lambda: store.reloads == 1)
+    assert store.current.version == 'random_forest@2025-02-01T09:00:00'
+
+def test_registry_evicts_the_least_recently_used_model(models_dir, random_forest):
+    from model_store import ModelRegistry
+
+    models = {name: random_forest for name in ('a', 'b', 'c')}
+    write_artifacts(models_dir, models, 'a')
+    size = os.path.getsize(os.path.join(models_dir, 'a.pkl'))
+    registry = ModelRegistry(stub_bundle, models_dir, memory_budget_mb=2.5 * size / 1024 / 1024)
+    assert registry.available() == ['a', 'b', 'c', 'random_forest']
+
+    a = registry.get('a')
+    registry.get('b')
+    assert registry.get('a') is a  # a is now the most recently used
+    registry.get('c')
+    assert list(registry.stats()['loaded']) == ['a', 'c']
+    assert registry.evictions == 1
+
+    # Loaded bundles carry the requested name, not the card's best model
+    assert registry.get('b').model_card['best_model'] == 'b'
+    assert list(registry.stats()['loaded']) == ['c', 'b']
+
+def test_registry_only_rechecks_loaded_models_every_refresh_interval(models_dir, random_forest, monkeypatch):
+    from model_store import ModelRegistry
+
+    write_artifacts(models_dir, {'a': random_forest}, 'a')
+    registry = ModelRegistry(stub_bundle, models_dir, refresh_seconds=60)
+    a = registry.get('a')
+
+    # Within the interval a loaded model costs no directory listing or stat
+    def unexpected(*args):
+        raise AssertionError('filesystem checked on a warm request')
+    monkeypatch.setattr(registry, 'available', unexpected)
+    monkeypatch.setattr(registry, '_stamp', unexpected)
+    assert registry.get('a') is a
+
+def test_registry_replaces_a_model_once_its_card_is_written(models_dir, random_forest):
+    from model_store import ModelRegistry
+
+    write_artifacts(models_dir, {'a': random_forest}, 'a')
+    model_path, card_path = os.path.join(models_dir, 'a.pkl'), os.path.join(models_dir, 'model_card.json')
+    set_mtime(model_path, 1000)
+    set_mtime(card_path, 1001)
+    registry = ModelRegistry(stub_bundle, models_dir)
+    a = registry.get('a')
+
+    # train_model.py has replaced the pickle but not yet the card
+    write_artifacts(models_dir, {'a': random_forest}, 'a', training_date='2025-02-01T09:00:00')
+    set_mtime(model_path, 2000)
+    set_mtime(card_path, 1001)
+    assert registry.get('a') is a
+
+    set_mtime(card_path, 2001)
+    assert registry.get('a').version == 'a@2025-02-01T09:00:00'
+    assert registry.loads == 2
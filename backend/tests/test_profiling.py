@@ -0,0 +1,41 @@
+"""RequestProfiler: saved profiles, the bounded ring and the 1-in-N sampler"""
+
+import pstats
+
+from profiling import RequestProfiler
+
+def test_profiles_are_saved_and_readable(tmp_path):
+    profiler = RequestProfiler(str(tmp_path), ring_size=5)
+    result, profile_id = profiler.run(lambda: sum(range(1000)), '/api/predict', 'admin')
+    assert result == 499500
+
+    meta, = profiler.list()
+    assert meta['profile_id'] == profile_id and meta['endpoint'] == '/api/predict' and meta['trigger'] == 'admin'
+    assert pstats.Stats(profiler.path(profile_id)).total_calls > 0
+    assert 'function calls' in profiler.text(profile_id, sort='tottime')
+
+def test_the_ring_drops_the_oldest_profiles(tmp_path):
+    profiler = RequestProfiler(str(tmp_path), ring_size=2)
+    ids = [profiler.run(lambda: None, '/api/predict', 'sample')[1] for _ in range(3)]
+
+    assert [meta['profile_id'] for meta in profiler.list()] == ids[:0:-1]  # newest first
+    assert profiler.path(ids[0]) is None and profiler.text(ids[0]) is None
+    assert len(list(tmp_path.iterdir())) == 4  # .prof + .json per kept profile
+
+def test_a_busy_profiler_runs_the_request_unprofiled(tmp_path):
+    profiler = RequestProfiler(str(tmp_path))
+    profiler._active.acquire()
+    try:
+        assert profiler.run(lambda: 'ok', '/api/predict', 'admin') == ('ok', None)
+    finally:
+        profiler._active.release()
+    assert profiler.stats()['skipped_busy'] == 1 and profiler.list() == []
+
+def test_sampler_picks_one_in_n():
+    assert [RequestProfiler(sample_every=0).should_sample() for _ in range(5)] == [False] * 5
+    sampler = RequestProfiler(sample_every=3)
+    assert [sampler.should_sample() for _ in range(6)] == [False, False, True] * 2
+
+def test_only_profile_ids_become_paths(tmp_path):
+    profiler = RequestProfiler(str(tmp_path))
+    assert profiler.path('*') is None and profiler.path('../secrets') is None
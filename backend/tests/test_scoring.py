@@ -0,0 +1,203 @@
+"""FeatureAssembler and the bulk feature matrix against the pandas paths they replaced"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from scoring import FeatureAssembler, build_feature_matrix, engineer_features
+
+def pandas_row(data, feature_names):
+    """The row preprocess_input builds for one payload"""
+    return engineer_features(pd.DataFrame([data]))[feature_names].to_numpy(dtype=np.float64)
+
+def test_assembler_is_bit_identical_to_pandas(payloads, feature_names):
+    assembler = FeatureAssembler(feature_names)
+    for data in payloads:
+        row = assembler.assemble(data)
+        assert row is not None, data['student_id']
+        assert row.tobytes() == pandas_row(data, feature_names).tobytes(), data['student_id']
+
+def test_supplied_derived_features_are_used_as_is(payloads, feature_names):
+    data = dict(payloads[0], engagement_index=4.5, internal_to_attendance_ratio=0.75)
+    row = FeatureAssembler(feature_names).assemble(data)
+    assert row[0, feature_names.index('engagement_index')] == 4.5
+    assert row[0, feature_names.index('internal_to_attendance_ratio')] == 0.75
+
+def test_missing_activity_scores_count_as_zero(payloads):
+    # Without the activity scores as features, they only feed engagement_index
+    feature_names = ['attendance_pct', 'engagement_index']
+    data = {k: v for k, v in payloads[0].items() if k != 'sports_activity_score'}
+    row = FeatureAssembler(feature_names).assemble(data)
+    assert row.tobytes() == pandas_row(data, feature_names).tobytes()
+
+@pytest.mark.parametrize('field, value', [
+    ('attendance_pct', None),
+    ('attendance_pct', '87.5'),
+    ('attendance_pct', 'absent'),
+    ('internal_marks_avg', True),
+    ('cultural_activity_score', None),
+])
+def test_non_numeric_values_take_the_pandas_path(payloads, feature_names, field, value):
+    data = dict(payloads[0], **{field: value})
+    assert FeatureAssembler(feature_names).assemble(data) is None
+
+def test_missing_feature_takes_the_pandas_path(payloads, feature_names):
+    data = {k: v for k, v in payloads[0].items() if k != 'previous_gpa'}
+    assert FeatureAssembler(feature_names).assemble(data) is None
+
+    _, valid, errors = build_feature_matrix(pd.DataFrame([data]), feature_names)
+    assert not valid[0]
+    assert 'previous_gpa' in errors[0]
+
+def test_bulk_path_rejects_what_the_assembler_passes_on(payloads, feature_names):
+    rows = [dict(payloads[0], attendance_pct='absent'), dict(payloads[1], attendance_pct=None),
+            dict(payloads[2], attendance_pct='87.5')]
+    X, valid, errors = build_feature_matrix(pd.DataFrame(rows), feature_names)
+    assert valid.tolist() == [False, True, True]
+    assert 'absent' in errors[0]
+    # None is left for the imputer; numeric strings are coerced
+    assert np.isnan(X[1, feature_names.index('attendance_pct')])
+    assert X[2, feature_names.index('attendance_pct')] == 87.5
+
+def test_infinite_input(payloads, feature_names):
+    assembler = FeatureAssembler(feature_names)
+
+    # attendance_pct == -1 divides by zero: pandas gives inf, the assembler declines
+    data = dict(payloads[0], attendance_pct=-1)
+    assert assembler.assemble(data) is None
+    assert np.isinf(pandas_row(data, feature_names)).any()
+
+    # An infinite JSON number (Python's json accepts Infinity) passes through unchanged
+    data = dict(payloads[0], previous_gpa=float('inf'))
+    row = assembler.assemble(data)
+    assert row.tobytes() == pandas_row(data, feature_names).tobytes()
+
+    frame = pd.DataFrame([dict(payloads[0], attendance_pct=-1), dict(payloads[0], previous_gpa=float('inf')),
+                          payloads[1]])
+    _, valid, errors = build_feature_matrix(frame, feature_names)
+    assert valid.tolist() == [False, False, True]
+    assert all('infinity' in message for message in errors[:2])
+
+def test_each_bad_row_gets_its_own_error(payloads, feature_names):
+    rows = [dict(payloads[0], attendance_pct='absent', previous_gpa='n/a'), payloads[1],
+            dict(payloads[2], internal_marks_avg='seventy'), dict(payloads[3], attendance_pct=-1)]
+    X, valid, errors = build_feature_matrix(pd.DataFrame(rows), feature_names)
+    assert valid.tolist() == [False, True, False, False]
+    # One message per row, even with two bad columns
+    assert isinstance(errors[0], str) and errors[1] is None
+    assert 'seventy' in errors[2]
+    assert 'infinity' in errors[3]
+    assert X.shape == (4, len(feature_names))
+
+def test_missing_feature_column_invalidates_every_row(payloads, feature_names):
+    frame = pd.DataFrame(payloads[:3]).drop(columns=['previous_gpa'])
+    _, valid, errors = build_feature_matrix(frame, feature_names)
+    assert not valid.any()
+    assert all('previous_gpa' in message for message in errors)
+
+def baseline_bulk(model, feature_names, df):
+    """The per-row loop /api/predict/bulk ran before scoring was vectorized"""
+    from app import determine_risk_level, preprocess_input
+
+    results = []
+    for _, row in df.iterrows():
+        try:
+            X = preprocess_input(row.to_dict(), feature_names)
+            prediction = model.predict(X)[0]
+            probability = model.predict_proba(X)[0][1]
+            results.append({
+                'student_id': row.get('student_id', 'unknown'),
+                'prediction': 'Pass' if prediction == 1 else 'Fail',
+                'probability': float(probability),
+                'risk_level': determine_risk_level(probability)
+            })
+        except Exception as e:
+            results.append({'student_id': row.get('student_id', 'unknown'), 'error': str(e)})
+    return results
+
+def test_vectorized_bulk_matches_the_per_row_path(random_forest, payloads, feature_names):
+    from explanations import ExplanationEngine
+    from scoring import Predictor, score_frame
+
+    rows = [dict(data) for data in payloads[:40]]
+    rows[3]['attendance_pct'] = 'absent'
+    rows[7]['previous_gpa'] = None
+    rows[11]['attendance_pct'] = -1
+    rows[19]['internal_marks_avg'] = float('inf')
+    df = pd.DataFrame(rows)
+
+    predictor = Predictor(random_forest)
+    predictor.verify(np.asarray(engineer_features(df.drop(index=[3, 11, 19]))[feature_names], dtype=np.float64))
+    explainer = ExplanationEngine(feature_names, dict.fromkeys(feature_names, 0.1))
+    results, summary = score_frame(predictor, explainer, feature_names, df)
+    expected = baseline_bulk(random_forest, feature_names, df)
+
+    for got, want in zip(results, expected):
+        assert got['student_id'] == want['student_id']
+        assert ('error' in got) == ('error' in want), want
+        if 'error' not in want:
+            assert got['prediction'] == want['prediction']
+            assert got['probability'] == pytest.approx(want['probability'], abs=1e-12)
+            assert got['risk_level'] == want['risk_level']
+    assert summary == {
+        'pass': sum(r.get('prediction') == 'Pass' for r in expected),
+        'fail': sum(r.get('prediction') == 'Fail' for r in expected),
+        'high_risk': sum(r.get('risk_level') == 'high' for r in expected)
+    }
+
+def test_numeric_strings_are_scored_as_numbers(random_forest, payloads, feature_names):
+    # The per-row path failed on '87.5' (str + int in the ratio); bulk now coerces it
+    from scoring import Predictor, score_matrix
+
+    as_string = pd.DataFrame([dict(payloads[0], attendance_pct='87.5')])
+    as_number = pd.DataFrame([dict(payloads[0], attendance_pct=87.5)])
+    assert 'error' in baseline_bulk(random_forest, feature_names, as_string)[0]
+
+    X_string, valid, _ = build_feature_matrix(as_string, feature_names)
+    X_number, _, _ = build_feature_matrix(as_number, feature_names)
+    assert valid[0]
+    assert X_string.tobytes() == X_number.tobytes()
+    probabilities, _ = score_matrix(Predictor(random_forest), X_string, valid)
+    assert probabilities[0] == baseline_bulk(random_forest, feature_names, as_number)[0]['probability']
+
+class ThresholdModel:
+    """predict() thresholds P(pass) at `threshold`, like SVC thresholding its decision function"""
+
+    classes_ = np.array([0, 1])
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+
+    def predict_proba(self, X):
+        positive = X[:, 0] / 100
+        return np.column_stack([1 - positive, positive])
+
+    def predict(self, X):
+        return (self.predict_proba(X)[:, 1] > self.threshold).astype(int)
+
+def test_verify_keeps_single_pass_when_argmax_matches_predict():
+    from scoring import Predictor
+
+    X = np.linspace(0, 100, 41)[:, None]
+    predictor = Predictor(ThresholdModel(0.5))
+    assert predictor.verify(X, timing_rounds=1)
+    assert predictor.label_agreement == 1.0
+
+    result = predictor.predict(X)
+    assert result['label'].tolist() == ThresholdModel(0.5).predict(X).tolist()
+    assert result['confidence'].tolist() == np.where(result['label'] == 1, X[:, 0] / 100, 1 - X[:, 0] / 100).tolist()
+
+def test_verify_falls_back_to_predict_when_labels_disagree():
+    from scoring import Predictor
+
+    # Between 0.5 and 0.6, argmax says Pass and predict() says Fail
+    X = np.linspace(0, 100, 41)[:, None]
+    model = ThresholdModel(0.6)
+    predictor = Predictor(model)
+    assert not predictor.verify(X, timing_rounds=1)
+    assert predictor.label_agreement < 1.0
+    assert predictor.stats()['saved_ms_per_request'] == 0.0
+
+    result = predictor.predict(X)
+    assert result['label'].tolist() == model.predict(X).tolist()
+    assert result['probability'].tolist() == (X[:, 0] / 100).tolist()
@@ -0,0 +1,184 @@
+"""ShardedScorer against in-process scoring, with workers built the way the API builds bundles"""
+
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from scoring import build_feature_matrix, score_matrix
+
+def broken_build(model, model_card):
+    raise RuntimeError('model could not be built')
+
+def crashing_build(model, model_card):
+    os._exit(3)
+
+def build_then_swap(model, model_card):
+    """Builds like the API, but the first worker to get here also installs the staged retrain"""
+    import app
+
+    predictor = app.build_predictor(model, model_card)
+    try:
+        os.close(os.open(os.environ['SWAP_MARKER'], os.O_CREAT | os.O_EXCL))
+    except FileExistsError:
+        return predictor
+    staged, models_dir = os.environ['SWAP_FROM'], os.environ['SWAP_TO']
+    # train_model.py's order: pickles first, the card last
+    for name in ('best_model.pkl', 'model_card.json'):
+        os.replace(os.path.join(staged, name), os.path.join(models_dir, name))
+    return predictor
+
+@pytest.fixture(scope='module')
+def artifacts(tmp_path_factory, random_forest):
+    from conftest import write_artifacts
+
+    models_dir = str(tmp_path_factory.mktemp('sharding') / 'models')
+    write_artifacts(models_dir, {'random_forest': random_forest}, 'random_forest')
+    return os.path.join(models_dir, 'best_model.pkl'), os.path.join(models_dir, 'model_card.json')
+
+@pytest.fixture(scope='module')
+def api_predictor(artifacts):
+    """The predictor a bundle for these artifacts serves from"""
+    import app
+    from model_store import read_artifacts
+
+    return app.build_predictor(*read_artifacts(*artifacts))
+
+@pytest.fixture(scope='module')
+def scorer(artifacts):
+    import app
+    from sharding import ShardedScorer
+
+    scorer = ShardedScorer(2, shard_rows=7, min_rows=1, model_path=artifacts[0], card_path=artifacts[1],
+                           build_predictor=app.build_predictor)
+    yield scorer
+    scorer.shutdown()
+
+@pytest.fixture(scope='module')
+def frame(payloads):
+    rows = [dict(data) for data in payloads[:45]]
+    for i in (0, 6, 7, 20, 44):
+        rows[i]['attendance_pct'] = 'absent'  # invalid rows on and next to shard edges
+    rows[13]['previous_gpa'] = None
+    return pd.DataFrame(rows)
+
+@pytest.mark.parametrize('shard_rows', [1, 7, 44, 45, 1000])
+def test_shards_match_in_process_scoring(scorer, api_predictor, frame, feature_names, shard_rows):
+    X, valid, _ = build_feature_matrix(frame, feature_names)
+    scorer.shard_rows = shard_rows
+    probabilities, labels = scorer.score_matrix(X, valid)
+    expected_probabilities, expected_labels = score_matrix(api_predictor, X, valid)
+
+    # Same evaluator in the workers, so the results are identical, in input order
+    np.testing.assert_array_equal(probabilities, expected_probabilities)
+    np.testing.assert_array_equal(labels, expected_labels)
+    assert np.isnan(probabilities[~valid]).all() and (labels[~valid] == -1).all()
+
+def test_sharded_frames_match_unsharded(scorer, api_predictor, frame, feature_names):
+    from explanations import ExplanationEngine
+    from scoring import score_frame
+
+    explainer = ExplanationEngine(feature_names, dict.fromkeys(feature_names, 0.1))
+    scorer.shard_rows = 7
+    assert score_frame(api_predictor, explainer, feature_names, frame, scorer) == \
+        score_frame(api_predictor, explainer, feature_names, frame)
+
+def test_empty_input(scorer):
+    probabilities, labels = scorer.score_matrix(np.empty((0, 11)), np.empty(0, dtype=bool))
+    assert probabilities.shape == labels.shape == (0,)
+
+def test_worker_errors_fail_the_request(artifacts, frame, feature_names):
+    from sharding import ShardedScorer
+
+    X, valid, _ = build_feature_matrix(frame, feature_names)
+    scorer = ShardedScorer(2, shard_rows=10, min_rows=1, model_path=artifacts[0], card_path=artifacts[1],
+                           build_predictor=broken_build)
+    try:
+        with pytest.raises(RuntimeError, match='could not be built'):
+            scorer.score_matrix(X, valid)
+    finally:
+        scorer.shutdown()
+
+def test_a_dead_worker_resets_the_pool(artifacts, frame, feature_names):
+    from sharding import ShardedScorer
+
+    X, valid, _ = build_feature_matrix(frame, feature_names)
+    scorer = ShardedScorer(2, shard_rows=10, min_rows=1, model_path=artifacts[0], card_path=artifacts[1],
+                           build_predictor=crashing_build)
+    with pytest.raises(BrokenProcessPool):
+        scorer.score_matrix(X, valid)
+    # The next request gets a fresh pool instead of the broken one
+    assert scorer._pool is None
+
+@pytest.fixture
+def retrain(tmp_path, random_forest, logistic_regression):
+    """Random forest artifacts serving, with a logistic regression retrain staged to replace them"""
+    import app
+    from conftest import write_artifacts
+    from model_store import artifact_stamp, read_artifacts
+
+    models_dir, staged = str(tmp_path / 'models'), str(tmp_path / 'staged')
+    write_artifacts(models_dir, {'random_forest': random_forest}, 'random_forest')
+    write_artifacts(staged, {'logistic_regression': logistic_regression}, 'logistic_regression',
+                    training_date='2025-02-01T12:00:00')
+    paths = os.path.join(models_dir, 'best_model.pkl'), os.path.join(models_dir, 'model_card.json')
+    return {
+        'paths': paths, 'staged': staged, 'models_dir': models_dir,
+        'stamp': artifact_stamp(*paths), 'predictor': app.build_predictor(*read_artifacts(*paths))
+    }
+
+def test_a_retrain_mid_run_does_not_split_the_request(retrain, frame, feature_names, tmp_path, monkeypatch):
+    import app
+    from model_store import artifact_stamp, read_artifacts
+    from sharding import ArtifactChanged, ShardedScorer
+
+    X, valid, _ = build_feature_matrix(frame, feature_names)
+    model_path, card_path = retrain['paths']
+    monkeypatch.setenv('SWAP_MARKER', str(tmp_path / 'swapped'))
+    monkeypatch.setenv('SWAP_FROM', retrain['staged'])
+    monkeypatch.setenv('SWAP_TO', retrain['models_dir'])
+    scorer = ShardedScorer(2, shard_rows=5, min_rows=1, model_path=model_path, card_path=card_path,
+                           build_predictor=build_then_swap)
+    try:
+        probabilities, labels = scorer.score_matrix(X, valid, model_path, card_path,
+                                                    retrain['stamp'], local=retrain['predictor'])
+    finally:
+        scorer.shutdown()
+    assert os.path.exists(tmp_path / 'swapped')
+    assert artifact_stamp(model_path, card_path) != retrain['stamp']
+
+    # Every shard came from the version the request started with
+    expected_probabilities, expected_labels = score_matrix(retrain['predictor'], X, valid)
+    np.testing.assert_array_equal(probabilities, expected_probabilities)
+    np.testing.assert_array_equal(labels, expected_labels)
+
+    # Fresh workers only find the retrain: each pinned shard falls back to the caller
+    scorer = ShardedScorer(2, shard_rows=10, min_rows=1, model_path=model_path, card_path=card_path,
+                           build_predictor=app.build_predictor)
+    try:
+        probabilities, _ = scorer.score_matrix(X, valid, stamp=retrain['stamp'], local=retrain['predictor'])
+        np.testing.assert_array_equal(probabilities, expected_probabilities)
+        assert scorer.stale_shards == 5
+
+        with pytest.raises(ArtifactChanged):
+            scorer.score_matrix(X, valid, stamp=retrain['stamp'])
+
+        # Pinned to the new version, the workers serve it
+        new_predictor = app.build_predictor(*read_artifacts(model_path, card_path))
+        probabilities, _ = scorer.score_matrix(X, valid, stamp=artifact_stamp(model_path, card_path))
+        # Fused linear scores vary in the last ulp with the batch size
+        np.testing.assert_allclose(probabilities, score_matrix(new_predictor, X, valid)[0], rtol=1e-12)
+        assert not np.allclose(probabilities[valid], expected_probabilities[valid])
+    finally:
+        scorer.shutdown()
+
+def test_bound_bundles_without_a_stamp_score_in_process(scorer, api_predictor, frame, feature_names):
+    from types import SimpleNamespace
+
+    X, valid, _ = build_feature_matrix(frame, feature_names)
+    # A bundle whose files changed while it loaded: no worker could load that version
+    bundle = SimpleNamespace(predictor=api_predictor, stamp=None, model_path=None, card_path=None)
+    probabilities, _ = scorer.bound(bundle).score_matrix(X, valid)
+    np.testing.assert_array_equal(probabilities, score_matrix(api_predictor, X, valid)[0])
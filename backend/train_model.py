@@ -24,6 +24,7 @@ from sklearn.metrics import (
 )
 from xgboost import XGBClassifier
 from imblearn.over_sampling import SMOTE
+from model_compiler import export_arrays
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -184,8 +185,8 @@ def get_feature_importance(model, feature_names):
         return dict(zip(feature_names, importances.tolist()))
     return {}
 
-def save_model_artifacts(models, results, feature_names):
-    """Save trained models and metadata"""
+def save_model_artifacts(models, results, feature_names, X_train=None):
+    """Save trained models and metadata (X_train adds feature ranges for API warm-up)"""
     import os
     os.makedirs('models', exist_ok=True)
     
@@ -193,14 +194,26 @@ def save_model_artifacts(models, results, feature_names):
     best_model_name = max(results, key=lambda x: results[x]['f1_score'])
     best_model = models[best_model_name]
     
+    # Write each file under a temp name and rename it into place, so a running
+    # API (which watches these files for hot reload) never reads a partial file
+    def write_atomic(path, write, mode='wb'):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, mode) as f:
+            write(f)
+        os.replace(tmp_path, path)
+    
     # Save best model
-    with open('models/best_model.pkl', 'wb') as f:
-        pickle.dump(best_model, f)
+    write_atomic('models/best_model.pkl', lambda f: pickle.dump(best_model, f))
     
     # Save all models
     for name, model in models.items():
-        with open(f'models/{name}.pkl', 'wb') as f:
-            pickle.dump(model, f)
+        write_atomic(f'models/{name}.pkl', lambda f: pickle.dump(model, f))
+    
+    # Memory-mappable copies (compiled trees / fused linear) for MODEL_ARTIFACT_FORMAT=mmap
+    saved = [('best_model', best_model)] + list(models.items())
+    for name, model in saved:
+        if export_arrays(model, f'models/{name}.pkl'):
+            print(f"  Wrote models/{name}.arrays/")
     
     # Save model card
     model_card = {
@@ -213,9 +226,15 @@ def save_model_artifacts(models, results, feature_names):
             for name, model in models.items()
         }
     }
+    if X_train is not None:
+        # The API synthesizes its warm-up batch from these
+        model_card['feature_ranges'] = {
+            name: {'min': float(X_train[name].min()), 'max': float(X_train[name].max())}
+            for name in feature_names
+        }
     
-    with open('models/model_card.json', 'w') as f:
-        json.dump(model_card, f, indent=2)
+    # Card goes last: its change is what tells the API a complete model is ready
+    write_atomic('models/model_card.json', lambda f: json.dump(model_card, f, indent=2), mode='w')
     
     print(f"\n✅ Models saved to models/ directory")
     print(f"🏆 Best model: {best_model_name} (F1: {results[best_model_name]['f1_score']:.4f})")
@@ -248,7 +267,7 @@ if __name__ == "__main__":
     models, results = train_models(X_train, X_test, y_train, y_test)
     
     # Save artifacts
-    best_model = save_model_artifacts(models, results, feature_names)
+    best_model = save_model_artifacts(models, results, feature_names, X_train)
     
     print("\n" + "=" * 60)
     print("Training complete! ✨")